@@ -5,16 +5,27 @@ from config import Config
 import logging
 import sys
 from celery import Celery
+from app.utils.db_router import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 celery = Celery(__name__)
 
 def create_app(config_class=Config):
     app = Flask(__name__)
+    if isinstance(config_class, str):
+        from config import config
+        config_class = config[config_class]
     app.config.from_object(config_class)
 
+    from app.utils.db_engine import init_engine_profile, instrument_engine
+    from app.utils.db_router import init_db_router
+    engine_metrics = init_engine_profile(app)
     db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument_engine(engine, app.config, engine_metrics)
+    init_db_router(app, db)
     migrate.init_app(app, db)
 
     # Initialize Celery
@@ -43,11 +54,46 @@ def create_app(config_class=Config):
     from app.errors import bp as errors_bp
     app.register_blueprint(errors_bp)
 
+    from app.utils.response_cache import init_response_cache
+    init_response_cache(app)
+
+    from app.utils.session_tokens import init_session_tokens
+    init_session_tokens(app)
+    if app.config['RAFFLE_CACHE_WARMUP']:
+        from app.api.raffle_routes import warm_raffle_cache
+        with app.app_context():
+            try:
+                warmed = warm_raffle_cache()
+                app.logger.info(f"Warmed the response cache for {warmed} raffles")
+            except Exception as e:
+                app.logger.warning(f"Response cache warm-up skipped: {str(e)}")
+
+    if app.config['RAFFLE_SCHEDULER_ENABLED']:
+        from app.scheduler import init_scheduler
+        init_scheduler(app)
+
+    if app.config['RAFFLE_ADMISSION_ENABLED']:
+        from app.utils.admission import init_purchase_admission
+        init_purchase_admission(app)
+
+    if app.config['RAFFLE_PURCHASE_BATCHING']:
+        from app.utils.purchase_batcher import init_purchase_batcher
+        init_purchase_batcher(app)
+
+    # Register CLI commands
+    from app.cli import wildrandom_cli
+    app.cli.add_command(wildrandom_cli)
+
     @app.route('/')
     def index():
         return "Welcome to Wild Random Platform"
 
+    @app.route('/db_stats')
+    def db_stats():
+        from app.utils.db_engine import pool_stats
+        return dict(engine_metrics.stats(), pool=pool_stats(db.engine.pool), router=app.extensions['db_router'].stats())
+
     return app
 
 # Import models at the end to avoid circular imports
-from app.models import raffle, ticket, user
\ No newline at end of file
+from app.models import raffle, ticket, user, draw_result, balance_entry
\ No newline at end of file
@@ -5,6 +5,9 @@ from datetime import datetime
 import traceback
 from app.validation import raffle_schema
 from marshmallow import ValidationError
+from app.utils.admission import note_failed_purchase, purchase_admission
+from app.utils.response_cache import cached_json_response, render_cached
+from app.utils.streaming import ndjson_response, wants_ndjson
 
 bp = Blueprint('raffle', __name__)
 
@@ -56,19 +59,23 @@ def update_raffle(raffle_id):
 @bp.route('', methods=['GET'])
 @bp.route('/', methods=['GET'])
 def list_raffles():
-    raffles, error = RaffleService.list_raffles()
+    return cached_json_response('list', None, _build_raffle_list)
+
+@bp.route('/changes', methods=['GET'])
+def get_raffle_changes():
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    raffles, cursor, error = RaffleService.get_raffle_changes(request.args.get('since'), limit)
     if error:
         return jsonify({'error': error}), 400
-    return jsonify([raffle.to_dict() for raffle in raffles]), 200
+    return jsonify({
+        'changes': [raffle.to_state_dict() for raffle in raffles],
+        'cursor': cursor,
+        'has_more': len(raffles) == limit
+    }), 200
 
 @bp.route('/<int:raffle_id>', methods=['GET'])
 def get_raffle(raffle_id):
-    raffle, error = RaffleService.get_raffle(raffle_id)
-    if error:
-        return jsonify({'error': error}), 400
-    if not raffle:
-        return jsonify({'error': 'Raffle not found'}), 404
-    return jsonify(raffle.to_dict()), 200
+    return cached_json_response('raffle', raffle_id, lambda: _build_raffle(raffle_id))
 
 @bp.route('/<int:raffle_id>/purchase', methods=['POST'])
 def purchase_tickets(raffle_id):
@@ -80,17 +87,79 @@ def purchase_tickets(raffle_id):
         return jsonify({'error': 'Missing user_id or num_tickets'}), 400
 
     try:
-        tickets, error = TicketService.purchase_tickets(
-            raffle_id=raffle_id,
-            user_id=int(data['user_id']),
-            num_tickets=int(data['num_tickets'])
-        )
-        if error:
-            return jsonify({'error': error}), 400
-        return jsonify([ticket.to_dict() for ticket in tickets]), 201
+        user_id, num_tickets = int(data['user_id']), int(data['num_tickets'])
     except ValueError as e:
         return jsonify({'error': f'Invalid data format: {str(e)}'}), 400
 
+    admission = purchase_admission()
+    if admission is not None:
+        if admission.sold_out(raffle_id):
+            return jsonify({'error': "Not enough tickets available. Only 0 left."}), 400
+        rejection = admission.enter(raffle_id)
+        if rejection is not None:
+            response = jsonify({
+                'error': 'Too many purchase requests for this raffle, retry later',
+                'queue_position': rejection.queue_position,
+                'retry_after': rejection.retry_after
+            })
+            response.headers['Retry-After'] = str(rejection.retry_after)
+            return response, 429
+
+    try:
+        purchase = TicketService.purchase_tickets
+        batcher = current_app.extensions.get('purchase_batcher')
+        if batcher is not None:
+            purchase = batcher.purchase
+        tickets, error = purchase(raffle_id=raffle_id, user_id=user_id, num_tickets=num_tickets)
+    finally:
+        if admission is not None:
+            admission.leave(raffle_id)
+    if error:
+        note_failed_purchase(raffle_id)
+        return jsonify({'error': error}), 400
+    return jsonify([ticket.to_dict() for ticket in tickets]), 201
+
+@bp.route('/purchase/batch', methods=['POST'])
+@bp.route('/<int:raffle_id>/purchase/batch', methods=['POST'])
+def purchase_tickets_batch(raffle_id=None):
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+
+    data = request.get_json()
+    purchases = data.get('purchases') if isinstance(data, dict) else None
+    if not isinstance(purchases, list) or not purchases:
+        return jsonify({'error': 'Missing purchases'}), 400
+    max_items = current_app.config['RAFFLE_MAX_BATCH_PURCHASE']
+    if len(purchases) > max_items:
+        return jsonify({'error': f'A batch can hold at most {max_items} purchases'}), 400
+
+    items = []
+    for index, purchase in enumerate(purchases):
+        if not isinstance(purchase, dict) or 'user_id' not in purchase or 'num_tickets' not in purchase:
+            return jsonify({'error': f'Purchase {index}: missing user_id or num_tickets'}), 400
+        if raffle_id is None and 'raffle_id' not in purchase:
+            return jsonify({'error': f'Purchase {index}: missing raffle_id'}), 400
+        try:
+            items.append({
+                'raffle_id': int(purchase.get('raffle_id', raffle_id)),
+                'user_id': int(purchase['user_id']),
+                'num_tickets': int(purchase['num_tickets'])
+            })
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Purchase {index}: invalid data format: {str(e)}'}), 400
+
+    results, error = TicketService.purchase_tickets_batch(items)
+    if error:
+        return jsonify({'error': error}), 400
+    for result in results:
+        if 'tickets' in result:
+            result['tickets'] = [ticket.to_dict() for ticket in result['tickets']]
+    return jsonify({
+        'results': results,
+        'purchased': sum(1 for result in results if 'tickets' in result),
+        'failed': sum(1 for result in results if 'error' in result)
+    }), 200
+
 @bp.route('/<int:raffle_id>/draw', methods=['POST'])
 def draw_winner(raffle_id):
     winners, error = RaffleService.select_winner(raffle_id)
@@ -136,24 +205,52 @@ def cancel_raffle(raffle_id):
 
 @bp.route('/user/<int:user_id>/history', methods=['GET'])
 def get_user_history(user_id):
-    history, error = RaffleService.get_user_raffle_history(user_id)
+    cursor = request.args.get('cursor', type=int)
+    limit = request.args.get('limit', type=int)
+    per_raffle = request.args.get('group') == 'raffle'
+    if cursor is None and limit is None and not per_raffle:
+        history, error = RaffleService.get_user_raffle_history(user_id)
+        if error:
+            return jsonify({'error': error}), 400
+        return jsonify(history), 200
+
+    limit = min(max(limit or 50, 1), 500)
+    history, next_cursor, error = RaffleService.get_user_raffle_history_page(user_id, cursor, limit, per_raffle)
     if error:
         return jsonify({'error': error}), 400
-    return jsonify(history), 200
+    return jsonify({
+        'history': history,
+        'next_cursor': next_cursor,
+        'limit': limit
+    }), 200
 
 @bp.route('/<int:raffle_id>/remaining_tickets', methods=['GET'])
 def get_remaining_tickets(raffle_id):
-    tickets, error = RaffleService.get_remaining_tickets(raffle_id)
+    remaining, error = RaffleService.get_remaining_tickets(raffle_id)
     if error:
         return jsonify({'error': error}), 400
-    return jsonify({'remaining_tickets': len(tickets)}), 200
+    return jsonify({'remaining_tickets': remaining}), 200
+
+@bp.route('/comprehensive_info', methods=['GET'])
+def get_all_comprehensive_raffle_info():
+    return cached_json_response('comprehensive_info', None, _build_comprehensive_info)
 
 @bp.route('/<int:raffle_id>/comprehensive_info', methods=['GET'])
 def get_comprehensive_raffle_info(raffle_id):
-    info, error = RaffleService.get_comprehensive_raffle_info(raffle_id)
+    return cached_json_response('comprehensive_info', raffle_id, lambda: _build_comprehensive_info(raffle_id))
+
+@bp.route('/cache_stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(current_app.extensions['response_cache'].stats()), 200
+
+@bp.route('/ticket/<string:public_ticket_id>', methods=['GET'])
+def get_ticket(public_ticket_id):
+    ticket, error = TicketService.get_ticket_by_public_id(public_ticket_id)
+    if error == "Ticket not found":
+        return jsonify({'error': error}), 404
     if error:
         return jsonify({'error': error}), 400
-    return jsonify(info), 200
+    return jsonify(ticket.to_dict()), 200
 
 @bp.route('/ticket/<int:ticket_id>/refund', methods=['POST'])
 def refund_ticket(ticket_id):
@@ -164,6 +261,12 @@ def refund_ticket(ticket_id):
 
 @bp.route('/<int:raffle_id>/purchased_tickets', methods=['GET'])
 def get_purchased_tickets(raffle_id):
+    if wants_ndjson():
+        tickets, error = TicketService.stream_tickets_for_raffle(raffle_id, purchased_only=True)
+        if error:
+            return jsonify({'error': error}), 400
+        return ndjson_response(tickets, lambda ticket: ticket.to_dict())
+
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
     tickets, total, error = TicketService.get_purchased_tickets_for_raffle(raffle_id, page, per_page)
@@ -182,4 +285,51 @@ def end_raffle(raffle_id):
     if success:
         return jsonify({'message': message}), 200
     else:
-        return jsonify({'error': message}), 400
\ No newline at end of file
+        return jsonify({'error': message}), 400
+
+def _seconds_until_transition(raffles, now=None):
+    # Status is derived from the clock, so a cached body must not outlive the next
+    # start or end time of any raffle in it.
+    now = now or datetime.utcnow()
+    boundaries = [
+        boundary
+        for raffle in raffles
+        for boundary in (datetime.fromisoformat(raffle['start_time']), datetime.fromisoformat(raffle['end_time']))
+        if boundary > now
+    ]
+    return (min(boundaries) - now).total_seconds() if boundaries else None
+
+def _build_raffle_list():
+    raffles, error = RaffleService.list_raffles()
+    if error:
+        return {'error': error}, 400, None
+    payload = [raffle.to_dict() for raffle in raffles]
+    return payload, 200, _seconds_until_transition(payload)
+
+def _build_raffle(raffle_id):
+    raffle, error = RaffleService.get_raffle(raffle_id)
+    if error:
+        return {'error': error}, 400, None
+    if not raffle:
+        return {'error': 'Raffle not found'}, 404, None
+    payload = raffle.to_dict()
+    return payload, 200, _seconds_until_transition([payload])
+
+def _build_comprehensive_info(raffle_id=None):
+    info, error = RaffleService.get_comprehensive_raffle_info(raffle_id)
+    if error:
+        return {'error': error}, 400, None
+    return info, 200, _seconds_until_transition([info] if raffle_id else info)
+
+def warm_raffle_cache():
+    # Renders the read endpoints of every raffle currently on sale, so the first
+    # clients after a restart do not all miss at once.
+    raffle_ids, error = RaffleService.get_on_sale_raffle_ids()
+    if error:
+        raise RuntimeError(error)
+    render_cached('list', None, _build_raffle_list)
+    render_cached('comprehensive_info', None, _build_comprehensive_info)
+    for raffle_id in raffle_ids:
+        render_cached('raffle', raffle_id, lambda: _build_raffle(raffle_id))
+        render_cached('comprehensive_info', raffle_id, lambda: _build_comprehensive_info(raffle_id))
+    return len(raffle_ids)
@@ -1,7 +1,9 @@
 from flask import Blueprint, jsonify, request
-from app.services.user_service import UserService
+from app.services.user_service import UserService, HASHER_BUSY
 from app.validation import user_schema, credit_schema
 from marshmallow import ValidationError
+from app.utils.streaming import ndjson_response, wants_ndjson
+from app.utils.session_tokens import bearer_token, session_tokens
 
 bp = Blueprint('user', __name__)
 
@@ -18,6 +20,8 @@ def register_user():
         return jsonify({'error': validation_errors.messages}), 400
 
     user, error = UserService.create_user(**validated_data)
+    if error == HASHER_BUSY:
+        return _hasher_busy()
     if error:
         return jsonify({'error': error}), 400
     return jsonify(user.to_dict()), 201
@@ -31,11 +35,32 @@ def login_user():
     if 'username' not in data or 'password' not in data:
         return jsonify({'error': 'Missing username or password'}), 400
 
-    user, error = UserService.authenticate_user(data['username'], data['password'])
+    user, token, error = UserService.login(data['username'], data['password'])
+    if error == HASHER_BUSY:
+        return _hasher_busy()
+    if error:
+        return jsonify({'error': error}), 401
+    return jsonify({**user.to_dict(), 'token': token, 'expires_in': session_tokens().max_age}), 200
+
+@bp.route('/me', methods=['GET'])
+def get_current_user():
+    user, error = UserService.get_session_user(bearer_token())
     if error:
         return jsonify({'error': error}), 401
     return jsonify(user.to_dict()), 200
 
+@bp.route('/logout', methods=['POST'])
+def logout_user():
+    success, error = UserService.logout(bearer_token())
+    if not success:
+        return jsonify({'error': error}), 401
+    return jsonify({'message': 'Logged out'}), 200
+
+def _hasher_busy():
+    response = jsonify({'error': HASHER_BUSY})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @bp.route('/<int:user_id>', methods=['GET'])
 def get_user(user_id):
     user, error = UserService.get_user(user_id)
@@ -57,8 +82,22 @@ def add_balance(user_id):
         return jsonify({'error': error}), 400
     return jsonify({'message': 'Balance added successfully'}), 200
 
+@bp.route('/<int:user_id>/balance/entries', methods=['GET'])
+def get_balance_entries(user_id):
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    entries, error = UserService.get_balance_entries(user_id, limit)
+    if error:
+        return jsonify({'error': error}), 404
+    return jsonify([entry.to_dict() for entry in entries]), 200
+
 @bp.route('/<int:user_id>/tickets', methods=['GET'])
 def get_user_tickets(user_id):
+    if wants_ndjson():
+        tickets, error = UserService.stream_user_tickets(user_id)
+        if error:
+            return jsonify({'error': error}), 404
+        return ndjson_response(tickets, lambda ticket: ticket.to_dict())
+
     tickets, error = UserService.get_user_tickets(user_id)
     if error:
         return jsonify({'error': error}), 404
@@ -84,6 +123,12 @@ def credit_user(user_id):
 
 @bp.route('/all', methods=['GET'])
 def get_all_users():
+    if wants_ndjson():
+        users, error = UserService.stream_users()
+        if error:
+            return jsonify({'error': error}), 400
+        return ndjson_response(users, lambda user: user.to_dict())
+
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     users, total, error = UserService.get_all_users(page, per_page)
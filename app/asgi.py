@@ -0,0 +1,249 @@
+import asyncio
+import re
+from urllib.parse import parse_qs
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app import create_app, db
+from app.models.raffle import Raffle
+from app.models.ticket import Ticket
+from app.models.user import User
+from app.utils.db_engine import EngineMetrics, instrument_engine
+
+# Optional ASGI serving mode for the raffle and user read endpoints. Requests are
+# served on one event loop with SQLAlchemy's async engine, so a client waiting on a
+# slow read or a long poll holds a coroutine rather than a worker thread. Needs an
+# async driver (aiosqlite for SQLite) and an ASGI server, both in requirements-asgi.txt:
+#
+#     pip install -r requirements-asgi.txt
+#     uvicorn asgi:application
+#
+# Writes stay on the WSGI app; the responses match its read endpoints.
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql'
+}
+
+def async_database_url(app):
+    if app.config.get('ASYNC_DATABASE_URL'):
+        return app.config['ASYNC_DATABASE_URL']
+    # The sync engine's URL, with Flask-SQLAlchemy's resolution of relative SQLite paths
+    with app.app_context():
+        url = db.engine.url
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"No async driver known for {url.get_backend_name()}, set ASYNC_DATABASE_URL")
+    return url.set(drivername=driver)
+
+def create_async_read_engine(app):
+    url = async_database_url(app)
+    options = {}
+    if ':memory:' not in str(url):
+        options = {
+            'poolclass': AsyncAdaptedQueuePool,
+            'pool_size': app.config['DB_POOL_SIZE'],
+            'max_overflow': app.config['DB_MAX_OVERFLOW'],
+            'pool_timeout': app.config['DB_POOL_TIMEOUT']
+        }
+    try:
+        engine = create_async_engine(url, **options)
+    except ImportError as e:
+        raise RuntimeError(f"The ASGI read API needs an async database driver ({e.name}), see requirements-asgi.txt") from e
+    metrics = EngineMetrics()
+    instrument_engine(engine.sync_engine, app.config, metrics)
+    return engine, metrics
+
+class ChangeNotifier:
+    # One task per process polls the head of the change feed and wakes every waiting
+    # long-poll client when it moves, so a thousand clients watching the same raffles
+    # cost one query per interval rather than a thousand.
+    def __init__(self, sessionmaker, interval=0.5):
+        self.sessionmaker = sessionmaker
+        self.interval = interval
+        self.head = None
+        self.polls = 0
+        self.waiting = 0
+        self._changed = None
+        self._task = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._changed = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and self._task.get_loop() is asyncio.get_running_loop():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def wait_past(self, change_seq, timeout):
+        # True once the feed has a change_seq above `change_seq`, False on timeout
+        self.start()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self.waiting += 1
+        try:
+            while self.head is None or self.head <= change_seq:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(self._changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return False
+            return True
+        finally:
+            self.waiting -= 1
+
+    async def _run(self):
+        while True:
+            try:
+                async with self.sessionmaker() as session:
+                    head = await session.scalar(select(func.max(Raffle.change_seq))) or 0
+                self.polls += 1
+                if head != self.head:
+                    self.head = head
+                    changed, self._changed = self._changed, asyncio.Event()
+                    changed.set()
+            except SQLAlchemyError:
+                pass
+            await asyncio.sleep(self.interval)
+
+class ReadAPI:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.engine, self.metrics = create_async_read_engine(flask_app)
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.notifier = ChangeNotifier(self.sessionmaker, self.config['ASGI_CHANGE_POLL_INTERVAL'])
+        self._pending_changes = {}
+        self.routes = [
+            (re.compile(r'^/api/raffle/?$'), self.list_raffles),
+            (re.compile(r'^/api/raffle/changes$'), self.get_raffle_changes),
+            (re.compile(r'^/api/raffle/(\d+)$'), self.get_raffle),
+            (re.compile(r'^/api/user/(\d+)$'), self.get_user),
+            (re.compile(r'^/api/user/(\d+)/tickets$'), self.get_user_tickets)
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        for pattern, handler in self.routes:
+            match = pattern.match(scope['path'])
+            if match:
+                break
+        else:
+            return await self._respond(send, {'error': 'Not found'}, 404)
+        if scope['method'] not in ('GET', 'HEAD'):
+            return await self._respond(send, {'error': 'Method not allowed'}, 405)
+        query = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        try:
+            payload, status_code = await handler(query, *(int(group) for group in match.groups()))
+        except SQLAlchemyError as e:
+            payload, status_code = {'error': str(e)}, 400
+        await self._respond(send, payload, status_code, head=scope['method'] == 'HEAD')
+
+    async def _respond(self, send, payload, status_code, head=False):
+        body = self.flask_app.json.dumps(payload).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status_code,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': b'' if head else body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def close(self):
+        await self.notifier.stop()
+        await self.engine.dispose()
+
+    async def list_raffles(self, query):
+        async with self.sessionmaker() as session:
+            raffles = (await session.scalars(select(Raffle))).all()
+        return [raffle.to_dict() for raffle in raffles], 200
+
+    async def get_raffle(self, query, raffle_id):
+        async with self.sessionmaker() as session:
+            raffle = await session.get(Raffle, raffle_id)
+        if not raffle:
+            return {'error': 'Raffle not found'}, 404
+        return raffle.to_dict(), 200
+
+    async def get_raffle_changes(self, query):
+        # Same feed as GET /api/raffle/changes, plus `wait`: with nothing new past the
+        # cursor, hold the request up to that many seconds for the next change.
+        try:
+            limit = min(max(int(query.get('limit', 100)), 1), 1000)
+        except ValueError:
+            limit = 100
+        try:
+            wait = min(max(float(query.get('wait', 0)), 0), self.config['ASGI_LONG_POLL_MAX'])
+        except ValueError:
+            wait = 0
+        parsed = Raffle.parse_change_cursor(query.get('since') or '0')
+        if not parsed:
+            return {'error': "Invalid cursor"}, 400
+        since_seq, since_id = parsed
+
+        raffles = await self._changes(since_seq, since_id, limit)
+        if not raffles and wait and await self.notifier.wait_past(since_seq, wait):
+            raffles = await self._changes(since_seq, since_id, limit)
+        return {
+            'changes': [raffle.to_state_dict() for raffle in raffles],
+            'cursor': raffles[-1].change_cursor if raffles else f"{since_seq}-{since_id}",
+            'has_more': len(raffles) == limit
+        }, 200
+
+    async def _changes(self, since_seq, since_id, limit):
+        # Watchers woken by the same change usually hold the same cursor, so identical
+        # queries in flight share one round trip.
+        key = (since_seq, since_id, limit)
+        pending = self._pending_changes.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._query_changes(since_seq, since_id, limit))
+            self._pending_changes[key] = pending
+            pending.add_done_callback(lambda _: self._pending_changes.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _query_changes(self, since_seq, since_id, limit):
+        async with self.sessionmaker() as session:
+            return (await session.scalars(Raffle.changes_statement(since_seq, since_id, limit))).all()
+
+    async def get_user(self, query, user_id):
+        async with self.sessionmaker() as session:
+            user = await session.get(User, user_id)
+        if not user:
+            return {'error': 'User not found'}, 404
+        return user.to_dict(), 200
+
+    async def get_user_tickets(self, query, user_id):
+        async with self.sessionmaker() as session:
+            if not await session.scalar(select(User.id).where(User.id == user_id)):
+                return {'error': 'User not found'}, 404
+            tickets = (await session.scalars(
+                select(Ticket).where(Ticket.user_id == user_id).order_by(Ticket.id)
+            )).all()
+        return [ticket.to_dict() for ticket in tickets], 200
+
+def create_asgi_app(config_class=None):
+    flask_app = create_app(config_class) if config_class is not None else create_app()
+    return ReadAPI(flask_app)
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy.exc import SQLAlchemyError
+from app.services.raffle_service import RaffleService
+from app.services.user_service import UserService
+from app import db
+from app.utils import data_transfer
+from app.utils.db_router import sync_sqlite_replica
+
+wildrandom_cli = AppGroup('wildrandom', help='Wild Random maintenance commands.')
+
+@wildrandom_cli.command('reconcile-counters')
+@click.option('--raffle-id', type=int, default=None, help='Only reconcile this raffle.')
+def reconcile_counters(raffle_id):
+    """Recompute raffle sold/available counters from the ticket table."""
+    reconciled, error = RaffleService.reconcile_ticket_counters(raffle_id)
+    if error:
+        raise click.ClickException(error)
+    click.echo(f"Reconciled ticket counters of {reconciled} raffle(s).")
+
+@wildrandom_cli.command('sync-replica')
+@click.option('--interval', type=click.IntRange(min=1), default=None,
+              help='Keep copying every INTERVAL seconds instead of once.')
+def sync_replica(interval):
+    """Copy the primary SQLite database into the replica file."""
+    while True:
+        started = time.perf_counter()
+        try:
+            pages = sync_sqlite_replica(db)
+        except (ValueError, sqlite3.Error) as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Copied {pages} pages to the replica in {time.perf_counter() - started:.2f}s")
+        if interval is None:
+            return
+        time.sleep(interval)
+
+@wildrandom_cli.command('compact-balances')
+def compact_balances():
+    """Roll balance ledger entries into the users' balance snapshots."""
+    compacted, error = UserService.compact_balance_ledger()
+    if error:
+        raise click.ClickException(error)
+    click.echo(f"Compacted the balance ledger of {compacted} user(s).")
+
+def _echo_progress(table_name, rows):
+    click.echo(f"  {table_name}: {rows} rows")
+
+@wildrandom_cli.command('export')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(data_transfer.FORMATS), default='jsonl', show_default=True)
+@click.option('--chunk-size', type=click.IntRange(min=1), default=10000, show_default=True)
+def export_data(directory, fmt, chunk_size):
+    """Export users, raffles, tickets, draw results and balance entries as gzip files."""
+    os.makedirs(directory, exist_ok=True)
+    started = time.perf_counter()
+    try:
+        for table in data_transfer.TABLES:
+            path = data_transfer.table_path(directory, table, fmt)
+            exported = data_transfer.export_table(table, path, fmt, chunk_size, _echo_progress)
+            click.echo(f"Exported {exported} {table.name} rows to {path}")
+    except SQLAlchemyError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Export finished in {time.perf_counter() - started:.1f}s")
+
+@wildrandom_cli.command('import')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--chunk-size', type=click.IntRange(min=1), default=10000, show_default=True)
+def import_data(directory, chunk_size):
+    """Import files written by `export` into empty tables."""
+    started = time.perf_counter()
+    try:
+        for table in data_transfer.TABLES:
+            fmt = data_transfer.detect_format(directory, table)
+            if fmt is None:
+                click.echo(f"Skipping {table.name}: no export file found")
+                continue
+            if not data_transfer.table_is_empty(table):
+                raise click.ClickException(f"Table {table.name} is not empty")
+            path = data_transfer.table_path(directory, table, fmt)
+            imported = data_transfer.import_table(table, path, fmt, chunk_size, _echo_progress)
+            click.echo(f"Imported {imported} {table.name} rows from {path}")
+    except (SQLAlchemyError, ValueError, KeyError) as e:
+        raise click.ClickException(f"Import failed: {e}")
+    click.echo(f"Import finished in {time.perf_counter() - started:.1f}s")
@@ -1,2 +1,4 @@
 from .raffle import Raffle
-from .ticket import Ticket
\ No newline at end of file
+from .ticket import Ticket
+from .draw_result import DrawResult
+from .balance_entry import BalanceEntry
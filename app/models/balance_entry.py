@@ -0,0 +1,37 @@
+from app import db
+from datetime import datetime
+from enum import Enum
+from sqlalchemy import Enum as SQLAlchemyEnum
+
+class BalanceEntryKind(Enum):
+    DEPOSIT = 'DEPOSIT'
+    WITHDRAWAL = 'WITHDRAWAL'
+    PURCHASE = 'PURCHASE'
+    REFUND = 'REFUND'
+    PAYOUT = 'PAYOUT'
+
+# Append-only ledger of balance changes. A user's balance is the snapshot stored on
+# the user row plus the entries after its snapshot_entry_id; compaction moves that
+# pointer forward but never deletes entries, so the full history stays available.
+class BalanceEntry(db.Model):
+    __tablename__ = 'balance_entry'
+    __table_args__ = (
+        db.Index('ix_balance_entry_user_id_id', 'user_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    kind = db.Column(SQLAlchemyEnum(BalanceEntryKind), nullable=False)
+    raffle_id = db.Column(db.Integer, db.ForeignKey('raffle.id'), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'amount': self.amount,
+            'kind': self.kind.value,
+            'raffle_id': self.raffle_id,
+            'created_at': self.created_at.isoformat()
+        }
@@ -0,0 +1,29 @@
+from app import db
+
+class DrawResult(db.Model):
+    __tablename__ = 'draw_result'
+    __table_args__ = (
+        db.Index('ix_draw_result_raffle_id_draw_index', 'raffle_id', 'draw_index', unique=True),
+        db.Index('ix_draw_result_user_id', 'user_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    raffle_id = db.Column(db.Integer, db.ForeignKey('raffle.id'), nullable=False)
+    draw_index = db.Column(db.Integer, nullable=False)
+    ticket_number = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    prize_value = db.Column(db.Float, nullable=False)
+    draw_time = db.Column(db.DateTime, nullable=False)
+
+    raffle = db.relationship('Raffle', back_populates='draw_results')
+
+    def to_dict(self):
+        return {
+            "raffle_id": self.raffle_id,
+            "ticket_number": self.ticket_number,
+            "prize_description": self.raffle.prize_description,
+            "prize_value": self.prize_value,
+            "outcome": "Winner" if self.user_id else "No Winner",
+            "user_id": self.user_id if self.user_id else "No Winner",
+            "draw_time": self.draw_time.isoformat()
+        }
@@ -1,7 +1,8 @@
 from app import db
 from datetime import datetime
 from enum import Enum
-from sqlalchemy import Enum as SQLAlchemyEnum
+from sqlalchemy import Enum as SQLAlchemyEnum, and_, case, event, func, insert, or_, select, update
+from sqlalchemy.orm import load_only, object_session
 
 class RaffleStatus(Enum):
     DRAFT = 'DRAFT'
@@ -16,7 +17,26 @@ class PrizeDistributionType(Enum):
     FULL = 'FULL'
     SPLIT = 'SPLIT'
 
+# Single-row counter behind Raffle.change_seq on databases other than SQLite. The
+# bump holds the row lock until commit, so sequence order is commit order: a poller
+# that has seen a change_seq has seen every smaller one.
+raffle_change_counter = db.Table(
+    'raffle_change_counter',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('value', db.Integer, nullable=False, server_default='0')
+)
+
+@event.listens_for(raffle_change_counter, 'after_create')
+def _seed_change_counter(target, connection, **kw):
+    connection.execute(insert(target).values(id=1, value=0))
+
 class Raffle(db.Model):
+    __table_args__ = (
+        db.Index('ix_raffle_status_end_time', 'status', 'end_time'),
+        db.Index('ix_raffle_status_start_time', 'status', 'start_time'),
+        db.Index('ix_raffle_change_seq', 'change_seq'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
@@ -34,28 +54,102 @@ class Raffle(db.Model):
     number_of_draws = db.Column(db.Integer, nullable=False)
     prize_value = db.Column(db.Float, nullable=False)
     prize_distribution_type = db.Column(SQLAlchemyEnum(PrizeDistributionType), nullable=False)
+    # The ticket space of a raffle is the range 1..number_of_tickets and a Ticket
+    # row only exists once that number has been sold. These counters are kept in
+    # step in the same transaction as every purchase, refund and cancellation.
+    sold_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    available_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Every write to a raffle row takes the next value of this sequence, which is
+    # what GET /api/raffle/changes pages through.
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     tickets = db.relationship('Ticket', back_populates='raffle', lazy='dynamic')
+    draw_results = db.relationship('DrawResult', back_populates='raffle', lazy='dynamic',
+                                   order_by='DrawResult.draw_index')
+
+    @classmethod
+    def next_change_seq(cls, connection=None):
+        dialect = connection.dialect if connection is not None else db.engine.dialect
+        if dialect.name == 'sqlite':
+            # MAX over the change_seq index, evaluated inside the writing statement so
+            # SQLite's database write lock orders it against every other raffle write.
+            latest = cls.__table__.alias('latest_change')
+            return select(func.coalesce(func.max(latest.c.change_seq), 0) + 1).scalar_subquery()
+        # Elsewhere writes to different raffles run concurrently, and MySQL cannot
+        # select from the table being written, so the value comes from the counter
+        if connection is None:
+            connection = db.session.connection()
+        counter = raffle_change_counter
+        bump = update(counter).where(counter.c.id == 1).values(value=counter.c.value + 1)
+        if dialect.update_returning:
+            return connection.execute(bump.returning(counter.c.value)).scalar_one()
+        connection.execute(bump)
+        return connection.execute(select(counter.c.value).where(counter.c.id == 1)).scalar_one()
+
+    @classmethod
+    def change_values(cls, now=None):
+        # For bulk UPDATE statements, which bypass the ORM hooks below
+        return {'change_seq': cls.next_change_seq(), 'updated_at': now or datetime.utcnow()}
+
+    @property
+    def change_cursor(self):
+        return f"{self.change_seq}-{self.id}"
+
+    @staticmethod
+    def parse_change_cursor(cursor):
+        change_seq, separator, raffle_id = cursor.partition('-')
+        if not change_seq.isdigit() or (separator and not raffle_id.isdigit()):
+            return None
+        return int(change_seq), int(raffle_id) if separator else 0
+
+    @classmethod
+    def changes_statement(cls, since_seq, since_id, limit):
+        # Keyset over (change_seq, id): set-based writes can give several raffles the
+        # same change_seq, so the id breaks ties without skipping any of them.
+        return select(cls).options(load_only(
+            cls.status, cls.available_count, cls.start_time, cls.end_time, cls.change_seq, cls.updated_at
+        )).where(
+            or_(cls.change_seq > since_seq, and_(cls.change_seq == since_seq, cls.id > since_id))
+        ).order_by(cls.change_seq, cls.id).limit(limit)
+
+    @classmethod
+    def expected_available_count(cls, sold_count):
+        return case((cls.status == RaffleStatus.CANCELLED, 0), else_=cls.number_of_tickets - sold_count)
 
-    def update_status(self):
-        now = datetime.utcnow()
-        if self.status in [RaffleStatus.ENDED, RaffleStatus.CANCELLED]:
-            return
-        elif self.status == RaffleStatus.DRAFT and now >= self.start_time:
-            self.status = RaffleStatus.ACTIVE
-        elif self.status == RaffleStatus.COMING_SOON and now >= self.start_time:
-            self.status = RaffleStatus.ACTIVE
-        elif self.status == RaffleStatus.ACTIVE:
-            if now >= self.end_time:
-                self.status = RaffleStatus.ENDED
-            elif self.tickets.filter_by(user_id=None).count() == 0:
-                self.status = RaffleStatus.SOLD_OUT
-        elif self.status == RaffleStatus.SOLD_OUT and now >= self.end_time:
-            self.status = RaffleStatus.ENDED
-        db.session.commit()
+    def reset_available_count(self):
+        if self.status == RaffleStatus.CANCELLED:
+            self.available_count = 0
+        else:
+            self.available_count = self.number_of_tickets - self.sold_count
+
+    @classmethod
+    def on_sale_clause(cls, now):
+        # SQL form of effective_status() == ACTIVE (SOLD_OUT is left to the caller), so
+        # purchases can check it inside the claiming UPDATE.
+        return and_(
+            or_(
+                cls.status == RaffleStatus.ACTIVE,
+                and_(cls.status.in_([RaffleStatus.DRAFT, RaffleStatus.COMING_SOON]), cls.start_time <= now)
+            ),
+            cls.end_time > now
+        )
+
+    def effective_status(self, now=None):
+        # Time-based transitions are derived on read; the stored status only changes
+        # through explicit transitions and the scheduler's set-based UPDATEs
+        # (RaffleService.start_due_raffles / end_due_raffles).
+        now = now or datetime.utcnow()
+        status = self.status
+        if status in [RaffleStatus.DRAFT, RaffleStatus.COMING_SOON] and now >= self.start_time:
+            status = RaffleStatus.ACTIVE
+        if status == RaffleStatus.ACTIVE and self.available_count == 0:
+            status = RaffleStatus.SOLD_OUT
+        if status in [RaffleStatus.ACTIVE, RaffleStatus.SOLD_OUT] and now >= self.end_time:
+            status = RaffleStatus.ENDED
+        return status
 
     def to_dict(self):
-        self.update_status()
         return {
             'id': self.id,
             'name': self.name,
@@ -68,15 +162,25 @@ class Raffle(db.Model):
             'ticket_price': self.ticket_price,
             'number_of_tickets': self.number_of_tickets,
             'max_tickets_per_user': self.max_tickets_per_user,
-            'status': self.status.value,
+            'status': self.effective_status().value,
             'result': self.result,
             'general_terms_link': self.general_terms_link,
             'number_of_draws': self.number_of_draws,
             'prize_value': self.prize_value,
             'prize_distribution_type': self.prize_distribution_type.value,
-            'available_tickets': self.tickets.filter_by(user_id=None).count()
+            'available_tickets': self.available_count
         }
     
+    def to_state_dict(self):
+        return {
+            'id': self.id,
+            'status': self.effective_status().value,
+            'available_tickets': self.available_count,
+            'start_time': self.start_time.isoformat(),
+            'end_time': self.end_time.isoformat(),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
     def get_formatted_result(self):
         if not self.result:
             return None
@@ -94,4 +198,16 @@ class Raffle(db.Model):
                     "ticket_id": parts[1].split(" ")[1],
                     "prize": float(parts[2].split(" ")[1])
                 })
-        return formatted_results
\ No newline at end of file
+        return formatted_results
+
+@event.listens_for(Raffle, 'before_insert')
+def _stamp_new_raffle(mapper, connection, target):
+    target.change_seq = Raffle.next_change_seq(connection)
+    target.updated_at = datetime.utcnow()
+
+@event.listens_for(Raffle, 'before_update')
+def _stamp_changed_raffle(mapper, connection, target):
+    # before_update also fires for rows flushed without net column changes
+    if object_session(target).is_modified(target, include_collections=False):
+        target.change_seq = Raffle.next_change_seq(connection)
+        target.updated_at = datetime.utcnow()
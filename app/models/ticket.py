@@ -2,6 +2,12 @@ from app import db
 from datetime import datetime
 
 class Ticket(db.Model):
+    __table_args__ = (
+        db.Index('ix_ticket_raffle_id_user_id', 'raffle_id', 'user_id'),
+        db.Index('ix_ticket_raffle_id_ticket_number', 'raffle_id', 'ticket_number', unique=True),
+        db.Index('ix_ticket_user_id', 'user_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     raffle_id = db.Column(db.Integer, db.ForeignKey('raffle.id'), nullable=False)
     ticket_number = db.Column(db.Integer, nullable=False)
@@ -15,6 +21,13 @@ class Ticket(db.Model):
     def ticket_id(self):
         return f"{self.raffle_id}-{self.ticket_number:04d}"
 
+    @staticmethod
+    def parse_ticket_id(ticket_id):
+        raffle_id, separator, ticket_number = ticket_id.partition('-')
+        if not separator or not raffle_id.isdigit() or not ticket_number.isdigit():
+            return None
+        return int(raffle_id), int(ticket_number)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -24,12 +37,3 @@ class Ticket(db.Model):
             'user_id': self.user_id,
             'purchase_time': self.purchase_time.isoformat() if self.purchase_time else None
         }
-
-    @staticmethod
-    def generate_tickets(raffle_id, number_of_tickets):
-        tickets = []
-        for i in range(1, number_of_tickets + 1):
-            ticket = Ticket(raffle_id=raffle_id, ticket_number=i)
-            tickets.append(ticket)
-        db.session.bulk_save_objects(tickets)
-        db.session.commit()
\ No newline at end of file
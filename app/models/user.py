@@ -1,40 +1,109 @@
 from app import db
+from datetime import datetime
+from sqlalchemy import func, insert, literal, or_, select, bindparam
+from sqlalchemy.orm import column_property
 from werkzeug.security import generate_password_hash, check_password_hash
+from app.models.balance_entry import BalanceEntry, BalanceEntryKind
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
     email = db.Column(db.String(120), index=True, unique=True)
     password_hash = db.Column(db.String(128))
-    balance = db.Column(db.Float, default=0.0)
+    # Balance as of the ledger entry snapshot_entry_id; later entries are the tail
+    balance_snapshot = db.Column('balance', db.Float, default=0.0)
+    snapshot_entry_id = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    balance_tail = column_property(
+        select(func.coalesce(func.sum(BalanceEntry.amount), 0.0))
+        .where(BalanceEntry.user_id == id, BalanceEntry.id > snapshot_entry_id)
+        .correlate_except(BalanceEntry)
+        .scalar_subquery()
+    )
 
     tickets = db.relationship('Ticket', back_populates='user')
 
     def __repr__(self):
         return f'<User {self.username}>'
 
+    @property
+    def balance(self):
+        return (self.balance_snapshot or 0.0) + (self.balance_tail or 0.0)
+
+    @classmethod
+    def current_balance(cls):
+        return func.coalesce(cls.balance_snapshot, 0.0) + cls.balance_tail
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    @classmethod
+    def balance_entry_statement(cls, kind, now=None):
+        # INSERT ... SELECT of one ledger entry per parameter set (entry_user_id,
+        # amount, raffle_id). Nothing is inserted for a missing user, nor for a debit
+        # the current balance cannot cover, so callers check the rowcount.
+        amount = bindparam('amount', type_=db.Float)
+        source = select(
+            cls.id,
+            amount,
+            literal(kind, BalanceEntry.kind.type),
+            bindparam('raffle_id', type_=db.Integer),
+            literal(now or datetime.utcnow(), db.DateTime)
+        ).where(
+            cls.id == bindparam('entry_user_id'),
+            or_(amount >= 0, cls.current_balance() + amount >= 0)
+        )
+        # Core table insert: the ORM would read a parameter list as a bulk INSERT
+        return insert(BalanceEntry.__table__).from_select(
+            ['user_id', 'amount', 'kind', 'raffle_id', 'created_at'], source
+        )
+
+    @classmethod
+    def lock_balances(cls, user_ids):
+        # Debits of one user must go in one at a time, as the guard reads the balance
+        # a concurrent debit is about to lower. Credits need no lock: they cannot
+        # overdraw, and compaction only folds entries below a commit watermark.
+        # SQLite's database write lock already serializes writers; elsewhere the user
+        # rows are locked, in id order so concurrent batches cannot deadlock.
+        if db.engine.dialect.name == 'sqlite':
+            return
+        db.session.execute(
+            select(cls.id).where(cls.id.in_(sorted(set(user_ids)))).order_by(cls.id).with_for_update()
+        ).all()
+
+    @classmethod
+    def adjust_balance(cls, user_id, amount, kind=None, raffle_id=None):
+        # Appends a ledger entry instead of rewriting the user row, so concurrent
+        # adjustments never overwrite each other, and with the user row locked a
+        # debit can never take the balance below zero. Returns False when the user
+        # does not exist or cannot cover a debit. The caller commits.
+        if kind is None:
+            kind = BalanceEntryKind.DEPOSIT if amount >= 0 else BalanceEntryKind.WITHDRAWAL
+        if amount < 0:
+            cls.lock_balances([user_id])
+        result = db.session.execute(
+            cls.balance_entry_statement(kind),
+            {'entry_user_id': user_id, 'amount': amount, 'raffle_id': raffle_id}
+        )
+        return result.rowcount == 1
+
     def add_balance(self, amount):
-        self.balance += amount
+        User.adjust_balance(self.id, amount)
         db.session.commit()
 
     def subtract_balance(self, amount):
-        if self.balance >= amount:
-            self.balance -= amount
-            db.session.commit()
-            return True
-        return False
+        if not User.adjust_balance(self.id, -amount):
+            db.session.rollback()
+            return False
+        db.session.commit()
+        return True
 
     def update_balance(self, amount):
-        new_balance = self.balance + amount
-        if new_balance < 0:
+        if not User.adjust_balance(self.id, amount):
+            db.session.rollback()
             return False, "Insufficient funds"
-        self.balance = new_balance
         db.session.commit()
         return True, f"Balance updated. New balance: {self.balance}"
 
@@ -44,4 +113,4 @@ class User(db.Model):
             'username': self.username,
             'email': self.email,
             'balance': self.balance
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,167 @@
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models.raffle import Raffle, RaffleStatus
+
+START = 'start'
+END = 'end'
+
+RETRY_DELAY = timedelta(seconds=5)
+
+ENDABLE_STATUSES = [RaffleStatus.ACTIVE, RaffleStatus.COMING_SOON, RaffleStatus.PAUSED, RaffleStatus.SOLD_OUT]
+
+class RaffleScheduler:
+    # Keeps a min-heap of the upcoming start/end deadlines inside the next `window`
+    # seconds and sleeps until the earliest one, so transitions fire on time without
+    # polling the raffle table. The heap is refilled from the (status, start_time) and
+    # (status, end_time) indexes when the window runs out, and RaffleService pushes
+    # raffles that are created or rescheduled in between.
+    def __init__(self, app, window=3600):
+        self.app = app
+        self.window = timedelta(seconds=window)
+        self._heap = []
+        self._queued = set()
+        self._sequence = itertools.count()
+        self._loaded_until = None
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._draws = ThreadPoolExecutor(max_workers=1, thread_name_prefix='raffle-scheduler-draw')
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='raffle-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._draws.shutdown(wait=True)
+
+    def notify(self, raffle):
+        with self._condition:
+            if raffle.status == RaffleStatus.COMING_SOON:
+                self._push(raffle.start_time, START, raffle.id)
+            if raffle.status in ENDABLE_STATUSES:
+                self._push(raffle.end_time, END, raffle.id)
+            self._condition.notify()
+
+    def pending(self):
+        with self._condition:
+            return sorted((when, kind, raffle_id) for when, _, kind, raffle_id in self._heap)
+
+    def _push(self, when, kind, raffle_id):
+        # Events beyond the loaded window are picked up by the next refill
+        if self._loaded_until is not None and when > self._loaded_until:
+            return
+        key = (when, kind, raffle_id)
+        if key in self._queued:
+            return
+        self._queued.add(key)
+        heapq.heappush(self._heap, (when, next(self._sequence), kind, raffle_id))
+
+    def _refill(self, now):
+        horizon = now + self.window
+        starts = db.session.query(Raffle.id, Raffle.start_time).filter(
+            Raffle.status == RaffleStatus.COMING_SOON, Raffle.start_time <= horizon
+        ).all()
+        ends = db.session.query(Raffle.id, Raffle.end_time).filter(
+            Raffle.status.in_(ENDABLE_STATUSES), Raffle.end_time <= horizon
+        ).all()
+        with self._condition:
+            self._loaded_until = horizon
+            for raffle_id, start_time in starts:
+                self._push(start_time, START, raffle_id)
+            for raffle_id, end_time in ends:
+                self._push(end_time, END, raffle_id)
+
+    def _pop_due(self, now):
+        due = {}
+        while self._heap and self._heap[0][0] <= now:
+            when, _, kind, raffle_id = heapq.heappop(self._heap)
+            self._queued.discard((when, kind, raffle_id))
+            due.setdefault(kind, []).append(raffle_id)
+        return due
+
+    def _fire(self, due, now):
+        # Transitions are set-based, so one call handles every raffle due at this instant,
+        # and an event left over from a rescheduled raffle is a harmless no-op. A failed
+        # transition puts its events back to be retried after RETRY_DELAY.
+        from app.services.raffle_service import RaffleService
+        transitions = [(START, RaffleService.start_due_raffles), (END, RaffleService.end_due_raffles)]
+        for kind, transition in transitions:
+            if kind not in due:
+                continue
+            try:
+                _, error = transition(now)
+            except Exception as e:
+                db.session.rollback()
+                error = str(e)
+            if error:
+                current_app.logger.error(f"Scheduled raffle {kind} failed, retrying: {error}")
+                with self._condition:
+                    for raffle_id in due[kind]:
+                        self._push(now + RETRY_DELAY, kind, raffle_id)
+            elif kind == END:
+                # draw_pending_raffles only picks up raffles stored as ENDED
+                self._draws.submit(self._draw_pending)
+
+    def _draw_pending(self):
+        from app.services.raffle_service import RaffleService
+        with self.app.app_context():
+            try:
+                RaffleService.draw_pending_raffles()
+            finally:
+                db.session.remove()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopping:
+                    return
+            now = datetime.utcnow()
+            retry_at = None
+            with self.app.app_context():
+                try:
+                    if self._loaded_until is None or now >= self._loaded_until:
+                        self._refill(now)
+                    with self._condition:
+                        due = self._pop_due(now)
+                    if due:
+                        self._fire(due, now)
+                except Exception:
+                    current_app.logger.exception("Raffle scheduler tick failed")
+                    retry_at = now + RETRY_DELAY
+                finally:
+                    db.session.remove()
+
+            with self._condition:
+                if self._stopping:
+                    return
+                wake_at = self._loaded_until or now + self.window
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                if retry_at is not None:
+                    wake_at = min(wake_at, retry_at)
+                timeout = (wake_at - datetime.utcnow()).total_seconds()
+                if timeout > 0:
+                    self._condition.wait(timeout)
+
+def init_scheduler(app):
+    scheduler = RaffleScheduler(app, window=app.config['RAFFLE_SCHEDULER_WINDOW'])
+    app.extensions['raffle_scheduler'] = scheduler
+    scheduler.start()
+    return scheduler
+
+def schedule_raffle(raffle):
+    scheduler = current_app.extensions.get('raffle_scheduler')
+    if scheduler is not None:
+        scheduler.notify(raffle)
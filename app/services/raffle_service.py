@@ -1,12 +1,21 @@
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
 from app.models.raffle import Raffle, RaffleStatus, PrizeDistributionType
 from app.models.ticket import Ticket
+from app.models.draw_result import DrawResult
+from app.models.user import User
+from app.models.balance_entry import BalanceEntryKind
 from app import db
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
-from app.utils.random_generator import generate_winning_ticket
-from sqlalchemy import func
+from app.utils.random_generator import sample_ticket_numbers
+from app.utils.ticket_allocator import discard_allocator
+from app.scheduler import schedule_raffle
+from app.utils.response_cache import invalidate_raffle
+from sqlalchemy import and_, func, insert, or_, select, update
+from app.utils.db_router import reads_from_replica
 
 class RaffleService:
     @staticmethod
@@ -31,15 +40,14 @@ class RaffleService:
                 status=RaffleStatus.DRAFT,
                 number_of_draws=number_of_draws,
                 prize_value=prize_value,
-                prize_distribution_type=prize_distribution_type
+                prize_distribution_type=prize_distribution_type,
+                sold_count=0,
+                available_count=number_of_tickets
             )
             db.session.add(new_raffle)
-            db.session.flush()  # This ensures the raffle gets an ID before we generate tickets
-
-            # Generate tickets for the new raffle
-            Ticket.generate_tickets(new_raffle.id, number_of_tickets)
-
             db.session.commit()
+            invalidate_raffle(new_raffle.id)
+            schedule_raffle(new_raffle)
             return new_raffle, None
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -58,29 +66,56 @@ class RaffleService:
             for key, value in kwargs.items():
                 if hasattr(raffle, key):
                     setattr(raffle, key, value)
+            raffle.reset_available_count()
 
             db.session.commit()
+            discard_allocator(raffle_id)
+            invalidate_raffle(raffle_id)
+            schedule_raffle(raffle)
             return raffle, None
         except SQLAlchemyError as e:
             db.session.rollback()
             return None, str(e)
 
     @staticmethod
+    @reads_from_replica
     def get_raffle(raffle_id):
         try:
             raffle = Raffle.query.get(raffle_id)
-            if raffle:
-                raffle.update_status()
             return raffle, None
         except SQLAlchemyError as e:
             return None, str(e)
 
     @staticmethod
+    def get_on_sale_raffle_ids():
+        try:
+            now = datetime.utcnow()
+            rows = db.session.query(Raffle.id).filter(
+                Raffle.on_sale_clause(now), Raffle.available_count > 0
+            ).all()
+            return [raffle_id for raffle_id, in rows], None
+        except SQLAlchemyError as e:
+            return None, str(e)
+
+    @staticmethod
+    @reads_from_replica
+    def get_raffle_changes(since=None, limit=100):
+        try:
+            parsed = Raffle.parse_change_cursor(since or '0')
+            if not parsed:
+                return None, None, "Invalid cursor"
+            since_seq, since_id = parsed
+            raffles = db.session.scalars(Raffle.changes_statement(since_seq, since_id, limit)).all()
+            next_cursor = raffles[-1].change_cursor if raffles else f"{since_seq}-{since_id}"
+            return raffles, next_cursor, None
+        except SQLAlchemyError as e:
+            return None, None, str(e)
+
+    @staticmethod
+    @reads_from_replica
     def list_raffles():
         try:
             raffles = Raffle.query.all()
-            for raffle in raffles:
-                raffle.update_status()
             return raffles, None
         except SQLAlchemyError as e:
             return None, str(e)
@@ -92,24 +127,26 @@ class RaffleService:
             if not raffle:
                 return None, "Raffle not found"
 
-            if raffle.status != RaffleStatus.ENDED:
-                return None, f"Cannot select winner. Raffle status is {raffle.status}"
+            status = raffle.effective_status()
+            if status != RaffleStatus.ENDED:
+                return None, f"Cannot select winner. Raffle status is {status}"
 
             if raffle.result:
                 return None, "Winners already selected"
 
-            all_tickets = raffle.tickets.all()
-            if not all_tickets:
+            if raffle.number_of_tickets < 1:
                 return None, "No tickets were generated for this raffle"
 
+            # Draws cover the whole ticket range; unsold numbers have no row and
+            # result in "No Winner". Only the winning rows are read.
+            winning_numbers = sample_ticket_numbers(raffle.number_of_tickets, raffle.number_of_draws)
+            ticket_owners = RaffleService._ticket_owners(raffle.id, winning_numbers)
             winners = []
+            draw_results = []
             draw_time = datetime.utcnow()
-            for _ in range(raffle.number_of_draws):
-                if not all_tickets:
-                    break
-                winning_ticket_number = generate_winning_ticket(len(all_tickets))
-                winning_ticket = all_tickets.pop(winning_ticket_number - 1)
-                
+            for draw_index, winning_ticket_number in enumerate(winning_numbers, start=1):
+                winning_user_id = ticket_owners.get(winning_ticket_number)
+
                 if raffle.prize_distribution_type == PrizeDistributionType.SPLIT:
                     prize_value = raffle.prize_value / raffle.number_of_draws
                 else:
@@ -117,22 +154,62 @@ class RaffleService:
 
                 winner_info = {
                     "raffle_id": raffle.id,
-                    "ticket_number": winning_ticket.ticket_number,
+                    "ticket_number": winning_ticket_number,
                     "prize_description": raffle.prize_description,
                     "prize_value": prize_value,
-                    "outcome": "Winner" if winning_ticket.user_id else "No Winner",
-                    "user_id": winning_ticket.user_id if winning_ticket.user_id else "No Winner",
+                    "outcome": "Winner" if winning_user_id else "No Winner",
+                    "user_id": winning_user_id if winning_user_id else "No Winner",
                     "draw_time": draw_time.isoformat()
                 }
                 winners.append(winner_info)
+                draw_results.append({
+                    "raffle_id": raffle.id,
+                    "draw_index": draw_index,
+                    "ticket_number": winning_ticket_number,
+                    "user_id": winning_user_id,
+                    "prize_value": prize_value,
+                    "draw_time": draw_time
+                })
 
-            raffle.result = json.dumps(winners)
+            # Conditional on no result being stored yet, so concurrent draws of the
+            # same raffle (e.g. two schedulers) cannot both record winners.
+            recorded = db.session.execute(
+                update(Raffle)
+                .where(Raffle.id == raffle.id, Raffle.result.is_(None))
+                .values(result=json.dumps(winners), status=RaffleStatus.ENDED, **Raffle.change_values())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not recorded:
+                db.session.rollback()
+                return None, "Winners already selected"
+            if draw_results:
+                db.session.execute(insert(DrawResult), draw_results)
+            # Prizes are paid into the winners' balances in the same transaction
+            payouts = [
+                {'entry_user_id': result['user_id'], 'amount': result['prize_value'], 'raffle_id': raffle.id}
+                for result in draw_results if result['user_id'] is not None and result['prize_value'] > 0
+            ]
+            if payouts:
+                db.session.execute(User.balance_entry_statement(BalanceEntryKind.PAYOUT, draw_time), payouts)
             db.session.commit()
+            discard_allocator(raffle.id)
+            invalidate_raffle(raffle.id)
             return winners, None
         except SQLAlchemyError as e:
             db.session.rollback()
             return None, str(e)
 
+    @staticmethod
+    def _ticket_owners(raffle_id, ticket_numbers, chunk_size=500):
+        owners = {}
+        for start in range(0, len(ticket_numbers), chunk_size):
+            rows = db.session.query(Ticket.ticket_number, Ticket.user_id).filter(
+                Ticket.raffle_id == raffle_id,
+                Ticket.ticket_number.in_(ticket_numbers[start:start + chunk_size])
+            )
+            owners.update(rows)
+        return owners
+
     @staticmethod
     def set_raffle_status(raffle_id, new_status):
         try:
@@ -147,7 +224,10 @@ class RaffleService:
                 return False, f"Cannot change status of {raffle.status} raffle"
 
             raffle.status = new_status
+            raffle.reset_available_count()
             db.session.commit()
+            invalidate_raffle(raffle_id)
+            schedule_raffle(raffle)
             return True, f"Raffle status set to {new_status.value}"
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -155,41 +235,102 @@ class RaffleService:
 
     @staticmethod
     def get_user_raffle_history(user_id):
+        history, _, error = RaffleService.get_user_raffle_history_page(user_id, limit=None)
+        return history, error
+
+    @staticmethod
+    @reads_from_replica
+    def get_user_raffle_history_page(user_id, cursor=None, limit=50, per_raffle=False):
+        # Keyset pagination: `cursor` is the last ticket id (or raffle id in per-raffle
+        # mode) of the previous page, and a page always costs the same two statements.
         try:
-            user_tickets = Ticket.query.filter_by(user_id=user_id).all()
+            if per_raffle:
+                query = db.session.query(
+                    Raffle,
+                    func.count(Ticket.id),
+                    func.max(Ticket.purchase_time)
+                ).join(Ticket, Ticket.raffle_id == Raffle.id).filter(
+                    Ticket.user_id == user_id
+                ).group_by(Raffle.id).order_by(Raffle.id.desc())
+                if cursor is not None:
+                    query = query.filter(Raffle.id < cursor)
+            else:
+                query = db.session.query(Ticket.id, Ticket.ticket_number, Ticket.purchase_time, Raffle).join(
+                    Raffle, Ticket.raffle_id == Raffle.id
+                ).filter(Ticket.user_id == user_id).order_by(Ticket.id.desc())
+                if cursor is not None:
+                    query = query.filter(Ticket.id < cursor)
+            if limit is not None:
+                query = query.limit(limit + 1)
+            rows = query.all()
+
+            next_cursor = None
+            if limit is not None and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = rows[-1][0].id if per_raffle else rows[-1][0]
+
+            outcomes = RaffleService._user_raffle_outcomes(
+                user_id, {row[0] if per_raffle else row[3] for row in rows}
+            )
             raffle_history = []
-            for ticket in user_tickets:
-                raffle = ticket.raffle
-                win_status = "The draw hasn't taken place yet"
-                prize_value = "Pending number of winners" if raffle.prize_distribution_type == PrizeDistributionType.SPLIT else raffle.prize_value
-
-                if raffle.status == RaffleStatus.ENDED:
-                    if raffle.result:
-                        try:
-                            results = json.loads(raffle.result)
-                            winning_ticket = next((r for r in results if r['user_id'] == user_id), None)
-                            if winning_ticket:
-                                win_status = "You Win!"
-                                prize_value = winning_ticket['prize_value']
-                            else:
-                                win_status = "No win"
-                        except json.JSONDecodeError:
-                            # If raffle.result is not a valid JSON, treat it as if no draw has taken place
-                            win_status = "Error in draw results"
-                    else:
-                        win_status = "Draw completed, but no results available"
-
-                raffle_history.append({
-                    'purchase_time': ticket.purchase_time.isoformat() if ticket.purchase_time else None,
-                    'raffle_name': raffle.name,
-                    'prize_description': raffle.prize_description,
-                    'prize_value': prize_value,
-                    'ticket_number': ticket.ticket_number,
-                    'win': win_status
-                })
-            return raffle_history, None
+            if per_raffle:
+                for raffle, ticket_count, last_purchase_time in rows:
+                    win_status, prize_value = outcomes[raffle.id]
+                    raffle_history.append({
+                        'raffle_id': raffle.id,
+                        'raffle_name': raffle.name,
+                        'prize_description': raffle.prize_description,
+                        'prize_value': prize_value,
+                        'ticket_count': ticket_count,
+                        'last_purchase_time': last_purchase_time.isoformat() if last_purchase_time else None,
+                        'win': win_status
+                    })
+            else:
+                for _, ticket_number, purchase_time, raffle in rows:
+                    win_status, prize_value = outcomes[raffle.id]
+                    raffle_history.append({
+                        'purchase_time': purchase_time.isoformat() if purchase_time else None,
+                        'raffle_name': raffle.name,
+                        'prize_description': raffle.prize_description,
+                        'prize_value': prize_value,
+                        'ticket_number': ticket_number,
+                        'win': win_status
+                    })
+            return raffle_history, next_cursor, None
         except SQLAlchemyError as e:
-            return None, str(e)
+            return None, None, str(e)
+
+    @staticmethod
+    def _user_raffle_outcomes(user_id, raffles):
+        # Win status is worked out once per raffle, with a single indexed lookup of
+        # this user's prizes across all of the drawn raffles.
+        drawn_raffle_ids = [raffle.id for raffle in raffles
+                            if raffle.result and raffle.effective_status() == RaffleStatus.ENDED]
+        wins = {}
+        if drawn_raffle_ids:
+            for draw_result in DrawResult.query.filter(
+                    DrawResult.user_id == user_id,
+                    DrawResult.raffle_id.in_(drawn_raffle_ids)
+            ).order_by(DrawResult.draw_index):
+                wins.setdefault(draw_result.raffle_id, draw_result)
+
+        outcomes = {}
+        for raffle in raffles:
+            win_status = "The draw hasn't taken place yet"
+            prize_value = "Pending number of winners" if raffle.prize_distribution_type == PrizeDistributionType.SPLIT else raffle.prize_value
+
+            if raffle.effective_status() == RaffleStatus.ENDED:
+                if raffle.result:
+                    winning_draw = wins.get(raffle.id)
+                    if winning_draw:
+                        win_status = "You Win!"
+                        prize_value = winning_draw.prize_value
+                    else:
+                        win_status = "No win"
+                else:
+                    win_status = "Draw completed, but no results available"
+            outcomes[raffle.id] = (win_status, prize_value)
+        return outcomes
 
     @staticmethod
     def activate_raffle(raffle_id):
@@ -197,7 +338,7 @@ class RaffleService:
             raffle = Raffle.query.get(raffle_id)
             if not raffle:
                 return False, "Raffle not found"
-            if raffle.status not in [RaffleStatus.DRAFT, RaffleStatus.PAUSED]:
+            if raffle.status not in [RaffleStatus.DRAFT, RaffleStatus.COMING_SOON, RaffleStatus.PAUSED]:
                 return False, f"Cannot activate raffle. Current status: {raffle.status}"
             
             now = datetime.utcnow()
@@ -207,6 +348,8 @@ class RaffleService:
                 raffle.status = RaffleStatus.ACTIVE
             
             db.session.commit()
+            invalidate_raffle(raffle_id)
+            schedule_raffle(raffle)
             return True, f"Raffle set to {raffle.status.value}"
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -218,10 +361,12 @@ class RaffleService:
             raffle = Raffle.query.get(raffle_id)
             if not raffle:
                 return False, "Raffle not found"
-            if raffle.status in [RaffleStatus.ENDED, RaffleStatus.CANCELLED]:
-                return False, f"Cannot pause raffle. Current status: {raffle.status}"
+            status = raffle.effective_status()
+            if status in [RaffleStatus.ENDED, RaffleStatus.CANCELLED]:
+                return False, f"Cannot pause raffle. Current status: {status}"
             raffle.status = RaffleStatus.PAUSED
             db.session.commit()
+            invalidate_raffle(raffle_id)
             return True, "Raffle paused"
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -233,62 +378,84 @@ class RaffleService:
             raffle = Raffle.query.get(raffle_id)
             if not raffle:
                 return False, "Raffle not found"
-            if raffle.status in [RaffleStatus.ENDED, RaffleStatus.CANCELLED]:
-                return False, f"Cannot cancel raffle. Current status: {raffle.status}"
+            status = raffle.effective_status()
+            if status in [RaffleStatus.ENDED, RaffleStatus.CANCELLED]:
+                return False, f"Cannot cancel raffle. Current status: {status}"
             raffle.status = RaffleStatus.CANCELLED
+            raffle.reset_available_count()
             db.session.commit()
+            discard_allocator(raffle_id)
+            invalidate_raffle(raffle_id)
             return True, "Raffle cancelled"
         except SQLAlchemyError as e:
             db.session.rollback()
             return False, str(e)
 
     @staticmethod
+    @reads_from_replica
     def get_remaining_tickets(raffle_id):
         try:
-            raffle = Raffle.query.get(raffle_id)
-            if not raffle:
+            available_count = db.session.scalar(select(Raffle.available_count).where(Raffle.id == raffle_id))
+            if available_count is None:
                 return None, "Raffle not found"
-            return raffle.tickets.filter_by(user_id=None).all(), None
+            return available_count, None
         except SQLAlchemyError as e:
             return None, str(e)
 
     @staticmethod
+    @reads_from_replica
     def get_raffle_draw_history(raffle_id):
         try:
             raffle = Raffle.query.get(raffle_id)
             if not raffle:
                 return None, "Raffle not found"
-            if not raffle.result:
+            draw_results = raffle.draw_results.all()
+            if not draw_results:
                 return None, "No draw has been performed yet"
-            return json.loads(raffle.result), None
+            return [draw_result.to_dict() for draw_result in draw_results], None
         except SQLAlchemyError as e:
             return None, str(e)
 
     @staticmethod
+    @reads_from_replica
     def get_comprehensive_raffle_info(raffle_id=None):
         try:
+            # One grouped aggregate over the sold tickets of every raffle, joined to raffle
+            sold_tickets = func.count(Ticket.id)
+            query = (
+                db.session.query(
+                    Raffle,
+                    sold_tickets,
+                    func.count(func.distinct(Ticket.user_id)),
+                    sold_tickets * Raffle.ticket_price
+                )
+                .outerjoin(Ticket, and_(Ticket.raffle_id == Raffle.id, Ticket.user_id.isnot(None)))
+                .group_by(Raffle.id)
+                .order_by(Raffle.id)
+            )
             if raffle_id:
-                raffles = [Raffle.query.get(raffle_id)]
-                if not raffles[0]:
-                    return None, "Raffle not found"
-            else:
-                raffles = Raffle.query.all()
+                query = query.filter(Raffle.id == raffle_id)
+            rows = query.all()
+            if raffle_id and not rows:
+                return None, "Raffle not found"
 
-            comprehensive_info = []
+            # Draw outcomes of every drawn raffle in one more query
+            draw_results = {}
+            drawn_raffle_ids = [raffle.id for raffle, *_ in rows if raffle.result]
+            if drawn_raffle_ids:
+                for draw_result in DrawResult.query.filter(DrawResult.raffle_id.in_(drawn_raffle_ids)).order_by(
+                        DrawResult.raffle_id, DrawResult.draw_index):
+                    draw_results.setdefault(draw_result.raffle_id, []).append(draw_result.to_dict())
 
-            for raffle in raffles:
-                raffle.update_status()
-                tickets = Ticket.query.filter_by(raffle_id=raffle.id).all()
-                sold_tickets = len([t for t in tickets if t.user_id is not None])
-                total_income = raffle.ticket_price * sold_tickets
-                unique_participants = db.session.query(func.count(func.distinct(Ticket.user_id))).filter(Ticket.raffle_id == raffle.id, Ticket.user_id.isnot(None)).scalar()
+            comprehensive_info = []
 
+            for raffle, sold_tickets, unique_participants, total_income in rows:
                 raffle_info = raffle.to_dict()
                 raffle_info.update({
                     "unique_participants": unique_participants,
                     "total_sold_tickets": sold_tickets,
-                    "total_income": round(total_income, 2),
-                    "draw_results": json.loads(raffle.result) if raffle.result else "No draw has been performed yet."
+                    "total_income": round(total_income or 0, 2),
+                    "draw_results": draw_results.get(raffle.id, "No draw has been performed yet.")
                 })
 
                 comprehensive_info.append(raffle_info)
@@ -310,7 +477,114 @@ class RaffleService:
             raffle.status = RaffleStatus.ENDED
             raffle.end_time = datetime.utcnow()  # Update end time to now
             db.session.commit()
+            discard_allocator(raffle_id)
+            invalidate_raffle(raffle_id)
             return True, "Raffle ended successfully"
         except SQLAlchemyError as e:
             db.session.rollback()
-            return False, str(e)
\ No newline at end of file
+            return False, str(e)
+
+    @staticmethod
+    def reconcile_ticket_counters(raffle_id=None):
+        try:
+            sold_count = select(func.count(Ticket.id)).where(
+                Ticket.raffle_id == Raffle.id, Ticket.user_id.isnot(None)
+            ).scalar_subquery()
+            available_count = Raffle.expected_available_count(sold_count)
+            statement = (
+                update(Raffle)
+                .where(or_(Raffle.sold_count != sold_count, Raffle.available_count != available_count))
+                .values(sold_count=sold_count, available_count=available_count, **Raffle.change_values())
+                .execution_options(synchronize_session=False)
+            )
+            if raffle_id:
+                statement = statement.where(Raffle.id == raffle_id)
+            reconciled = db.session.execute(statement).rowcount
+            db.session.commit()
+            if reconciled:
+                invalidate_raffle()
+            return reconciled, None
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return None, str(e)
+
+    @staticmethod
+    def start_due_raffles(now=None):
+        try:
+            now = now or datetime.utcnow()
+            started = db.session.execute(
+                update(Raffle)
+                .where(Raffle.status == RaffleStatus.COMING_SOON, Raffle.start_time <= now)
+                .values(status=RaffleStatus.ACTIVE, **Raffle.change_values(now))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if started:
+                invalidate_raffle()
+            return started, None
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return None, str(e)
+
+    @staticmethod
+    def end_due_raffles(now=None):
+        try:
+            now = now or datetime.utcnow()
+            ended = db.session.execute(
+                update(Raffle)
+                .where(
+                    Raffle.status.in_([RaffleStatus.ACTIVE, RaffleStatus.COMING_SOON, RaffleStatus.PAUSED, RaffleStatus.SOLD_OUT]),
+                    Raffle.end_time <= now
+                )
+                .values(status=RaffleStatus.ENDED, **Raffle.change_values(now))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if ended:
+                invalidate_raffle()
+            return ended, None
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return None, str(e)
+
+    @staticmethod
+    def draw_pending_raffles(max_workers=None):
+        try:
+            raffle_ids = db.session.scalars(
+                select(Raffle.id).where(Raffle.status == RaffleStatus.ENDED, Raffle.result.is_(None))
+            ).all()
+        except SQLAlchemyError as e:
+            return None, str(e)
+
+        # Each draw runs in its own app context, and so its own session, on a bounded
+        # pool. A failed draw leaves its raffle pending for the next run.
+        app = current_app._get_current_object()
+        def draw(raffle_id):
+            with app.app_context():
+                try:
+                    return RaffleService.select_winner(raffle_id)
+                except Exception as e:
+                    app.logger.exception(f"Draw for raffle {raffle_id} failed")
+                    return None, str(e)
+                finally:
+                    db.session.remove()
+
+        started = time.perf_counter()
+        max_workers = max_workers or current_app.config['RAFFLE_DRAW_WORKERS']
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='raffle-draw') as pool:
+            outcomes = dict(zip(raffle_ids, pool.map(draw, raffle_ids)))
+        elapsed = time.perf_counter() - started
+
+        failed = {raffle_id: error for raffle_id, (_, error) in outcomes.items() if error}
+        summary = {
+            'drawn': len(outcomes) - len(failed),
+            'failed': failed,
+            'seconds': round(elapsed, 3),
+            'raffles_per_second': round(len(outcomes) / elapsed, 1) if elapsed and outcomes else 0.0
+        }
+        if outcomes:
+            current_app.logger.info(
+                f"Drew {summary['drawn']} of {len(outcomes)} raffles in {summary['seconds']}s "
+                f"({summary['raffles_per_second']}/s) with {max_workers} workers"
+            )
+        return summary, None
@@ -1,46 +1,468 @@
 from app.models.ticket import Ticket
 from app.models.raffle import Raffle, RaffleStatus
+from app.models.user import User
+from app.models.balance_entry import BalanceEntryKind
+from app.services.user_service import UserService
 from app import db
 from sqlalchemy.exc import SQLAlchemyError
-import random
+from sqlalchemy import and_, case, func, insert, literal, or_, select, update
+from app.utils.ticket_allocator import TicketAllocator, get_allocator, release_numbers
+from app.utils.response_cache import invalidate_raffle
 from datetime import datetime
+from app.utils.db_router import reads_from_replica
 
 class TicketService:
     @staticmethod
-    def purchase_tickets(raffle_id, user_id, num_tickets):
+    def _claim_tickets(raffle_id, user_id, num_tickets, now):
+        # The claim is a conditional UPDATE on the raffle row, a count of the buyer's
+        # tickets and one INSERT of numbers popped from the raffle's in-memory
+        # allocator. The UPDATE is the first statement of the transaction, so it takes
+        # the raffle's row lock (SQLite: the database write lock) before any read, and
+        # concurrent buyers of the same raffle are serialized behind it. The per-user
+        # count is a statement of its own after the lock: under READ COMMITTED an
+        # UPDATE that waited on the lock re-checks only the locked row, so a count
+        # inside it would miss tickets the previous holder just committed.
+        # Returns (tickets, raffle, error), raffle being the claimed row's counters and
+        # price; None for all three means the UPDATE matched nothing and the caller
+        # works out why.
+        claimed = TicketService._update_raffle(
+            update(Raffle)
+            .where(Raffle.id == raffle_id, Raffle.on_sale_clause(now), Raffle.available_count >= num_tickets)
+            .values(**TicketService._sold_values(num_tickets, now)),
+            raffle_id, Raffle.available_count, Raffle.max_tickets_per_user, Raffle.ticket_price
+        )
+        if claimed is None:
+            return None, None, None
+        held = TicketService._tickets_held(raffle_id, [user_id]).get(user_id, 0)
+        if held + num_tickets > claimed.max_tickets_per_user:
+            return None, None, f"Cannot purchase more than {claimed.max_tickets_per_user} tickets per user."
+
+        numbers = TicketService._allocate_numbers(raffle_id, num_tickets, claimed.available_count)
+        if numbers is None:
+            return None, None, "Ticket numbers could not be allocated"
+        try:
+            tickets = TicketService._insert_tickets([
+                {'raffle_id': raffle_id, 'ticket_number': number, 'user_id': user_id, 'purchase_time': now}
+                for number in numbers
+            ])
+        except SQLAlchemyError:
+            release_numbers(raffle_id, numbers)
+            raise
+        return tickets, claimed, None
+
+    @staticmethod
+    def _update_raffle(statement, raffle_id, *columns):
+        # UPDATE ... RETURNING where the dialect has it; otherwise (MySQL) the UPDATE
+        # followed by a read of the row it has just locked. None when no row matched.
+        statement = statement.execution_options(synchronize_session=False)
+        if db.engine.dialect.update_returning:
+            return db.session.execute(statement.returning(*columns)).first()
+        if db.session.execute(statement).rowcount != 1:
+            return None
+        return db.session.execute(select(*columns).where(Raffle.id == raffle_id)).first()
+
+    @staticmethod
+    def _insert_tickets(rows):
+        # INSERT ... RETURNING where the dialect has it; otherwise the rows are read
+        # back by their (raffle_id, ticket_number), which is unique.
+        if db.engine.dialect.insert_returning:
+            return db.session.scalars(insert(Ticket).returning(Ticket), rows).all()
+        db.session.execute(insert(Ticket), rows)
+        numbers = {}
+        for row in rows:
+            numbers.setdefault(row['raffle_id'], []).append(row['ticket_number'])
+        return db.session.scalars(
+            select(Ticket).where(or_(*(
+                and_(Ticket.raffle_id == raffle_id, Ticket.ticket_number.in_(raffle_numbers))
+                for raffle_id, raffle_numbers in numbers.items()
+            ))).order_by(Ticket.id)
+        ).all()
+
+    @staticmethod
+    def _sold_values(num_tickets, now):
+        return dict(
+            sold_count=Raffle.sold_count + num_tickets,
+            available_count=Raffle.available_count - num_tickets,
+            status=case(
+                (Raffle.available_count == num_tickets, literal(RaffleStatus.SOLD_OUT, Raffle.status.type)),
+                else_=literal(RaffleStatus.ACTIVE, Raffle.status.type)
+            ),
+            **Raffle.change_values(now)
+        )
+
+    @staticmethod
+    def _claim_batch(raffle_id, requests, now, balances, charges, sold_out):
+        # Batch form of _claim_tickets for a list of (user_id, num_tickets) requests of
+        # one raffle. A no-op UPDATE takes the raffle's lock first, so the counters and
+        # per-user counts read next cannot change before the claim is written. Returns
+        # {position: ticket numbers} for the accepted requests and {position: error};
+        # the cost of each accepted request moves from `balances` into `charges`,
+        # keyed by (user_id, raffle_id), and a claim of the last tickets adds the
+        # raffle to `sold_out`.
+        state = TicketService._update_raffle(
+            update(Raffle)
+            .where(Raffle.id == raffle_id, Raffle.on_sale_clause(now))
+            .values(available_count=Raffle.available_count),
+            raffle_id, Raffle.available_count, Raffle.max_tickets_per_user, Raffle.ticket_price
+        )
+        if state is None:
+            error = TicketService._purchase_error(raffle_id, None, 0)
+            return {}, {position: error for position in range(len(requests))}
+
+        available, max_tickets_per_user, ticket_price = state
+        held = TicketService._tickets_held(raffle_id, list({user_id for user_id, _ in requests}))
+        accepted, errors = {}, {}
+        claimed_count = 0
+        for position, (user_id, num_tickets) in enumerate(requests):
+            if num_tickets > available - claimed_count:
+                errors[position] = f"Not enough tickets available. Only {available - claimed_count} left."
+            elif held.get(user_id, 0) + num_tickets > max_tickets_per_user:
+                errors[position] = f"Cannot purchase more than {max_tickets_per_user} tickets per user."
+            elif user_id not in balances:
+                errors[position] = "User not found"
+            elif balances[user_id] < ticket_price * num_tickets:
+                errors[position] = "Insufficient balance"
+            else:
+                held[user_id] = held.get(user_id, 0) + num_tickets
+                balances[user_id] -= ticket_price * num_tickets
+                charges[(user_id, raffle_id)] = charges.get((user_id, raffle_id), 0) + ticket_price * num_tickets
+                accepted[position] = num_tickets
+                claimed_count += num_tickets
+        if not claimed_count:
+            return {}, errors
+
+        numbers = TicketService._allocate_numbers(raffle_id, claimed_count, available - claimed_count)
+        if numbers is None:
+            for position in accepted:
+                user_id, num_tickets = requests[position]
+                balances[user_id] += ticket_price * num_tickets
+                charges[(user_id, raffle_id)] -= ticket_price * num_tickets
+                errors[position] = "Ticket numbers could not be allocated"
+            return {}, errors
         try:
-            raffle = Raffle.query.get(raffle_id)
-            if not raffle:
-                return None, "Raffle not found"
-            
-            raffle.update_status()
-            if raffle.status != RaffleStatus.ACTIVE:
-                return None, f"Cannot purchase tickets. Raffle status is {raffle.status.value}"
+            db.session.execute(
+                update(Raffle)
+                .where(Raffle.id == raffle_id)
+                .values(**TicketService._sold_values(claimed_count, now))
+                .execution_options(synchronize_session=False)
+            )
+        except SQLAlchemyError:
+            release_numbers(raffle_id, numbers)
+            raise
+        if claimed_count == available:
+            sold_out.add(raffle_id)
+
+        assignments = {}
+        offset = 0
+        for position, num_tickets in accepted.items():
+            assignments[position] = numbers[offset:offset + num_tickets]
+            offset += num_tickets
+        return assignments, errors
+
+    @staticmethod
+    def _balances(user_ids, chunk_size=500):
+        user_ids = list(set(user_ids))
+        balances = {}
+        for start in range(0, len(user_ids), chunk_size):
+            balances.update(db.session.execute(
+                select(User.id, User.current_balance()).where(User.id.in_(user_ids[start:start + chunk_size]))
+            ).all())
+        return {user_id: balance or 0 for user_id, balance in balances.items()}
+
+    @staticmethod
+    def _tickets_held(raffle_id, user_ids, chunk_size=500):
+        held = {}
+        for start in range(0, len(user_ids), chunk_size):
+            held.update(db.session.execute(
+                select(Ticket.user_id, func.count(Ticket.id))
+                .where(Ticket.raffle_id == raffle_id, Ticket.user_id.in_(user_ids[start:start + chunk_size]))
+                .group_by(Ticket.user_id)
+            ).all())
+        return held
 
-            available_tickets = raffle.tickets.filter_by(user_id=None).all()
-            if len(available_tickets) < num_tickets:
-                return None, f"Not enough tickets available. Only {len(available_tickets)} left."
+    @staticmethod
+    def _allocate_numbers(raffle_id, num_tickets, available_after):
+        # Runs while the claiming UPDATE holds the raffle's lock, so the ticket table
+        # cannot change underneath and a rebuild from it is exact.
+        allocator = get_allocator(raffle_id, lambda: TicketService._load_allocator(raffle_id))
+        numbers = allocator.claim(num_tickets)
+        if (numbers is not None and len(allocator) == available_after
+                and not TicketService._numbers_taken(raffle_id, numbers)):
+            return numbers
+
+        # The allocator drifted from the table, e.g. another worker process sold or
+        # refunded tickets of this raffle. Rebuild it and draw again.
+        number_of_tickets, sold_numbers = TicketService._load_ticket_space(raffle_id)
+        allocator.rebuild(number_of_tickets, sold_numbers)
+        return allocator.claim(num_tickets)
+
+    @staticmethod
+    def _load_ticket_space(raffle_id):
+        number_of_tickets = db.session.scalar(select(Raffle.number_of_tickets).where(Raffle.id == raffle_id))
+        sold_numbers = db.session.scalars(select(Ticket.ticket_number).where(Ticket.raffle_id == raffle_id)).all()
+        return number_of_tickets, sold_numbers
+
+    @staticmethod
+    def _load_allocator(raffle_id):
+        return TicketAllocator(*TicketService._load_ticket_space(raffle_id))
+
+    @staticmethod
+    def _numbers_taken(raffle_id, numbers):
+        if len(set(numbers)) != len(numbers):
+            return True
+        taken = db.session.scalar(
+            select(func.count(Ticket.id)).where(Ticket.raffle_id == raffle_id, Ticket.ticket_number.in_(numbers))
+        )
+        return taken > 0
+
+    @staticmethod
+    def _purchase_error(raffle_id, user_id, num_tickets):
+        raffle = Raffle.query.get(raffle_id)
+        if not raffle:
+            return "Raffle not found"
+
+        status = raffle.effective_status()
+        if status != RaffleStatus.ACTIVE:
+            return f"Cannot purchase tickets. Raffle status is {status.value}"
+
+        available_tickets = raffle.available_count
+        if available_tickets < num_tickets:
+            return f"Not enough tickets available. Only {available_tickets} left."
+
+        # The raffle changed between the claim and this read
+        return "Tickets could not be claimed, please retry"
+
+    @staticmethod
+    def _purchase(raffle_id, user_id, num_tickets, now, rollback, sold_out):
+        # Claims and charges one purchase inside the caller's transaction. On failure
+        # `rollback` undoes what the purchase wrote (the whole transaction, or its
+        # savepoint) before the error is worked out. A purchase that takes the last
+        # ticket adds the raffle to `sold_out`. Returns (tickets, error).
+        tickets, raffle, error = TicketService._claim_tickets(raffle_id, user_id, num_tickets, now)
+        if tickets is None:
+            rollback()
+            return None, error or TicketService._purchase_error(raffle_id, user_id, num_tickets)
+
+        # Charged in the same transaction, after the raffle lock, so a buyer who
+        # cannot pay leaves neither tickets nor counter changes behind
+        claimed_numbers = [ticket.ticket_number for ticket in tickets]
+        try:
+            debited = User.adjust_balance(user_id, -raffle.ticket_price * num_tickets, BalanceEntryKind.PURCHASE, raffle_id)
+        except SQLAlchemyError:
+            release_numbers(raffle_id, claimed_numbers)
+            raise
+        if not debited:
+            rollback()
+            release_numbers(raffle_id, claimed_numbers)
+            return None, UserService.balance_error(user_id)
+        if raffle.available_count == 0:
+            sold_out.add(raffle_id)
+        return tickets, None
 
-            user_tickets = Ticket.query.filter_by(raffle_id=raffle_id, user_id=user_id).count()
-            if user_tickets + num_tickets > raffle.max_tickets_per_user:
-                return None, f"Cannot purchase more than {raffle.max_tickets_per_user} tickets per user."
+    @staticmethod
+    def purchase_tickets(raffle_id, user_id, num_tickets):
+        try:
+            if num_tickets < 1:
+                return None, "Number of tickets must be at least 1"
 
-            purchased_tickets = random.sample(available_tickets, num_tickets)
+            sold_out = set()
+            tickets, error = TicketService._purchase(
+                raffle_id, user_id, num_tickets, datetime.utcnow(), db.session.rollback, sold_out
+            )
+            if error:
+                return None, error
+            try:
+                db.session.commit()
+            except SQLAlchemyError:
+                release_numbers(raffle_id, [ticket.ticket_number for ticket in tickets])
+                raise
+            invalidate_raffle(raffle_id, sold_out=raffle_id in sold_out)
+            return tickets, None
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return None, str(e)
 
-            for ticket in purchased_tickets:
-                ticket.user_id = user_id
-                ticket.purchase_time = datetime.utcnow()
+    @staticmethod
+    def purchase_tickets_group(purchases):
+        # Group commit for the purchase batcher: purchases is a list of (raffle_id,
+        # user_id, num_tickets). They are applied like a batch purchase, so each raffle
+        # gets one claim and the whole group one ticket INSERT, one debit executemany
+        # and one COMMIT. Returns one (tickets, error) per purchase, in order.
+        items = [
+            {'raffle_id': raffle_id, 'user_id': user_id, 'num_tickets': num_tickets}
+            for raffle_id, user_id, num_tickets in purchases
+        ]
+        claimed, sold_out = {}, set()
+        try:
+            results, error = TicketService._write_batch(items, datetime.utcnow(), claimed, sold_out)
+            if error is None:
+                # Detached before the commit expires them, so each caller gets loaded tickets
+                for result in results:
+                    for ticket in result.get('tickets', ()):
+                        db.session.expunge(ticket)
+                db.session.commit()
+                for raffle_id in claimed:
+                    invalidate_raffle(raffle_id, sold_out=raffle_id in sold_out)
+                return [(result.get('tickets'), result.get('error')) for result in results]
+        except SQLAlchemyError:
+            pass
+        db.session.rollback()
+        for raffle_id, numbers in claimed.items():
+            release_numbers(raffle_id, numbers)
+        # A buyer's balance moved between the read and the debit: apply the purchases
+        # one by one instead, so only that buyer's purchase fails
+        return TicketService._purchase_group_each(purchases)
 
-            if len(raffle.tickets.filter_by(user_id=None).all()) == 0:
-                raffle.status = RaffleStatus.SOLD_OUT
+    @staticmethod
+    def _purchase_group_each(purchases):
+        # Fallback for purchase_tickets_group and purchase_tickets_batch: each purchase
+        # runs in its own SAVEPOINT, so a failure only undoes that purchase, and all of
+        # them share one COMMIT.
+        now = datetime.utcnow()
+        results = []
+        claimed, sold_out = {}, set()
+        try:
+            # Opens the transaction with a write: SQLite takes its write lock up front,
+            # and the savepoints nest inside it instead of each committing on release.
+            db.session.execute(
+                update(Raffle)
+                .where(Raffle.id.in_({raffle_id for raffle_id, _, _ in purchases}))
+                .values(available_count=Raffle.available_count)
+                .execution_options(synchronize_session=False)
+            )
+            for raffle_id, user_id, num_tickets in purchases:
+                if num_tickets < 1:
+                    results.append((None, "Number of tickets must be at least 1"))
+                    continue
+                savepoint = db.session.begin_nested()
+                try:
+                    tickets, error = TicketService._purchase(
+                        raffle_id, user_id, num_tickets, now, savepoint.rollback, sold_out
+                    )
+                except SQLAlchemyError as e:
+                    savepoint.rollback()
+                    results.append((None, str(e)))
+                    continue
+                if error:
+                    results.append((None, error))
+                    continue
+                savepoint.commit()
+                claimed.setdefault(raffle_id, []).extend(ticket.ticket_number for ticket in tickets)
+                results.append((tickets, None))
 
+            for tickets, _ in results:
+                for ticket in tickets or ():
+                    db.session.expunge(ticket)
             db.session.commit()
-            return purchased_tickets, None
         except SQLAlchemyError as e:
             db.session.rollback()
+            for raffle_id, numbers in claimed.items():
+                release_numbers(raffle_id, numbers)
+            return [(None, str(e))] * len(purchases)
+        for raffle_id in claimed:
+            invalidate_raffle(raffle_id, sold_out=raffle_id in sold_out)
+        return results
+
+    @staticmethod
+    def purchase_tickets_batch(items):
+        # items is a list of {'raffle_id', 'user_id', 'num_tickets'}. Every accepted
+        # item is written in one transaction: four statements per raffle plus one
+        # SELECT of the buyers' balances, one INSERT for all tickets and one
+        # executemany debit. Returns one result per item, in order, carrying either
+        # its tickets or the reason it was rejected.
+        claimed, sold_out = {}, set()
+        try:
+            results, error = TicketService._write_batch(items, datetime.utcnow(), claimed, sold_out)
+            if error is None:
+                db.session.commit()
+                for raffle_id in claimed:
+                    invalidate_raffle(raffle_id, sold_out=raffle_id in sold_out)
+                return results, None
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            for raffle_id, numbers in claimed.items():
+                release_numbers(raffle_id, numbers)
             return None, str(e)
+        db.session.rollback()
+        for raffle_id, numbers in claimed.items():
+            release_numbers(raffle_id, numbers)
+        # A buyer's balance moved between the read and the debit: apply the items one
+        # by one instead, so only that buyer's item fails
+        purchases = [(item['raffle_id'], item['user_id'], item['num_tickets']) for item in items]
+        results = []
+        for item, (tickets, error) in zip(items, TicketService._purchase_group_each(purchases)):
+            result = {'raffle_id': item['raffle_id'], 'user_id': item['user_id'], 'num_tickets': item['num_tickets']}
+            if error is None:
+                result['tickets'] = tickets
+            else:
+                result['error'] = error
+            results.append(result)
+        return results, None
 
     @staticmethod
+    def _write_batch(items, now, claimed, sold_out):
+        # Claims and debits every item of a batch inside the caller's transaction and
+        # returns (results, error). The numbers taken go into `claimed` by raffle, so
+        # the caller can release them if the transaction does not commit, and raffles
+        # whose last ticket the batch took go into `sold_out`.
+        results = [
+            {'raffle_id': item['raffle_id'], 'user_id': item['user_id'], 'num_tickets': item['num_tickets']}
+            for item in items
+        ]
+        by_raffle = {}
+        for index, item in enumerate(items):
+            if item['num_tickets'] < 1:
+                results[index]['error'] = "Number of tickets must be at least 1"
+            else:
+                by_raffle.setdefault(item['raffle_id'], []).append(index)
+
+        charges = {}
+        balances = TicketService._balances([item['user_id'] for item in items])
+        ticket_rows = []
+        for raffle_id, indexes in by_raffle.items():
+            assignments, errors = TicketService._claim_batch(
+                raffle_id, [(items[index]['user_id'], items[index]['num_tickets']) for index in indexes],
+                now, balances, charges, sold_out
+            )
+            for position, error in errors.items():
+                results[indexes[position]]['error'] = error
+            for position, numbers in assignments.items():
+                claimed.setdefault(raffle_id, []).extend(numbers)
+                ticket_rows.extend(
+                    {'raffle_id': raffle_id, 'ticket_number': number,
+                     'user_id': items[indexes[position]]['user_id'], 'purchase_time': now}
+                    for number in numbers
+                )
+                results[indexes[position]]['ticket_numbers'] = numbers
+
+        tickets = {}
+        if ticket_rows:
+            for ticket in TicketService._insert_tickets(ticket_rows):
+                tickets[(ticket.raffle_id, ticket.ticket_number)] = ticket
+
+        # Balances were read before the raffle locks were taken, so each debit is
+        # still conditional; when a buyer spent the money meanwhile the error tells
+        # the caller to roll back and fall back to _purchase_group_each.
+        # The entries go in one at a time, so a buyer's later entries see the earlier.
+        charges = {key: amount for key, amount in charges.items() if amount > 0}
+        if charges:
+            User.lock_balances([user_id for user_id, _ in charges])
+            debited = db.session.execute(
+                User.balance_entry_statement(BalanceEntryKind.PURCHASE, now),
+                [{'entry_user_id': user_id, 'amount': -amount, 'raffle_id': raffle_id}
+                 for (user_id, raffle_id), amount in charges.items()]
+            ).rowcount
+            if debited != len(charges):
+                return None, "A buyer's balance changed during the batch, please retry"
+
+        for result in results:
+            numbers = result.pop('ticket_numbers', None)
+            if numbers is not None:
+                result['tickets'] = [tickets[(result['raffle_id'], number)] for number in numbers]
+        return results, None
+
+    @staticmethod
+    @reads_from_replica
     def get_tickets_for_raffle(raffle_id):
         try:
             return Ticket.query.filter_by(raffle_id=raffle_id).all(), None
@@ -48,6 +470,21 @@ class TicketService:
             return None, str(e)
 
     @staticmethod
+    @reads_from_replica
+    def stream_tickets_for_raffle(raffle_id, purchased_only=False, chunk_size=1000):
+        # Rows are fetched chunk_size at a time from the cursor and the session only
+        # holds weak references to them, so memory stays flat however many there are.
+        # Ordered by ticket number to walk the (raffle_id, ticket_number) index without a sort.
+        try:
+            statement = select(Ticket).where(Ticket.raffle_id == raffle_id).order_by(Ticket.ticket_number)
+            if purchased_only:
+                statement = statement.where(Ticket.user_id.isnot(None))
+            return db.session.execute(statement.execution_options(yield_per=chunk_size)).scalars(), None
+        except SQLAlchemyError as e:
+            return None, str(e)
+
+    @staticmethod
+    @reads_from_replica
     def get_user_tickets(user_id, raffle_id=None):
         try:
             query = Ticket.query.filter_by(user_id=user_id)
@@ -67,6 +504,21 @@ class TicketService:
         except SQLAlchemyError as e:
             return None, str(e)
 
+    @staticmethod
+    @reads_from_replica
+    def get_ticket_by_public_id(public_ticket_id):
+        try:
+            parsed = Ticket.parse_ticket_id(public_ticket_id)
+            if not parsed:
+                return None, "Invalid ticket id"
+            raffle_id, ticket_number = parsed
+            ticket = Ticket.query.filter_by(raffle_id=raffle_id, ticket_number=ticket_number).first()
+            if not ticket:
+                return None, "Ticket not found"
+            return ticket, None
+        except SQLAlchemyError as e:
+            return None, str(e)
+
     @staticmethod
     def refund_ticket(ticket_id):
         try:
@@ -75,22 +527,32 @@ class TicketService:
                 return False, "Ticket not found"
 
             raffle = ticket.raffle
-            if raffle.status not in [RaffleStatus.ACTIVE, RaffleStatus.PAUSED, RaffleStatus.SOLD_OUT]:
-                return False, f"Cannot refund ticket. Raffle status is {raffle.status.value}"
+            status = raffle.effective_status()
+            if status not in [RaffleStatus.ACTIVE, RaffleStatus.PAUSED, RaffleStatus.SOLD_OUT]:
+                return False, f"Cannot refund ticket. Raffle status is {status.value}"
+
+            raffle_id, ticket_number, user_id = ticket.raffle_id, ticket.ticket_number, ticket.user_id
 
-            ticket.user_id = None
-            ticket.purchase_time = None
+            # Unsold numbers have no row, so a refund returns the number to the pool by deleting it
+            db.session.delete(ticket)
+            raffle.sold_count = Raffle.sold_count - 1
+            raffle.available_count = Raffle.available_count + 1
 
             if raffle.status == RaffleStatus.SOLD_OUT:
                 raffle.status = RaffleStatus.ACTIVE
+            if user_id is not None:
+                User.adjust_balance(user_id, raffle.ticket_price, BalanceEntryKind.REFUND, raffle_id)
 
             db.session.commit()
+            release_numbers(raffle_id, [ticket_number])
+            invalidate_raffle(raffle_id)
             return True, "Ticket refunded successfully"
         except SQLAlchemyError as e:
             db.session.rollback()
             return False, str(e)
 
     @staticmethod
+    @reads_from_replica
     def get_purchased_tickets_for_raffle(raffle_id, page=1, per_page=50):
         try:
             tickets = Ticket.query.filter_by(raffle_id=raffle_id).filter(Ticket.user_id.isnot(None)).paginate(page=page, per_page=per_page, error_out=False)
@@ -1,22 +1,34 @@
 from app.models.user import User
+from app.models.ticket import Ticket
+from app.models.balance_entry import BalanceEntry
 from app import db
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import exists, func, select, update
 from sqlalchemy.exc import SQLAlchemyError
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.utils.session_tokens import HasherBusy, password_hasher, session_tokens
+from app.utils.db_router import reads_from_replica
+
+HASHER_BUSY = "Too many logins in progress, please retry shortly"
+
+LEDGER_FIELDS = {'balance', 'balance_snapshot', 'snapshot_entry_id', 'balance_tail'}
 
 class UserService:
     @staticmethod
     def create_user(username, email, password):
         try:
-            user = User(username=username, email=email)
-            user.set_password(password)
+            user = User(username=username, email=email, password_hash=password_hasher().generate(password))
             db.session.add(user)
             db.session.commit()
             return user, None
+        except HasherBusy:
+            return None, HASHER_BUSY
         except SQLAlchemyError as e:
             db.session.rollback()
             return None, str(e)
 
     @staticmethod
+    @reads_from_replica
     def get_user(user_id):
         try:
             user = User.query.get(user_id)
@@ -30,12 +42,43 @@ class UserService:
     def authenticate_user(username, password):
         try:
             user = User.query.filter_by(username=username).first()
-            if user and user.check_password(password):
+            if user and password_hasher().check(user.password_hash, password):
                 return user, None
             return None, "Invalid username or password"
+        except HasherBusy:
+            return None, HASHER_BUSY
         except SQLAlchemyError as e:
             return None, str(e)
 
+    @staticmethod
+    def login(username, password):
+        # Returns (user, token, error). The token stands in for the password on
+        # later requests and is checked without hashing anything.
+        user, error = UserService.authenticate_user(username, password)
+        if error:
+            return None, None, error
+        return user, session_tokens().issue(user.id), None
+
+    @staticmethod
+    def get_session_user(token):
+        user_id = session_tokens().verify(token) if token else None
+        if user_id is None:
+            return None, "Invalid or expired session token"
+        try:
+            user = db.session.get(User, user_id)
+            if not user:
+                return None, "User not found"
+            return user, None
+        except SQLAlchemyError as e:
+            return None, str(e)
+
+    @staticmethod
+    def logout(token):
+        if not token or session_tokens().verify(token) is None:
+            return False, "Invalid or expired session token"
+        session_tokens().revoke(token)
+        return True, None
+
     @staticmethod
     def update_user(user_id, **kwargs):
         try:
@@ -44,6 +87,9 @@ class UserService:
                 return None, "User not found"
             
             for key, value in kwargs.items():
+                # Balances only change through ledger entries
+                if key in LEDGER_FIELDS:
+                    continue
                 if hasattr(user, key):
                     setattr(user, key, value)
             
@@ -53,14 +99,20 @@ class UserService:
             db.session.rollback()
             return None, str(e)
 
+    @staticmethod
+    def balance_error(user_id, insufficient="Insufficient balance"):
+        # Why a conditional ledger INSERT wrote no entry
+        if not db.session.query(User.id).filter_by(id=user_id).first():
+            return "User not found"
+        return insufficient
+
     @staticmethod
     def add_balance(user_id, amount):
         try:
-            user = User.query.get(user_id)
-            if not user:
-                return False, "User not found"
-            
-            user.add_balance(amount)
+            if not User.adjust_balance(user_id, amount):
+                db.session.rollback()
+                return False, UserService.balance_error(user_id)
+            db.session.commit()
             return True, None
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -69,19 +121,17 @@ class UserService:
     @staticmethod
     def subtract_balance(user_id, amount):
         try:
-            user = User.query.get(user_id)
-            if not user:
-                return False, "User not found"
-            
-            if user.subtract_balance(amount):
-                return True, None
-            else:
-                return False, "Insufficient balance"
+            if not User.adjust_balance(user_id, -amount):
+                db.session.rollback()
+                return False, UserService.balance_error(user_id)
+            db.session.commit()
+            return True, None
         except SQLAlchemyError as e:
             db.session.rollback()
             return False, str(e)
 
     @staticmethod
+    @reads_from_replica
     def get_user_tickets(user_id):
         try:
             user = User.query.get(user_id)
@@ -93,26 +143,97 @@ class UserService:
         except SQLAlchemyError as e:
             return None, str(e)
 
+    @staticmethod
+    @reads_from_replica
+    def stream_user_tickets(user_id, chunk_size=1000):
+        try:
+            if not db.session.query(User.id).filter_by(id=user_id).first():
+                return None, "User not found"
+            statement = select(Ticket).where(Ticket.user_id == user_id).order_by(Ticket.id)
+            return db.session.execute(statement.execution_options(yield_per=chunk_size)).scalars(), None
+        except SQLAlchemyError as e:
+            return None, str(e)
+
     @staticmethod
     def update_user_balance(user_id, amount):
         try:
+            if not User.adjust_balance(user_id, amount):
+                db.session.rollback()
+                return None, UserService.balance_error(user_id, "Insufficient funds")
+            db.session.commit()
             user = User.query.get(user_id)
-            if not user:
-                return None, "User not found"
-            
-            success, message = user.update_balance(amount)
-            if success:
-                return user, message
-            else:
-                return None, message
+            return user, f"Balance updated. New balance: {user.balance}"
         except SQLAlchemyError as e:
             db.session.rollback()
             return None, str(e)
 
     @staticmethod
+    @reads_from_replica
     def get_all_users(page=1, per_page=20):
         try:
             users = User.query.paginate(page=page, per_page=per_page, error_out=False)
             return users.items, users.total, None
         except SQLAlchemyError as e:
-            return None, 0, str(e)        
+            return None, 0, str(e)
+
+    @staticmethod
+    @reads_from_replica
+    def stream_users(chunk_size=1000):
+        try:
+            statement = select(User).order_by(User.id)
+            return db.session.execute(statement.execution_options(yield_per=chunk_size)).scalars(), None
+        except SQLAlchemyError as e:
+            return None, str(e)
+
+    @staticmethod
+    @reads_from_replica
+    def get_balance_entries(user_id, limit=100):
+        try:
+            if not db.session.query(User.id).filter_by(id=user_id).first():
+                return None, "User not found"
+            entries = BalanceEntry.query.filter_by(user_id=user_id).order_by(
+                BalanceEntry.id.desc()
+            ).limit(limit).all()
+            return entries, None
+        except SQLAlchemyError as e:
+            return None, str(e)
+
+    @staticmethod
+    def compact_balance_ledger(grace=None):
+        # Rolls every user's unsnapshotted entries into the snapshot with one
+        # set-based UPDATE. Entries are kept, only the snapshot pointer moves, so
+        # balance reads stay short but the history stays. Credits are written without
+        # a lock, so entry ids need not commit in order: only entries up to a
+        # watermark are folded, the last id written more than `grace` seconds ago.
+        # An entry below it that has not committed yet would belong to a transaction
+        # open for longer than that, so the grace must exceed any ledger write.
+        if grace is None:
+            grace = current_app.config['BALANCE_COMPACTION_GRACE']
+        try:
+            watermark = db.session.scalar(
+                select(func.max(BalanceEntry.id))
+                .where(BalanceEntry.created_at <= datetime.utcnow() - timedelta(seconds=grace))
+            )
+            if watermark is None:
+                return 0, None
+            pending = (
+                BalanceEntry.user_id == User.id,
+                BalanceEntry.id > User.snapshot_entry_id,
+                BalanceEntry.id <= watermark
+            )
+            tail = select(func.coalesce(func.sum(BalanceEntry.amount), 0.0)).where(*pending).scalar_subquery()
+            last_entry_id = select(func.max(BalanceEntry.id)).where(*pending).scalar_subquery()
+            compacted = db.session.execute(
+                update(User)
+                .where(exists().where(*pending))
+                .values(
+                    balance_snapshot=func.coalesce(User.balance_snapshot, 0.0) + tail,
+                    snapshot_entry_id=last_entry_id
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            return compacted, None
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return 0, str(e)
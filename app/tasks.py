@@ -1,8 +1,8 @@
 from celery import Celery
 from app import create_app, db
-from app.models.raffle import Raffle, RaffleStatus
 from app.services.raffle_service import RaffleService
-from datetime import datetime
+from app.services.user_service import UserService
+from app.utils.db_router import sync_sqlite_replica
 
 def make_celery(app):
     celery = Celery(app.import_name)
@@ -22,31 +22,50 @@ celery = make_celery(flask_app)
 @celery.task
 def end_raffles():
     with flask_app.app_context():
-        now = datetime.utcnow()
-        ended_raffles = Raffle.query.filter(
-            Raffle.end_time <= now, 
-            Raffle.status.in_([RaffleStatus.ACTIVE, RaffleStatus.COMING_SOON, RaffleStatus.PAUSED, RaffleStatus.SOLD_OUT])
-        ).all()
-        
-        for raffle in ended_raffles:
-            raffle.status = RaffleStatus.ENDED
-            db.session.commit()
-            RaffleService.select_winner(raffle.id)
+        ended, error = RaffleService.end_due_raffles()
+        if error:
+            flask_app.logger.error(f"Failed to end raffles: {error}")
+            return
+        summary, error = RaffleService.draw_pending_raffles()
+        if error:
+            flask_app.logger.error(f"Failed to draw raffles: {error}")
 
 @celery.task
 def start_raffles():
     with flask_app.app_context():
-        now = datetime.utcnow()
-        starting_raffles = Raffle.query.filter(
-            Raffle.start_time <= now,
-            Raffle.status == RaffleStatus.COMING_SOON
-        ).all()
-        
-        for raffle in starting_raffles:
-            raffle.status = RaffleStatus.ACTIVE
-            db.session.commit()
+        started, error = RaffleService.start_due_raffles()
+        if error:
+            flask_app.logger.error(f"Failed to start raffles: {error}")
+
+@celery.task
+def compact_balances():
+    with flask_app.app_context():
+        compacted, error = UserService.compact_balance_ledger()
+        if error:
+            flask_app.logger.error(f"Failed to compact the balance ledger: {error}")
+
+@celery.task
+def sync_replica():
+    with flask_app.app_context():
+        try:
+            sync_sqlite_replica(db)
+        except Exception as e:
+            flask_app.logger.error(f"Failed to sync the replica: {str(e)}")
 
 @celery.on_after_configure.connect
 def setup_periodic_tasks(sender, **kwargs):
+    sender.add_periodic_task(
+        flask_app.config['BALANCE_COMPACTION_INTERVAL'], compact_balances.s(),
+        name='Roll balance ledger entries into snapshots'
+    )
+    replica_uri = flask_app.config['SQLALCHEMY_REPLICA_URI']
+    if replica_uri and replica_uri.startswith('sqlite'):
+        sender.add_periodic_task(
+            flask_app.config['REPLICA_SYNC_INTERVAL'], sync_replica.s(), name='Copy the primary into the SQLite replica'
+        )
+    # The in-process scheduler fires transitions at their deadlines; polling is only
+    # needed when it is disabled.
+    if flask_app.config['RAFFLE_SCHEDULER_ENABLED']:
+        return
     sender.add_periodic_task(60.0, end_raffles.s(), name='Check and end raffles every minute')
     sender.add_periodic_task(60.0, start_raffles.s(), name='Check and start raffles every minute')
\ No newline at end of file
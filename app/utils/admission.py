@@ -0,0 +1,143 @@
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import current_app
+from app import db
+
+Rejection = namedtuple('Rejection', ['queue_position', 'retry_after'])
+
+class _RaffleGate:
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.waiting = 0.0
+        self.in_flight = 0
+        self.updated = now
+        self.sold_out_until = None
+
+# Per-raffle admission control for purchase requests, so a flash sale on one raffle
+# cannot take every worker and database connection from the rest of the API. Each
+# raffle has a token bucket (`rate` purchases per second, up to `burst` at once) and
+# a limit on purchases in flight. Requests refused by the bucket are counted in an
+# estimate of the clients queued for the raffle, which drains at the bucket's rate:
+# the position tells a client how many are ahead of it, and the Retry-After when its
+# turn comes. A raffle known to be sold out is refused before any of this, without
+# a database round trip.
+class PurchaseAdmission:
+    def __init__(self, rate=100, burst=200, concurrency=16, sold_out_ttl=5, max_retry_after=30, max_raffles=10000):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.sold_out_ttl = sold_out_ttl
+        # Caps the queue estimate, so refusals that are retried (or given up on) cannot
+        # push every client's turn further and further out
+        self.max_waiting = rate * max_retry_after
+        self.max_raffles = max_raffles
+        self._gates = OrderedDict()
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected_rate = 0
+        self.rejected_busy = 0
+        self.rejected_sold_out = 0
+
+    def _gate(self, raffle_id, now):
+        gate = self._gates.get(raffle_id)
+        if gate is None:
+            gate = self._gates[raffle_id] = _RaffleGate(self.burst, now)
+            if len(self._gates) > self.max_raffles:
+                # Idle gates hold nothing a fresh one would not: a full bucket, nobody waiting
+                for key in [key for key, idle in self._gates.items() if not idle.in_flight][:len(self._gates) // 10 + 1]:
+                    if key != raffle_id:
+                        del self._gates[key]
+        else:
+            self._gates.move_to_end(raffle_id)
+        # The bucket refills at `rate` whatever the queue estimate says; the estimate
+        # drains at the same rate, as each new token serves a client that was queued.
+        credit = (now - gate.updated) * self.rate
+        gate.tokens = min(self.burst, gate.tokens + credit)
+        gate.waiting = max(0.0, gate.waiting - credit)
+        gate.updated = now
+        return gate
+
+    def sold_out(self, raffle_id):
+        with self._lock:
+            gate = self._gates.get(raffle_id)
+            if gate is None or gate.sold_out_until is None:
+                return False
+            if gate.sold_out_until <= time.monotonic():
+                gate.sold_out_until = None
+                return False
+            self.rejected_sold_out += 1
+            return True
+
+    def enter(self, raffle_id):
+        # None when the purchase may run (the caller must call leave() afterwards),
+        # otherwise a Rejection with the client's queue position and retry delay
+        now = time.monotonic()
+        with self._lock:
+            gate = self._gate(raffle_id, now)
+            if self.concurrency and gate.in_flight >= self.concurrency:
+                # Purchases in flight finish in milliseconds: ask for a prompt retry
+                # without queueing the client behind the bucket
+                self.rejected_busy += 1
+                return Rejection(math.ceil(gate.waiting) + 1, 1)
+            if gate.tokens >= 1:
+                gate.tokens -= 1
+                gate.in_flight += 1
+                self.admitted += 1
+                return None
+            gate.waiting = min(gate.waiting + 1, self.max_waiting)
+            self.rejected_rate += 1
+            return Rejection(math.ceil(gate.waiting), max(1, math.ceil(gate.waiting / self.rate)))
+
+    def leave(self, raffle_id):
+        with self._lock:
+            gate = self._gates.get(raffle_id)
+            if gate is not None:
+                gate.in_flight -= 1
+
+    def mark_sold_out(self, raffle_id):
+        # The TTL bounds how long a refund made by another worker process goes unseen
+        with self._lock:
+            self._gate(raffle_id, time.monotonic()).sold_out_until = time.monotonic() + self.sold_out_ttl
+
+    def forget(self, raffle_id=None):
+        with self._lock:
+            gates = self._gates.values() if raffle_id is None else [self._gates.get(raffle_id)]
+            for gate in gates:
+                if gate is not None:
+                    gate.sold_out_until = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'raffles': len(self._gates),
+                'in_flight': sum(gate.in_flight for gate in self._gates.values()),
+                'admitted': self.admitted,
+                'rejected_rate': self.rejected_rate,
+                'rejected_busy': self.rejected_busy,
+                'rejected_sold_out': self.rejected_sold_out
+            }
+
+def init_purchase_admission(app):
+    admission = PurchaseAdmission(
+        app.config['RAFFLE_ADMISSION_RATE'], app.config['RAFFLE_ADMISSION_BURST'],
+        app.config['RAFFLE_ADMISSION_CONCURRENCY'], app.config['RAFFLE_ADMISSION_SOLD_OUT_TTL']
+    )
+    app.extensions['purchase_admission'] = admission
+    return admission
+
+def purchase_admission():
+    return current_app.extensions.get('purchase_admission')
+
+def note_failed_purchase(raffle_id):
+    # A failed purchase has just loaded the raffle to explain the failure, so this
+    # is normally an identity map hit rather than a query. Only a raffle that is on
+    # sale with nothing left counts: an ended or cancelled one has its own error.
+    from app.models.raffle import Raffle, RaffleStatus
+    admission = purchase_admission()
+    if admission is None:
+        return
+    raffle = db.session.get(Raffle, raffle_id)
+    if raffle is not None and raffle.effective_status() == RaffleStatus.SOLD_OUT:
+        admission.mark_sold_out(raffle_id)
@@ -0,0 +1,148 @@
+import csv
+import enum
+import gzip
+import json
+import os
+from datetime import datetime
+from sqlalchemy import DateTime, Enum, Float, Integer, func, insert, select, text, update
+from app import db
+from app.models.user import User
+from app.models.raffle import Raffle, raffle_change_counter
+from app.models.ticket import Ticket
+from app.models.draw_result import DrawResult
+from app.models.balance_entry import BalanceEntry
+
+# Foreign key order, so an import never inserts a row before the row it points at
+TABLES = [User.__table__, Raffle.__table__, Ticket.__table__, DrawResult.__table__, BalanceEntry.__table__]
+FORMATS = ('jsonl', 'csv')
+
+def table_path(directory, table, fmt):
+    return os.path.join(directory, f"{table.name}.{fmt}.gz")
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.name
+    return value
+
+def _decoder(column, from_text):
+    # CSV carries everything as text and writes NULL as an empty field, so for CSV
+    # an empty field in a nullable column reads back as NULL.
+    column_type = column.type
+    parse = None
+    if isinstance(column_type, DateTime):
+        parse = datetime.fromisoformat
+    elif isinstance(column_type, Enum) and column_type.enum_class is not None:
+        parse = column_type.enum_class.__getitem__
+    elif from_text and isinstance(column_type, Integer):
+        parse = int
+    elif from_text and isinstance(column_type, Float):
+        parse = float
+
+    def decode(value):
+        if value is None or (from_text and value == '' and column.nullable):
+            return None
+        return parse(value) if parse else value
+    return decode
+
+def export_table(table, path, fmt='jsonl', chunk_size=10000, progress=None):
+    # Rows come off a server-side cursor chunk_size at a time, so exporting a
+    # multi-million row table keeps only one chunk in memory.
+    columns = [column.name for column in table.columns]
+    result = db.session.execute(
+        select(table).order_by(*table.primary_key.columns).execution_options(yield_per=chunk_size)
+    )
+    exported = 0
+    with gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6) as output:
+        writer = None
+        if fmt == 'csv':
+            writer = csv.writer(output)
+            writer.writerow(columns)
+        for partition in result.partitions():
+            if writer:
+                writer.writerows([_encode(value) for value in row] for row in partition)
+            else:
+                output.writelines(
+                    json.dumps(dict(zip(columns, map(_encode, row)))) + '\n' for row in partition
+                )
+            exported += len(partition)
+            if progress:
+                progress(table.name, exported)
+    return exported
+
+def _read_rows(path, fmt):
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as source:
+        if fmt == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+def table_is_empty(table):
+    return db.session.execute(select(1).select_from(table).limit(1)).first() is None
+
+def import_table(table, path, fmt='jsonl', chunk_size=10000, progress=None):
+    # One executemany INSERT and one commit per chunk. A failure rolls back only
+    # the chunk in flight; the rows of earlier chunks stay committed.
+    decoders = {column.name: _decoder(column, fmt == 'csv') for column in table.columns}
+    statement = insert(table)
+    imported = 0
+    chunk = []
+
+    def flush():
+        db.session.execute(statement, chunk)
+        db.session.commit()
+        if progress:
+            progress(table.name, imported)
+        chunk.clear()
+
+    try:
+        for row in _read_rows(path, fmt):
+            chunk.append({name: decoders[name](value) for name, value in row.items() if name in decoders})
+            imported += 1
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+        advance_sequences(table)
+    except Exception:
+        db.session.rollback()
+        raise
+    return imported
+
+def sequence_reset_statement(table, dialect):
+    # Imported rows keep their ids, which a Postgres serial/identity sequence does
+    # not see; SQLite and MySQL move their counters past explicit ids themselves.
+    if dialect.name != 'postgresql':
+        return None
+    columns = [column for column in table.primary_key.columns if column.autoincrement is not False
+               and isinstance(column.type, Integer)]
+    if len(columns) != 1:
+        return None
+    preparer = dialect.identifier_preparer
+    name, column = preparer.format_table(table), preparer.quote(columns[0].name)
+    return text(
+        f"SELECT setval(pg_get_serial_sequence('{name}', '{columns[0].name}'), "
+        f"COALESCE(MAX({column}), 0) + 1, false) FROM {name}"
+    )
+
+def advance_sequences(table):
+    # Moves id sequences (and the raffle change counter) past the imported rows, so
+    # the first normal insert after an import does not reuse an imported id.
+    statement = sequence_reset_statement(table, db.engine.dialect)
+    if statement is not None:
+        db.session.execute(statement)
+    if table is Raffle.__table__:
+        latest = select(func.coalesce(func.max(Raffle.__table__.c.change_seq), 0)).scalar_subquery()
+        db.session.execute(
+            update(raffle_change_counter).where(raffle_change_counter.c.value < latest).values(value=latest)
+        )
+    db.session.commit()
+
+def detect_format(directory, table):
+    for fmt in FORMATS:
+        if os.path.exists(table_path(directory, table, fmt)):
+            return fmt
+    return None
@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Counters for one engine: how long requests wait for a pooled connection, how many
+# connections are in use, and how often a statement failed on SQLite's write lock
+# after busy_timeout ran out. Read them through /db_stats to size workers and pools.
+class EngineMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.checkout_timeouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.lock_errors = 0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.checkout_timeouts += 1
+                return
+            self.checkouts += 1
+            self.checkout_wait_total += seconds
+            self.checkout_wait_max = max(self.checkout_wait_max, seconds)
+
+    def checked_out(self):
+        with self._lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def checked_in(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def lock_error(self):
+        with self._lock:
+            self.lock_errors += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkout_wait_avg_ms': round(1000 * self.checkout_wait_total / self.checkouts, 3) if self.checkouts else 0.0,
+                'checkout_wait_max_ms': round(1000 * self.checkout_wait_max, 3),
+                'checkout_timeouts': self.checkout_timeouts,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'lock_errors': self.lock_errors
+            }
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool that times each wait for a connection. `metrics` is bound on a
+    # per-engine subclass, so a pool recreated by dispose() keeps reporting to it.
+    metrics = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+def _is_sqlite_file(url):
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+def engine_options(config, metrics, uri=None):
+    # Engine options for `uri` (SQLALCHEMY_DATABASE_URI by default). For the primary,
+    # an explicit SQLALCHEMY_ENGINE_OPTIONS in the config wins over the profile.
+    if uri is None:
+        if config.get('SQLALCHEMY_ENGINE_OPTIONS'):
+            return config['SQLALCHEMY_ENGINE_OPTIONS']
+        uri = config['SQLALCHEMY_DATABASE_URI']
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite':
+        if not _is_sqlite_file(url):
+            return {}
+        # Python's sqlite3 applies its own busy timeout (in seconds) on connect
+        options = {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}}
+    else:
+        options = {
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': config['DB_POOL_PRE_PING']
+        }
+    options.update({
+        'poolclass': type('InstrumentedQueuePool', (InstrumentedQueuePool,), {'metrics': metrics}),
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT']
+    })
+    return options
+
+def instrument_engine(engine, config, metrics):
+    @event.listens_for(engine, 'checkout')
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checked_out()
+
+    @event.listens_for(engine, 'checkin')
+    def _checkin(dbapi_connection, connection_record):
+        metrics.checked_in()
+
+    @event.listens_for(engine, 'handle_error')
+    def _handle_error(context):
+        error = context.original_exception
+        if isinstance(error, sqlite3.OperationalError) and 'locked' in str(error):
+            metrics.lock_error()
+
+    if engine.dialect.name == 'sqlite' and _is_sqlite_file(engine.url):
+        pragmas = dict(config['SQLITE_PRAGMAS'], busy_timeout=config['SQLITE_BUSY_TIMEOUT'])
+
+        @event.listens_for(engine, 'connect')
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+def pool_stats(pool):
+    if not isinstance(pool, QueuePool):
+        return {'class': type(pool).__name__}
+    return {
+        'class': type(pool).__name__,
+        'size': pool.size(),
+        'idle': pool.checkedin(),
+        'checked_out': pool.checkedout(),
+        'overflow': max(pool.overflow(), 0)
+    }
+
+def init_engine_profile(app):
+    # Called before db.init_app, so the options are in place when the engine is built
+    metrics = EngineMetrics()
+    app.extensions['engine_metrics'] = metrics
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config, metrics)
+    return metrics
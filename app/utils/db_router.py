@@ -0,0 +1,187 @@
+import contextvars
+import functools
+import sqlite3
+import threading
+import time
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from app.utils.db_engine import EngineMetrics, engine_options, instrument_engine
+
+STICKY_COOKIE = 'wr_primary'
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+def reads_from_replica(function):
+    # Marks a read-only service method. Its queries may go to the replica when it
+    # runs inside a GET/HEAD request; everywhere else it reads the primary as before.
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _replica_reads.set(True)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+class RoutingSession(Session):
+    # Sends SELECTs of @reads_from_replica methods to the replica bind, and
+    # everything else (flushes, DML, reads after a write) to the primary. A session
+    # lives for one app context, so `info` carries the per-request state.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._routes_to_replica(clause):
+            replica = current_app.extensions['db_router'].replica_engine()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _routes_to_replica(self, clause):
+        if not _replica_reads.get() or self._flushing:
+            return False
+        if self.info.get('stick_to_primary') or self.new or self.dirty or self.deleted:
+            return False
+        if clause is None or not getattr(clause, 'is_select', False):
+            return False
+        if getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        return has_request_context() and request.method in ('GET', 'HEAD')
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _fall_back_to_primary(orm_execute_state):
+    # A read the replica fails (gone, lagging behind a migration, ...) is run again
+    # on the primary, and the rest of the session stays there, so the request that
+    # hit the failure is still answered.
+    session = orm_execute_state.session
+    if not orm_execute_state.is_select or not session._routes_to_replica(orm_execute_state.statement):
+        return None
+    try:
+        return orm_execute_state.invoke_statement()
+    except DBAPIError:
+        current_app.extensions['db_router'].mark_unavailable()
+        session.info['stick_to_primary'] = True
+        return orm_execute_state.invoke_statement()
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _note_dml(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['stick_to_primary'] = True
+        orm_execute_state.session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_flush(session, flush_context):
+    session.info['stick_to_primary'] = True
+    session.info['wrote'] = True
+
+# Tracks whether the replica can serve reads. A failed probe or a failed statement
+# on the replica sends reads back to the primary until the next probe succeeds.
+class DatabaseRouter:
+    def __init__(self, engine=None, probe_interval=5, sticky_seconds=5, metrics=None):
+        self.engine = engine
+        self.metrics = metrics
+        self.probe_interval = probe_interval
+        self.sticky_seconds = sticky_seconds
+        self._lock = threading.Lock()
+        self._available = False
+        self._checked_at = None
+        self.fallbacks = 0
+
+    def replica_engine(self):
+        engine = self.engine
+        if engine is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            probe = self._checked_at is None or now - self._checked_at >= self.probe_interval
+            if probe:
+                self._checked_at = now
+            available = self._available
+        # Probed outside the lock: a failing probe reports back through mark_unavailable
+        if probe:
+            available = self._probe(engine)
+            with self._lock:
+                self._available = available
+        if not available:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        return engine
+
+    def _probe(self, engine):
+        # The replica must have the schema; a missing SQLite file would otherwise
+        # be created empty on connect.
+        from app.models.raffle import Raffle
+        try:
+            with engine.connect() as connection:
+                connection.execute(select(Raffle.__table__.c.id).limit(1)).all()
+            return True
+        except (SQLAlchemyError, sqlite3.Error):
+            return False
+
+    def mark_unavailable(self):
+        with self._lock:
+            self._available = False
+            self._checked_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'replica_configured': self.engine is not None,
+                'replica_available': self._available,
+                'fallbacks': self.fallbacks,
+                'metrics': self.metrics.stats() if self.metrics is not None else None
+            }
+
+def init_db_router(app, db):
+    # The replica engine belongs to the router rather than to SQLALCHEMY_BINDS: it
+    # holds no tables of its own, so create_all/drop_all must never touch it.
+    # It gets its own pool and metrics, built from the replica's URL.
+    uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+    engine = metrics = None
+    if uri:
+        metrics = EngineMetrics()
+        engine = create_engine(uri, **engine_options(app.config, metrics, uri))
+        instrument_engine(engine, app.config, metrics)
+    router = DatabaseRouter(
+        engine, app.config['REPLICA_PROBE_INTERVAL'], app.config['REPLICA_STICKY_SECONDS'], metrics
+    )
+    app.extensions['db_router'] = router
+    if engine is None:
+        return router
+
+    @event.listens_for(engine, 'handle_error')
+    def _replica_failed(context):
+        router.mark_unavailable()
+
+    @app.before_request
+    def _stick_after_recent_write():
+        # Read-your-own-writes across requests: a client that wrote within the last
+        # sticky_seconds reads the primary, since the replica may not have the write yet
+        db.session.info.pop('wrote', None)
+        db.session.info['stick_to_primary'] = bool(request.cookies.get(STICKY_COOKIE))
+
+    @app.after_request
+    def _mark_recent_write(response):
+        if db.session.info.get('wrote'):
+            response.set_cookie(STICKY_COOKIE, '1', max_age=router.sticky_seconds, httponly=True)
+        return response
+
+    return router
+
+def sync_sqlite_replica(db):
+    # Copy job for running a replica locally: an online copy of the primary SQLite
+    # file into the replica file with SQLite's backup API. Readers of the replica
+    # see the new pages on their next statement. Returns the pages copied.
+    primary, replica = db.engine, current_app.extensions['db_router'].engine
+    if replica is None:
+        raise ValueError("No replica is configured, set REPLICA_DATABASE_URL")
+    if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise ValueError("The copy job only syncs a SQLite primary into a SQLite replica")
+    source = sqlite3.connect(primary.url.database)
+    target = sqlite3.connect(replica.url.database, timeout=30)
+    try:
+        source.backup(target)
+        return target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,128 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from app import db
+
+_STOP = object()
+
+class BatcherStopped(Exception):
+    pass
+
+# Group commit for ticket purchases. Request threads queue their purchase and wait
+# on a future; one writer thread drains the queue in micro-batches (up to max_batch
+# purchases, or whatever arrived within max_wait seconds of the first) and applies
+# each batch with TicketService.purchase_tickets_group, so a batch shares one write
+# lock and one COMMIT while every caller still gets its own result or error.
+class PurchaseBatcher:
+    def __init__(self, app, max_batch=64, max_wait=0.005):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        self.batches = 0
+        self.purchases = 0
+        self.largest_batch = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='purchase-batcher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        # Purchases queued before the stop are still applied; anything the writer
+        # did not get to in time, or submitted afterwards, fails instead of waiting
+        with self._lock:
+            self._stopped = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP:
+                item[3].set_exception(BatcherStopped())
+
+    def submit(self, raffle_id, user_id, num_tickets):
+        future = Future()
+        with self._lock:
+            if self._stopped:
+                future.set_exception(BatcherStopped())
+                return future
+            self._queue.put((raffle_id, user_id, num_tickets, future))
+        return future
+
+    def purchase(self, raffle_id, user_id, num_tickets):
+        # Same contract as TicketService.purchase_tickets: (tickets, error)
+        try:
+            return self.submit(raffle_id, user_id, num_tickets).result()
+        except BatcherStopped:
+            return None, "Purchases are paused, please retry"
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'purchases': self.purchases,
+                'largest_batch': self.largest_batch,
+                'queued': self._queue.qsize()
+            }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._apply(batch)
+            if stopping:
+                return
+
+    def _apply(self, batch):
+        from app.services.ticket_service import TicketService
+        futures = [future for _, _, _, future in batch if future.set_running_or_notify_cancel()]
+        purchases = [(raffle_id, user_id, num_tickets) for raffle_id, user_id, num_tickets, future in batch
+                     if not future.cancelled()]
+        if not purchases:
+            return
+        with self.app.app_context():
+            try:
+                results = TicketService.purchase_tickets_group(purchases)
+            except Exception as e:
+                # Callers get the service's (tickets, error) contract, not an exception
+                self.app.logger.exception(f"Purchase batch of {len(purchases)} failed")
+                results = [(None, str(e))] * len(purchases)
+            finally:
+                db.session.remove()
+        for future, result in zip(futures, results):
+            future.set_result(result)
+        with self._lock:
+            self.batches += 1
+            self.purchases += len(purchases)
+            self.largest_batch = max(self.largest_batch, len(purchases))
+
+def init_purchase_batcher(app):
+    batcher = PurchaseBatcher(
+        app, app.config['RAFFLE_PURCHASE_BATCH_SIZE'], app.config['RAFFLE_PURCHASE_BATCH_WAIT_MS'] / 1000
+    )
+    app.extensions['purchase_batcher'] = batcher
+    batcher.start()
+    return batcher
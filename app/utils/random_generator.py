@@ -1,4 +1,17 @@
 import secrets
 
 def generate_winning_ticket(max_ticket_number):
-    return secrets.randbelow(max_ticket_number) + 1
\ No newline at end of file
+    return secrets.randbelow(max_ticket_number) + 1
+
+def sample_ticket_numbers(max_ticket_number, count):
+    # Sparse Fisher-Yates shuffle of 1..max_ticket_number: only displaced positions
+    # are stored, so drawing `count` distinct numbers costs O(count) time and memory
+    # however large the range is.
+    count = min(count, max_ticket_number)
+    displaced = {}
+    numbers = []
+    for position in range(count):
+        chosen = position + secrets.randbelow(max_ticket_number - position)
+        numbers.append(displaced.get(chosen, chosen) + 1)
+        displaced[chosen] = displaced.pop(position, position)
+    return numbers
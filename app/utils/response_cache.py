@@ -0,0 +1,128 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import current_app, jsonify, request
+
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'expires_at'])
+
+# LRU of rendered JSON bodies. Every key embeds the version of the raffle (or of the
+# whole collection) it was built from, so a write only has to bump that version: the
+# old entries become unreachable and age out of the LRU. The TTL bounds how stale a
+# body can get when the write happened in another process.
+class ResponseCache:
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._collection_version = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, kind, raffle_id=None):
+        with self._lock:
+            version = self._versions.get(raffle_id, 0) if raffle_id is not None else self._collection_version
+            return kind, raffle_id, self._generation, version
+
+    def bump(self, raffle_id=None):
+        # A raffle write also changes every collection endpoint; bump(None) is for
+        # set-based writes that may touch any raffle.
+        with self._lock:
+            if raffle_id is None:
+                self._generation += 1
+            else:
+                self._versions[raffle_id] = self._versions.get(raffle_id, 0) + 1
+            self._collection_version += 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        entry = CachedResponse(body, hashlib.sha1(body).hexdigest(), time.monotonic() + ttl)
+        if ttl <= 0 or self.max_entries <= 0:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+def init_response_cache(app):
+    cache = ResponseCache(app.config['RAFFLE_CACHE_MAX_ENTRIES'], app.config['RAFFLE_CACHE_TTL'])
+    app.extensions['response_cache'] = cache
+    return cache
+
+def invalidate_raffle(raffle_id=None, sold_out=False):
+    # sold_out: the write took the raffle's last ticket, so purchases can be refused
+    # without a database check; any other write may have freed tickets
+    cache = current_app.extensions.get('response_cache')
+    if cache is not None:
+        cache.bump(raffle_id)
+    admission = current_app.extensions.get('purchase_admission')
+    if admission is not None:
+        if sold_out:
+            admission.mark_sold_out(raffle_id)
+        else:
+            admission.forget(raffle_id)
+
+def render_cached(kind, raffle_id, build):
+    # `build` returns (payload, status_code, ttl). Only 200 bodies are cached; anything
+    # else comes back as (None, (payload, status_code)).
+    cache = current_app.extensions['response_cache']
+    # The key is taken before building, so a write racing with the build leaves the
+    # body under the old version rather than the new one.
+    key = cache.key(kind, raffle_id)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry, None
+    payload, status_code, ttl = build()
+    if status_code != 200:
+        return None, (payload, status_code)
+    return cache.put(key, current_app.json.dumps(payload).encode(), ttl), None
+
+def cached_json_response(kind, raffle_id, build):
+    entry, error = render_cached(kind, raffle_id, build)
+    if error:
+        payload, status_code = error
+        return jsonify(payload), status_code
+    response = current_app.response_class(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    return response.make_conditional(request)
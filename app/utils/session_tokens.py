@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from flask import current_app, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from werkzeug.security import check_password_hash, generate_password_hash
+
+class HasherBusy(Exception):
+    pass
+
+# Signed session tokens. A token carries the user id and its issue time, signed with
+# the app's SECRET_KEY, so checking one is an HMAC rather than a password hash. Tokens
+# that already passed are kept in an LRU until they expire, which makes repeat
+# requests a dictionary lookup.
+class SessionTokens:
+    def __init__(self, secret_key, max_age=86400, max_entries=10000):
+        self.serializer = URLSafeTimedSerializer(secret_key, salt='wildrandom-session')
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._verified = OrderedDict()
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def issue(self, user_id):
+        return self.serializer.dumps({'uid': user_id})
+
+    def verify(self, token):
+        # Returns the user id of a valid token, or None
+        now = time.time()
+        with self._lock:
+            entry = self._verified.get(token)
+            if entry is not None:
+                user_id, expires_at = entry
+                if expires_at > now:
+                    self._verified.move_to_end(token)
+                    self.hits += 1
+                    return user_id
+                del self._verified[token]
+            self.misses += 1
+            if token in self._revoked:
+                return None
+        try:
+            payload, issued_at = self.serializer.loads(token, max_age=self.max_age, return_timestamp=True)
+        except (BadSignature, SignatureExpired):
+            return None
+        user_id = payload.get('uid') if isinstance(payload, dict) else None
+        if user_id is None:
+            return None
+        with self._lock:
+            if token in self._revoked:
+                return None
+            self._verified[token] = (user_id, issued_at.timestamp() + self.max_age)
+            while len(self._verified) > self.max_entries:
+                self._verified.popitem(last=False)
+        return user_id
+
+    def revoke(self, token):
+        # Revocations are per process; a token revoked here still verifies in
+        # another worker until it expires.
+        now = time.time()
+        with self._lock:
+            self._verified.pop(token, None)
+            self._revoked = {t: expires_at for t, expires_at in self._revoked.items() if expires_at > now}
+            self._revoked[token] = now + self.max_age
+
+    def clear(self):
+        with self._lock:
+            self._verified.clear()
+            self._revoked.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._verified),
+                'max_entries': self.max_entries,
+                'revoked': len(self._revoked),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+# Password hashing runs on a small dedicated pool. At most `workers` hashes run at
+# once and at most `max_pending` wait, so a burst of logins gets refused instead of
+# tying up every request thread of the worker.
+class PasswordHasher:
+    def __init__(self, workers=2, max_pending=32, timeout=10):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self.timeout = timeout
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._executor.submit(function, *args)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise HasherBusy()
+
+    def check(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def generate(self, password):
+        return self._run(generate_password_hash, password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+def init_session_tokens(app):
+    tokens = SessionTokens(
+        app.config['SECRET_KEY'], app.config['SESSION_TOKEN_MAX_AGE'], app.config['SESSION_TOKEN_CACHE_SIZE']
+    )
+    app.extensions['session_tokens'] = tokens
+    app.extensions['password_hasher'] = PasswordHasher(
+        app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_MAX_PENDING'],
+        app.config['PASSWORD_HASH_TIMEOUT']
+    )
+    return tokens
+
+def session_tokens():
+    return current_app.extensions['session_tokens']
+
+def password_hasher():
+    return current_app.extensions['password_hasher']
+
+def bearer_token():
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
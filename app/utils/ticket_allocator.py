@@ -0,0 +1,71 @@
+import secrets
+import threading
+
+_system_random = secrets.SystemRandom()
+
+# Shuffled free list of the unsold ticket numbers of one raffle. The list is kept
+# in uniformly random order, so claiming k tickets pops k entries off the end in
+# O(k) and a released number is swapped into a random position in O(1).
+class TicketAllocator:
+    def __init__(self, number_of_tickets, sold_numbers):
+        self._lock = threading.Lock()
+        self.rebuild(number_of_tickets, sold_numbers)
+
+    def __len__(self):
+        return len(self._free_numbers)
+
+    def rebuild(self, number_of_tickets, sold_numbers):
+        sold_numbers = set(sold_numbers)
+        free_numbers = [n for n in range(1, number_of_tickets + 1) if n not in sold_numbers]
+        _system_random.shuffle(free_numbers)
+        with self._lock:
+            self.number_of_tickets = number_of_tickets
+            self._free_numbers = free_numbers
+
+    def claim(self, count):
+        with self._lock:
+            if count > len(self._free_numbers):
+                return None
+            claimed = self._free_numbers[len(self._free_numbers) - count:]
+            del self._free_numbers[len(self._free_numbers) - count:]
+            return claimed
+
+    def release(self, numbers):
+        with self._lock:
+            free_numbers = self._free_numbers
+            for number in numbers:
+                if not 1 <= number <= self.number_of_tickets:
+                    continue
+                free_numbers.append(number)
+                swap_index = secrets.randbelow(len(free_numbers))
+                free_numbers[-1], free_numbers[swap_index] = free_numbers[swap_index], free_numbers[-1]
+
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+# Allocators live for the lifetime of the process and are built lazily from the
+# ticket table, so a restart simply rebuilds them on the next purchase.
+def get_allocator(raffle_id, loader):
+    allocator = _allocators.get(raffle_id)
+    if allocator is not None:
+        return allocator
+    allocator = loader()
+    with _allocators_lock:
+        return _allocators.setdefault(raffle_id, allocator)
+
+def peek_allocator(raffle_id):
+    return _allocators.get(raffle_id)
+
+def release_numbers(raffle_id, numbers):
+    allocator = _allocators.get(raffle_id)
+    if allocator is not None:
+        allocator.release(numbers)
+
+def discard_allocator(raffle_id):
+    with _allocators_lock:
+        _allocators.pop(raffle_id, None)
+
+def clear_allocators():
+    with _allocators_lock:
+        _allocators.clear()
@@ -0,0 +1,147 @@
+"""Compare the WSGI app with the ASGI read API on concurrent reads and on
+clients long-polling the raffle change feed.
+
+Both apps are driven in-process against a scratch SQLite database, so the
+numbers show the serving model rather than a particular HTTP server. Needs
+aiosqlite (pip install -r requirements-asgi.txt).
+
+    python benchmarks/asgi_reads.py [--requests 2000] [--concurrency 50] [--watchers 1000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import TestingConfig
+from app import create_app, db
+from app.asgi import ReadAPI
+from app.models.raffle import PrizeDistributionType
+from app.services.raffle_service import RaffleService
+from app.services.ticket_service import TicketService
+from app.services.user_service import UserService
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    DB_POOL_SIZE = 20
+    DB_MAX_OVERFLOW = 0
+
+def create_raffle(name):
+    start_time = datetime.utcnow() - timedelta(hours=1)
+    raffle, _ = RaffleService.create_raffle(
+        name=name, description=None, prize_description="Prize", terms_and_conditions="Terms",
+        start_time=start_time, end_time=start_time + timedelta(days=7), ticket_price=1.0,
+        number_of_tickets=1000, max_tickets_per_user=50, general_terms_link="https://example.com/terms",
+        number_of_draws=1, prize_value=100.0, prize_distribution_type=PrizeDistributionType.FULL
+    )
+    return raffle
+
+def seed(users):
+    user_ids = []
+    for n in range(users):
+        user, _ = UserService.create_user(f"bench{n}", f"bench{n}@example.com", "password123")
+        UserService.add_balance(user.id, 100.0)
+        user_ids.append(user.id)
+    raffle = create_raffle("Benchmark Raffle")
+    for user_id in user_ids:
+        TicketService.purchase_tickets(raffle.id, user_id, 10)
+    return user_ids
+
+def paths_for(user_ids, count):
+    return [
+        f"/api/user/{user_ids[n % len(user_ids)]}/tickets" if n % 2 else f"/api/user/{user_ids[n % len(user_ids)]}"
+        for n in range(count)
+    ]
+
+def wsgi_reads(app, paths, concurrency):
+    def fetch(path):
+        with app.test_client() as client:
+            return client.get(path).status_code
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(fetch, paths))
+    return time.perf_counter() - started, statuses.count(200)
+
+async def asgi_get(api, path, query_string=b''):
+    messages = []
+    async def receive():
+        return {'type': 'http.request'}
+    async def send(message):
+        messages.append(message)
+    await api({'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string}, receive, send)
+    return messages[0]['status'], messages[1]['body']
+
+async def asgi_reads(api, paths, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+    async def fetch(path):
+        async with slots:
+            return (await asgi_get(api, path))[0]
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*(fetch(path) for path in paths))
+    return time.perf_counter() - started, statuses.count(200)
+
+async def asgi_watchers(api, app, watchers):
+    # Every watcher long-polls from the current head; one write wakes them all
+    _, body = await asgi_get(api, '/api/raffle/changes')
+    query = f"since={json.loads(body)['cursor']}&wait=20".encode()
+    polls_before = api.notifier.polls
+    tasks = [asyncio.create_task(asgi_get(api, '/api/raffle/changes', query)) for _ in range(watchers)]
+    while api.notifier.waiting < watchers:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(1)
+    threads = threading.active_count()
+
+    def write():
+        with app.app_context():
+            create_raffle("Hot Raffle")
+            db.session.remove()
+    written = time.perf_counter()
+    await asyncio.to_thread(write)
+    results = await asyncio.gather(*tasks)
+    woken = time.perf_counter() - written
+    delivered = sum(1 for status, body in results if status == 200 and json.loads(body)['changes'])
+    return delivered, woken, threads, api.notifier.polls - polls_before
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--watchers', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        user_ids = seed(args.users)
+        db.session.remove()
+    paths = paths_for(user_ids, args.requests)
+    api = ReadAPI(app)
+
+    elapsed, ok = wsgi_reads(app, paths, args.concurrency)
+    print(f"WSGI  {args.requests} reads, {args.concurrency} threads: {elapsed:.2f}s, "
+          f"{args.requests / elapsed:.0f} req/s, {ok} ok")
+
+    async def run_async():
+        elapsed, ok = await asgi_reads(api, paths, args.concurrency)
+        print(f"ASGI  {args.requests} reads, {args.concurrency} in flight: {elapsed:.2f}s, "
+              f"{args.requests / elapsed:.0f} req/s, {ok} ok")
+        delivered, woken, threads, polls = await asgi_watchers(api, app, args.watchers)
+        print(f"ASGI  {args.watchers} long-poll watchers: {delivered} got the change {woken * 1000:.0f} ms "
+              f"after the write, {threads} threads in the process, {polls} feed queries while waiting")
+        await api.close()
+    asyncio.run(run_async())
+    print(f"WSGI  {args.watchers} long-poll watchers would need {args.watchers} request threads")
+
+    with app.app_context():
+        db.drop_all()
+
+if __name__ == '__main__':
+    main()
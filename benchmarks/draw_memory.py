@@ -0,0 +1,46 @@
+"""Compare time and peak memory of the old list-pop draw with the sparse
+Fisher-Yates draw used by RaffleService.select_winner.
+
+    python benchmarks/draw_memory.py [--draws 1000] [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.random_generator import generate_winning_ticket, sample_ticket_numbers
+
+def list_pop_draw(number_of_tickets, draws):
+    remaining_numbers = list(range(1, number_of_tickets + 1))
+    winners = []
+    for _ in range(min(draws, number_of_tickets)):
+        winning_index = generate_winning_ticket(len(remaining_numbers))
+        winners.append(remaining_numbers.pop(winning_index - 1))
+    return winners
+
+def measure(draw, number_of_tickets, draws):
+    tracemalloc.start()
+    started = time.perf_counter()
+    draw(number_of_tickets, draws)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed_ms, peak / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--draws', type=int, default=1000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'tickets':>10} {'draw':<14} {'time ms':>10} {'peak KiB':>10}")
+    for number_of_tickets in args.sizes:
+        for name, draw in [('list pop', list_pop_draw), ('sparse shuffle', sample_ticket_numbers)]:
+            elapsed_ms, peak_kib = measure(draw, number_of_tickets, args.draws)
+            print(f"{number_of_tickets:>10} {name:<14} {elapsed_ms:>10.2f} {peak_kib:>10.1f}")
+
+if __name__ == '__main__':
+    main()
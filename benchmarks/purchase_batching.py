@@ -0,0 +1,102 @@
+"""Compare direct ticket purchases with the group-commit purchase batcher under
+concurrent buyers.
+
+Each mode gets a fresh scratch SQLite database with the production pragmas, and
+the same buyers purchasing one ticket at a time from request threads.
+
+    python benchmarks/purchase_batching.py [--purchases 2000] [--threads 32] [--batch-size 64] [--wait-ms 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import insert
+from config import TestingConfig
+from app import create_app, db
+from app.models.raffle import PrizeDistributionType
+from app.models.user import User
+from app.services.raffle_service import RaffleService
+from app.services.ticket_service import TicketService
+from app.utils.purchase_batcher import PurchaseBatcher
+from app.utils.ticket_allocator import clear_allocators
+
+def config_for(threads):
+    class BenchmarkConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        DB_POOL_SIZE = threads + 1
+        DB_MAX_OVERFLOW = 0
+    return BenchmarkConfig
+
+def seed(purchases, users):
+    db.session.execute(insert(User), [
+        {'id': user_id, 'username': f"bench{user_id}", 'email': f"bench{user_id}@example.com", 'balance_snapshot': 1e6}
+        for user_id in range(1, users + 1)
+    ])
+    db.session.commit()
+    start_time = datetime.utcnow() - timedelta(hours=1)
+    raffle, _ = RaffleService.create_raffle(
+        name="Benchmark Raffle", description=None, prize_description="Prize", terms_and_conditions="Terms",
+        start_time=start_time, end_time=start_time + timedelta(days=7), ticket_price=1.0,
+        number_of_tickets=purchases, max_tickets_per_user=purchases, general_terms_link="https://example.com/terms",
+        number_of_draws=1, prize_value=100.0, prize_distribution_type=PrizeDistributionType.FULL
+    )
+    RaffleService.activate_raffle(raffle.id)
+    return raffle.id
+
+def run(args, batched):
+    app = create_app(config_for(args.threads))
+    with app.app_context():
+        db.create_all()
+        raffle_id = seed(args.purchases, args.users)
+        db.session.remove()
+    batcher = None
+    if batched:
+        batcher = PurchaseBatcher(app, args.batch_size, args.wait_ms / 1000)
+        batcher.start()
+
+    def buy(n):
+        user_id = n % args.users + 1
+        if batcher is not None:
+            return batcher.purchase(raffle_id, user_id, 1)[1]
+        with app.app_context():
+            try:
+                return TicketService.purchase_tickets(raffle_id, user_id, 1)[1]
+            finally:
+                db.session.remove()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        errors = list(pool.map(buy, range(args.purchases)))
+    elapsed = time.perf_counter() - started
+
+    label = 'batched' if batched else 'direct '
+    detail = ''
+    if batcher is not None:
+        batcher.stop()
+        stats = batcher.stats()
+        detail = f", {stats['batches']} commits, largest batch {stats['largest_batch']}"
+    print(f"{label} {args.purchases} purchases, {args.threads} threads: {elapsed:.2f}s, "
+          f"{args.purchases / elapsed:.0f} purchases/s, {errors.count(None)} ok{detail}")
+    with app.app_context():
+        db.drop_all()
+    clear_allocators()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--purchases', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--wait-ms', type=int, default=5)
+    args = parser.parse_args()
+    run(args, batched=False)
+    run(args, batched=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Show the SQLite query plans and timings of the hot ticket/raffle queries
+with and without the lookup indexes.
+
+    python benchmarks/query_plans.py [--raffles 200] [--tickets-per-raffle 1000]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+from app import create_app, db
+from app.models.raffle import Raffle
+from app.models.ticket import Ticket
+from config import Config
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+NOW = datetime(2024, 11, 8, 12, 0, 0)
+
+HOT_QUERIES = [
+    ("per-user ticket count (purchase limit)",
+     "SELECT count(id) FROM ticket WHERE raffle_id = :raffle_id AND user_id = :user_id",
+     {'raffle_id': 100, 'user_id': 7}),
+    ("public ticket id lookup",
+     "SELECT * FROM ticket WHERE raffle_id = :raffle_id AND ticket_number = :ticket_number",
+     {'raffle_id': 100, 'ticket_number': 500}),
+    ("user's tickets",
+     "SELECT * FROM ticket WHERE user_id = :user_id",
+     {'user_id': 7}),
+    ("raffles due to end",
+     "SELECT id FROM raffle WHERE status IN ('ACTIVE', 'SOLD_OUT') AND end_time <= :now",
+     {'now': NOW}),
+    ("raffles due to start",
+     "SELECT id FROM raffle WHERE status = 'COMING_SOON' AND start_time <= :now",
+     {'now': NOW}),
+]
+
+INDEXES = [index for table in (Raffle.__table__, Ticket.__table__) for index in table.indexes]
+
+def populate(raffles, tickets_per_raffle):
+    statuses = ['ACTIVE', 'ENDED', 'COMING_SOON', 'SOLD_OUT', 'CANCELLED']
+    db.session.execute(Raffle.__table__.insert(), [
+        {
+            'id': raffle_id, 'name': f'Raffle {raffle_id}', 'prize_description': 'Prize',
+            'terms_and_conditions': 'Terms', 'start_time': NOW - timedelta(days=raffle_id % 30),
+            'end_time': NOW + timedelta(hours=raffle_id % 48 - 24), 'ticket_price': 1.0,
+            'number_of_tickets': tickets_per_raffle, 'max_tickets_per_user': tickets_per_raffle,
+            'status': statuses[raffle_id % len(statuses)], 'general_terms_link': 'https://example.com',
+            'number_of_draws': 1, 'prize_value': 100.0, 'prize_distribution_type': 'FULL',
+            'sold_count': tickets_per_raffle, 'available_count': 0,
+        }
+        for raffle_id in range(1, raffles + 1)
+    ])
+    for raffle_id in range(1, raffles + 1):
+        db.session.execute(Ticket.__table__.insert(), [
+            {'raffle_id': raffle_id, 'ticket_number': number, 'user_id': number % 500, 'purchase_time': NOW}
+            for number in range(1, tickets_per_raffle + 1)
+        ])
+    db.session.commit()
+
+def report(label, repeat):
+    print(f"\n== {label}")
+    for name, sql, params in HOT_QUERIES:
+        plan = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            db.session.execute(text(sql), params).fetchall()
+        elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+        print(f"{name:<40} {elapsed_ms:8.3f} ms  {' | '.join(row[-1] for row in plan)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--raffles', type=int, default=200)
+    parser.add_argument('--tickets-per-raffle', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        populate(args.raffles, args.tickets_per_raffle)
+        print(f"{args.raffles} raffles, {args.raffles * args.tickets_per_raffle} tickets")
+
+        with db.engine.begin() as connection:
+            for index in INDEXES:
+                index.drop(connection)
+        db.session.execute(text("ANALYZE"))
+        report("without indexes", args.repeat)
+
+        with db.engine.begin() as connection:
+            for index in INDEXES:
+                index.create(connection)
+        db.session.execute(text("ANALYZE"))
+        report("with indexes", args.repeat)
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,33 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Database engine profile (see app/utils/db_engine.py). Pool settings apply to
+    # file SQLite and server databases; recycle and pre-ping only to the latter.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+    DB_POOL_TIMEOUT = 30  # Seconds to wait for a pooled connection
+    DB_POOL_RECYCLE = 1800  # Seconds before a server connection is replaced
+    DB_POOL_PRE_PING = True
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)  # Milliseconds
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 268435456,  # 256 MB
+        'cache_size': -65536  # 64 MB
+    }
+
+    # Read replica for the GET endpoints; unset means every query goes to the primary
+    SQLALCHEMY_REPLICA_URI = os.environ.get('REPLICA_DATABASE_URL')
+    REPLICA_PROBE_INTERVAL = 5  # Seconds between replica health checks
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS') or 5)  # Primary reads after a write
+    REPLICA_SYNC_INTERVAL = int(os.environ.get('REPLICA_SYNC_INTERVAL') or 10)  # Seconds, SQLite copy job
+
+    # Optional ASGI read API (app/asgi.py); the async URL defaults to the primary's
+    # with its async driver, e.g. sqlite+aiosqlite
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
+    ASGI_LONG_POLL_MAX = 30  # Longest `wait` a change-feed request may ask for, in seconds
+    ASGI_CHANGE_POLL_INTERVAL = 0.5  # Seconds between checks of the change feed head
     
     # Celery Configuration
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
@@ -21,16 +48,56 @@ class Config:
     RAFFLE_MAX_TICKETS = 10000
     RAFFLE_MIN_TICKET_PRICE = 0.01
     RAFFLE_MAX_TICKET_PRICE = 1000.00
+    RAFFLE_DRAW_WORKERS = int(os.environ.get('RAFFLE_DRAW_WORKERS') or 4)
+    RAFFLE_MAX_BATCH_PURCHASE = 1000  # Items accepted by one batch purchase request
+
+    # In-process raffle transition scheduler (replaces the Celery polling tasks)
+    RAFFLE_SCHEDULER_ENABLED = os.environ.get('RAFFLE_SCHEDULER_ENABLED', '').lower() in ('1', 'true', 'yes')
+    RAFFLE_SCHEDULER_WINDOW = 3600  # Seconds of upcoming start/end events kept in memory
+
+    # In-process response cache for the raffle read endpoints
+    RAFFLE_CACHE_MAX_ENTRIES = int(os.environ.get('RAFFLE_CACHE_MAX_ENTRIES') or 1024)
+    RAFFLE_CACHE_TTL = int(os.environ.get('RAFFLE_CACHE_TTL') or 30)  # Seconds
+    RAFFLE_CACHE_WARMUP = os.environ.get('RAFFLE_CACHE_WARMUP', '').lower() in ('1', 'true', 'yes')
+
+    # Opt-in group commit for ticket purchases: one writer thread applies queued
+    # purchases in micro-batches that share a transaction
+    RAFFLE_PURCHASE_BATCHING = os.environ.get('RAFFLE_PURCHASE_BATCHING', '').lower() in ('1', 'true', 'yes')
+    RAFFLE_PURCHASE_BATCH_SIZE = int(os.environ.get('RAFFLE_PURCHASE_BATCH_SIZE') or 64)
+    RAFFLE_PURCHASE_BATCH_WAIT_MS = int(os.environ.get('RAFFLE_PURCHASE_BATCH_WAIT_MS') or 5)
+
+    # Opt-in admission control on the purchase endpoint: a token bucket and a limit
+    # on purchases in flight (0 for no limit) for each raffle
+    RAFFLE_ADMISSION_ENABLED = os.environ.get('RAFFLE_ADMISSION_ENABLED', '').lower() in ('1', 'true', 'yes')
+    RAFFLE_ADMISSION_RATE = float(os.environ.get('RAFFLE_ADMISSION_RATE') or 100)  # Purchases per second
+    RAFFLE_ADMISSION_BURST = int(os.environ.get('RAFFLE_ADMISSION_BURST') or 200)
+    RAFFLE_ADMISSION_CONCURRENCY = int(os.environ.get('RAFFLE_ADMISSION_CONCURRENCY') or 16)
+    RAFFLE_ADMISSION_SOLD_OUT_TTL = 5  # Seconds a sold-out raffle is refused without a database check
+
+    # Seconds between runs of the job that rolls balance ledger entries into snapshots
+    BALANCE_COMPACTION_INTERVAL = int(os.environ.get('BALANCE_COMPACTION_INTERVAL') or 300)
+    # Seconds a ledger entry must be old before compaction folds it; longer than any
+    # transaction that writes ledger entries
+    BALANCE_COMPACTION_GRACE = int(os.environ.get('BALANCE_COMPACTION_GRACE') or 120)
+
+    # Signed session tokens issued at login, and the pool that runs password hashing
+    SESSION_TOKEN_MAX_AGE = int(os.environ.get('SESSION_TOKEN_MAX_AGE') or 86400)  # Seconds
+    SESSION_TOKEN_CACHE_SIZE = int(os.environ.get('SESSION_TOKEN_CACHE_SIZE') or 10000)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)
+    PASSWORD_HASH_MAX_PENDING = 32  # Logins allowed to wait for a hashing thread
+    PASSWORD_HASH_TIMEOUT = 10  # Seconds
 
 class DevelopmentConfig(Config):
     DEBUG = True
 
 class TestingConfig(Config):
     TESTING = True
+    BALANCE_COMPACTION_GRACE = 0
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'test.db')
 
 class ProductionConfig(Config):
-    pass
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 20)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
 
 config = {
     'development': DevelopmentConfig,
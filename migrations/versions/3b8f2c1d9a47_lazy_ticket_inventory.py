@@ -0,0 +1,45 @@
+"""Lazy ticket inventory: drop pre-generated unsold ticket rows
+
+Revision ID: 3b8f2c1d9a47
+Revises: ee599928db06
+Create Date: 2024-11-04 09:41:12.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8f2c1d9a47'
+down_revision = 'ee599928db06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A raffle's ticket space is now the range 1..number_of_tickets and a
+    # ticket row is only written when that number is sold.
+    op.execute("DELETE FROM ticket WHERE user_id IS NULL")
+
+
+def downgrade():
+    # Re-create one unsold row per number that has not been sold.
+    connection = op.get_bind()
+    raffles = connection.execute(sa.text("SELECT id, number_of_tickets FROM raffle")).fetchall()
+    for raffle_id, number_of_tickets in raffles:
+        sold_numbers = {
+            number for (number,) in connection.execute(
+                sa.text("SELECT ticket_number FROM ticket WHERE raffle_id = :raffle_id"),
+                {'raffle_id': raffle_id}
+            )
+        }
+        unsold_rows = [
+            {'raffle_id': raffle_id, 'ticket_number': number}
+            for number in range(1, number_of_tickets + 1)
+            if number not in sold_numbers
+        ]
+        if unsold_rows:
+            connection.execute(
+                sa.text("INSERT INTO ticket (raffle_id, ticket_number) VALUES (:raffle_id, :ticket_number)"),
+                unsold_rows
+            )
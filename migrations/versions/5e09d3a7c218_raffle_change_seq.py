@@ -0,0 +1,35 @@
+"""Add change_seq and updated_at to raffle
+
+Revision ID: 5e09d3a7c218
+Revises: c2f7b8e41d90
+Create Date: 2024-11-14 10:21:06.437915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e09d3a7c218'
+down_revision = 'c2f7b8e41d90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Existing raffles are replayed in id order by the first changes request
+    op.execute("UPDATE raffle SET change_seq = id, updated_at = created_at")
+
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.create_index('ix_raffle_change_seq', ['change_seq'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.drop_index('ix_raffle_change_seq')
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('change_seq')
@@ -0,0 +1,30 @@
+"""Add the counter behind raffle.change_seq on server databases
+
+Revision ID: 6b2e9f4c1a83
+Revises: 9d41c6e2a8b3
+Create Date: 2024-11-20 14:05:51.602317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b2e9f4c1a83'
+down_revision = '9d41c6e2a8b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('raffle_change_counter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Continues from the sequence values already handed out
+    op.execute("INSERT INTO raffle_change_counter (id, value) SELECT 1, COALESCE(MAX(change_seq), 0) FROM raffle")
+
+
+def downgrade():
+    op.drop_table('raffle_change_counter')
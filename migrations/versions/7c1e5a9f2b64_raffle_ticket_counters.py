@@ -0,0 +1,37 @@
+"""Add sold_count and available_count to raffle
+
+Revision ID: 7c1e5a9f2b64
+Revises: 3b8f2c1d9a47
+Create Date: 2024-11-06 14:02:47.118342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e5a9f2b64'
+down_revision = '3b8f2c1d9a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sold_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('available_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        "UPDATE raffle SET sold_count = "
+        "(SELECT count(ticket.id) FROM ticket WHERE ticket.raffle_id = raffle.id AND ticket.user_id IS NOT NULL)"
+    )
+    op.execute(
+        "UPDATE raffle SET available_count = "
+        "CASE WHEN status = 'CANCELLED' THEN 0 ELSE number_of_tickets - sold_count END"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.drop_column('available_count')
+        batch_op.drop_column('sold_count')
@@ -0,0 +1,51 @@
+"""Add the balance_entry ledger and the user's snapshot pointer
+
+Revision ID: 9d41c6e2a8b3
+Revises: 5e09d3a7c218
+Create Date: 2024-11-18 09:47:32.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d41c6e2a8b3'
+down_revision = '5e09d3a7c218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('balance_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('kind', sa.Enum('DEPOSIT', 'WITHDRAWAL', 'PURCHASE', 'REFUND', 'PAYOUT', name='balanceentrykind'), nullable=False),
+    sa.Column('raffle_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['raffle_id'], ['raffle.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('balance_entry', schema=None) as batch_op:
+        batch_op.create_index('ix_balance_entry_user_id_id', ['user_id', 'id'], unique=False)
+
+    # Existing balances become the snapshots, with an empty tail
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('snapshot_entry_id', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    # Fold any unsnapshotted entries back into the balance column first
+    op.execute(
+        'UPDATE "user" SET balance = COALESCE(balance, 0) + COALESCE((SELECT SUM(amount) FROM balance_entry '
+        'WHERE balance_entry.user_id = "user".id AND balance_entry.id > "user".snapshot_entry_id), 0)'
+    )
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('snapshot_entry_id')
+
+    with op.batch_alter_table('balance_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_balance_entry_user_id_id')
+
+    op.drop_table('balance_entry')
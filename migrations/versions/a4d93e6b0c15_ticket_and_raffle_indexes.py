@@ -0,0 +1,38 @@
+"""Add lookup indexes on ticket and raffle
+
+Revision ID: a4d93e6b0c15
+Revises: 7c1e5a9f2b64
+Create Date: 2024-11-08 10:27:05.640291
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d93e6b0c15'
+down_revision = '7c1e5a9f2b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        batch_op.create_index('ix_ticket_raffle_id_user_id', ['raffle_id', 'user_id'], unique=False)
+        batch_op.create_index('ix_ticket_raffle_id_ticket_number', ['raffle_id', 'ticket_number'], unique=True)
+        batch_op.create_index('ix_ticket_user_id', ['user_id'], unique=False)
+
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.create_index('ix_raffle_status_end_time', ['status', 'end_time'], unique=False)
+        batch_op.create_index('ix_raffle_status_start_time', ['status', 'start_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.drop_index('ix_raffle_status_start_time')
+        batch_op.drop_index('ix_raffle_status_end_time')
+
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        batch_op.drop_index('ix_ticket_user_id')
+        batch_op.drop_index('ix_ticket_raffle_id_ticket_number')
+        batch_op.drop_index('ix_ticket_raffle_id_user_id')
@@ -0,0 +1,65 @@
+"""Add draw_result table and backfill it from raffle.result
+
+Revision ID: c2f7b8e41d90
+Revises: a4d93e6b0c15
+Create Date: 2024-11-12 16:45:31.902774
+
+"""
+import json
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2f7b8e41d90'
+down_revision = 'a4d93e6b0c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    draw_result = op.create_table('draw_result',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('raffle_id', sa.Integer(), nullable=False),
+    sa.Column('draw_index', sa.Integer(), nullable=False),
+    sa.Column('ticket_number', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('prize_value', sa.Float(), nullable=False),
+    sa.Column('draw_time', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['raffle_id'], ['raffle.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('draw_result', schema=None) as batch_op:
+        batch_op.create_index('ix_draw_result_raffle_id_draw_index', ['raffle_id', 'draw_index'], unique=True)
+        batch_op.create_index('ix_draw_result_user_id', ['user_id'], unique=False)
+
+    connection = op.get_bind()
+    raffles = connection.execute(sa.text("SELECT id, result FROM raffle WHERE result IS NOT NULL")).fetchall()
+    for raffle_id, result in raffles:
+        try:
+            winners = json.loads(result)
+        except ValueError:
+            continue
+        rows = [
+            {
+                'raffle_id': raffle_id,
+                'draw_index': draw_index,
+                'ticket_number': winner['ticket_number'],
+                'user_id': winner['user_id'] if isinstance(winner.get('user_id'), int) else None,
+                'prize_value': winner['prize_value'],
+                'draw_time': datetime.fromisoformat(winner['draw_time'])
+            }
+            for draw_index, winner in enumerate(winners, start=1)
+        ]
+        if rows:
+            op.bulk_insert(draw_result, rows)
+
+
+def downgrade():
+    with op.batch_alter_table('draw_result', schema=None) as batch_op:
+        batch_op.drop_index('ix_draw_result_user_id')
+        batch_op.drop_index('ix_draw_result_raffle_id_draw_index')
+
+    op.drop_table('draw_result')
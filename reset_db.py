@@ -1,6 +1,6 @@
 from app import create_app, db
-from app.models.raffle import Raffle
-from app.models.ticket import Ticket
+from app.models.raffle import PrizeDistributionType
+from app.services.raffle_service import RaffleService
 from datetime import datetime, timedelta
 
 def reset_database():
@@ -12,8 +12,8 @@ def reset_database():
         # Create all tables
         db.create_all()
         
-        # Create some sample data
-        sample_raffle = Raffle(
+        # Create some sample data. Tickets are created as they are sold.
+        _, error = RaffleService.create_raffle(
             name="Test Raffle",
             description="This is a test raffle",
             prize_description="A fantastic prize",
@@ -23,12 +23,13 @@ def reset_database():
             ticket_price=10.0,
             number_of_tickets=100,
             max_tickets_per_user=5,
-            general_terms_link="https://example.com/terms"
+            general_terms_link="https://example.com/terms",
+            number_of_draws=1,
+            prize_value=1000.0,
+            prize_distribution_type=PrizeDistributionType.FULL
         )
-        db.session.add(sample_raffle)
-        db.session.commit()
-        
-        sample_raffle.generate_tickets()
+        if error:
+            raise SystemExit(f"Could not create the sample raffle: {error}")
         
         print("Database reset complete. Sample raffle created.")
 
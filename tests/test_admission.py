@@ -0,0 +1,178 @@
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert
+from app import create_app, db
+from app.models.raffle import PrizeDistributionType
+from app.models.ticket import Ticket
+from app.models.user import User
+from app.services.raffle_service import RaffleService
+from app.utils.admission import PurchaseAdmission
+from app.utils.ticket_allocator import clear_allocators
+from config import TestingConfig
+
+class AdmissionTestingConfig(TestingConfig):
+    RAFFLE_ADMISSION_ENABLED = True
+
+class TestPurchaseAdmission(unittest.TestCase):
+    def test_bucket_refusals_get_queue_positions(self):
+        admission = PurchaseAdmission(rate=10, burst=2, concurrency=0)
+        with mock.patch('app.utils.admission.time.monotonic', return_value=100.0):
+            self.assertIsNone(admission.enter(1))
+            self.assertIsNone(admission.enter(1))
+            self.assertEqual(admission.enter(1), (1, 1))
+            self.assertEqual(admission.enter(1), (2, 1))
+            # Other raffles have their own bucket
+            self.assertIsNone(admission.enter(2))
+
+        # Half a second refills the bucket and drains the two queued clients
+        with mock.patch('app.utils.admission.time.monotonic', return_value=100.5):
+            self.assertIsNone(admission.enter(1))
+            self.assertIsNone(admission.enter(1))
+            self.assertEqual(admission.enter(1).queue_position, 1)
+            for _ in range(24):
+                rejection = admission.enter(1)
+        self.assertEqual(rejection, (25, 3))
+
+    def test_steady_overload_keeps_admitting_at_the_rate(self):
+        # 150 requests a second against 100 a second: after the burst, every second
+        # still lets about 100 through and the queue estimate stays bounded
+        admission = PurchaseAdmission(rate=100, burst=200, concurrency=0, max_retry_after=30)
+        admitted_per_second = []
+        for second in range(30):
+            admitted = 0
+            for n in range(150):
+                with mock.patch('app.utils.admission.time.monotonic', return_value=second + n / 150):
+                    if admission.enter(1) is None:
+                        admission.leave(1)
+                        admitted += 1
+            admitted_per_second.append(admitted)
+        for admitted in admitted_per_second[5:]:
+            self.assertGreaterEqual(admitted, 99)
+            self.assertLessEqual(admitted, 101)
+        with mock.patch('app.utils.admission.time.monotonic', return_value=30):
+            self.assertLessEqual(admission.enter(1).retry_after, 30)
+
+    def test_concurrency_refusals_are_not_queued(self):
+        admission = PurchaseAdmission(rate=10, burst=100, concurrency=1)
+        with mock.patch('app.utils.admission.time.monotonic', return_value=100.0):
+            self.assertIsNone(admission.enter(1))
+            for _ in range(50):
+                self.assertEqual(admission.enter(1), (1, 1))
+            admission.leave(1)
+            self.assertIsNone(admission.enter(1))
+        self.assertEqual(admission.stats()['rejected_busy'], 50)
+
+    def test_concurrency_limit_is_per_raffle(self):
+        admission = PurchaseAdmission(rate=1000, burst=1000, concurrency=2)
+        self.assertIsNone(admission.enter(1))
+        self.assertIsNone(admission.enter(1))
+        self.assertIsNotNone(admission.enter(1))
+        self.assertIsNone(admission.enter(2))
+        admission.leave(1)
+        self.assertIsNone(admission.enter(1))
+        self.assertEqual(admission.stats()['in_flight'], 3)
+
+    def test_sold_out_mark_expires(self):
+        admission = PurchaseAdmission(sold_out_ttl=5)
+        admission.mark_sold_out(1)
+        self.assertTrue(admission.sold_out(1))
+        self.assertFalse(admission.sold_out(2))
+        with mock.patch('app.utils.admission.time.monotonic', return_value=10 ** 9):
+            self.assertFalse(admission.sold_out(1))
+        admission.mark_sold_out(1)
+        admission.forget(1)
+        self.assertFalse(admission.sold_out(1))
+
+class TestPurchaseAdmissionRoute(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(AdmissionTestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        start_time = datetime.utcnow() - timedelta(hours=1)
+        self.raffle, _ = RaffleService.create_raffle(
+            name="Flash Sale",
+            description="A test raffle",
+            prize_description="A great prize",
+            terms_and_conditions="Standard terms apply",
+            start_time=start_time,
+            end_time=start_time + timedelta(days=7),
+            ticket_price=10.0,
+            number_of_tickets=2,
+            max_tickets_per_user=5,
+            general_terms_link="https://example.com/terms",
+            number_of_draws=1,
+            prize_value=1000.0,
+            prize_distribution_type=PrizeDistributionType.FULL
+        )
+        RaffleService.activate_raffle(self.raffle.id)
+        self.raffle_id = self.raffle.id
+        db.session.execute(insert(User), [
+            {'id': user_id, 'username': f"buyer{user_id}", 'email': f"buyer{user_id}@example.com", 'balance_snapshot': 100.0}
+            for user_id in (1, 2)
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        clear_allocators()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _buy(self, user_id):
+        return self.client.post(f'/api/raffle/{self.raffle_id}/purchase', json={'user_id': user_id, 'num_tickets': 1})
+
+    def test_sold_out_raffle_is_refused_without_a_query(self):
+        # The purchase that takes the last ticket marks the raffle, so even the first
+        # request after the sell-out never reaches the database
+        self.assertEqual(self._buy(1).status_code, 201)
+        self.assertEqual(self._buy(2).status_code, 201)
+
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = self._buy(2)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], "Not enough tickets available. Only 0 left.")
+        self.assertEqual(statements, [])
+        self.assertEqual(self.app.extensions['purchase_admission'].stats()['rejected_sold_out'], 1)
+
+        # A refund makes the ticket purchasable again straight away
+        ticket_id = Ticket.query.filter_by(user_id=1).first().id
+        self.assertEqual(self.client.post(f'/api/raffle/ticket/{ticket_id}/refund').status_code, 200)
+        self.assertEqual(self._buy(2).status_code, 201)
+
+    def test_cancelled_raffle_is_not_reported_sold_out(self):
+        RaffleService.cancel_raffle(self.raffle.id)
+        response = self._buy(1)
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("Only 0 left", response.get_json()['error'])
+        self.assertFalse(self.app.extensions['purchase_admission'].sold_out(self.raffle.id))
+        self.assertNotIn("Only 0 left", self._buy(1).get_json()['error'])
+
+    def test_admission_is_opt_in(self):
+        self.assertNotIn('purchase_admission', create_app('testing').extensions)
+
+    def test_busy_raffle_returns_retry_after(self):
+        admission = self.app.extensions['purchase_admission']
+        admission.concurrency = 1
+        admission.enter(self.raffle.id)
+        response = self._buy(1)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.get_json()['queue_position'], 1)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(Ticket.query.count(), 0)
+
+        admission.leave(self.raffle.id)
+        self.assertEqual(self._buy(1).status_code, 201)
+        self.assertEqual(admission.stats()['in_flight'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import importlib.util
+import json
+import time
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models.raffle import PrizeDistributionType
+from app.services.raffle_service import RaffleService
+from app.services.ticket_service import TicketService
+from app.services.user_service import UserService
+
+@unittest.skipUnless(importlib.util.find_spec('aiosqlite'), "aiosqlite is not installed")
+class TestAsgiReadApi(unittest.TestCase):
+    def setUp(self):
+        from app.asgi import ReadAPI
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.api = ReadAPI(self.app)
+        self.client = self.app.test_client()
+
+        self.user, _ = UserService.create_user("asyncreader", "asyncreader@example.com", "password123")
+        UserService.add_balance(self.user.id, 50.0)
+        self.raffle = self._create_raffle("Async Raffle")
+        TicketService.purchase_tickets(self.raffle.id, self.user.id, 2)
+
+    def tearDown(self):
+        asyncio.run(self.api.close())
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _create_raffle(self, name):
+        start_time = datetime.utcnow() - timedelta(hours=1)
+        raffle, _ = RaffleService.create_raffle(
+            name=name,
+            description="A test raffle",
+            prize_description="A great prize",
+            terms_and_conditions="Standard terms apply",
+            start_time=start_time,
+            end_time=start_time + timedelta(days=7),
+            ticket_price=10.0,
+            number_of_tickets=100,
+            max_tickets_per_user=5,
+            general_terms_link="https://example.com/terms",
+            number_of_draws=1,
+            prize_value=1000.0,
+            prize_distribution_type=PrizeDistributionType.FULL
+        )
+        return raffle
+
+    async def _get(self, path, query_string=b'', method='GET'):
+        messages = []
+        async def receive():
+            return {'type': 'http.request'}
+        async def send(message):
+            messages.append(message)
+        await self.api({'type': 'http', 'method': method, 'path': path, 'query_string': query_string}, receive, send)
+        return messages[0]['status'], json.loads(messages[1]['body'])
+
+    def test_read_endpoints_match_the_wsgi_app(self):
+        async def fetch_all(paths):
+            return [await self._get(path) for path in paths]
+
+        paths = [
+            '/api/raffle/', f'/api/raffle/{self.raffle.id}', '/api/raffle/changes',
+            f'/api/user/{self.user.id}', f'/api/user/{self.user.id}/tickets',
+            '/api/raffle/9999', '/api/user/9999'
+        ]
+        for path, (status_code, payload) in zip(paths, asyncio.run(fetch_all(paths))):
+            response = self.client.get(path)
+            self.assertEqual((status_code, payload), (response.status_code, response.get_json()), path)
+
+        self.assertEqual(asyncio.run(self._get('/api/raffle/', method='POST'))[0], 405)
+        self.assertEqual(asyncio.run(self._get('/api/raffle/changes', b'since=bad'))[0], 400)
+
+    def test_long_poll_returns_when_the_feed_moves(self):
+        _, first = asyncio.run(self._get('/api/raffle/changes'))
+
+        async def poll_while_writing():
+            poll = asyncio.create_task(self._get('/api/raffle/changes', f"since={first['cursor']}&wait=10".encode()))
+            await asyncio.sleep(0.2)
+            await asyncio.to_thread(self._create_raffle_in_thread)
+            started = time.perf_counter()
+            result = await poll
+            return result, time.perf_counter() - started
+
+        (status_code, payload), waited = asyncio.run(poll_while_writing())
+        self.assertEqual(status_code, 200)
+        self.assertEqual(len(payload['changes']), 1)
+        self.assertLess(waited, 5)
+
+        # Nothing new: the request gives up after `wait` seconds with the same cursor
+        started = time.perf_counter()
+        _, payload = asyncio.run(self._get('/api/raffle/changes', f"since={payload['cursor']}&wait=0.3".encode()))
+        self.assertEqual(payload['changes'], [])
+        self.assertGreaterEqual(time.perf_counter() - started, 0.3)
+
+    def _create_raffle_in_thread(self):
+        with self.app.app_context():
+            self._create_raffle("Late Raffle")
+            db.session.remove()
+
+if __name__ == '__main__':
+    unittest.main()
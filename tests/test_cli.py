@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from app import create_app, db
+from app.models.raffle import Raffle, RaffleStatus, PrizeDistributionType, raffle_change_counter
+from app.models.ticket import Ticket
+from app.models.user import User
+from app.models.draw_result import DrawResult
+from app.services.raffle_service import RaffleService
+from app.services.user_service import UserService
+from app.utils.data_transfer import sequence_reset_statement
+
+class TestDataTransferCommands(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.runner = self.app.test_cli_runner()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _seed(self):
+        user, _ = UserService.create_user("exporter", "exporter@example.com", "password123")
+        start_time = datetime.utcnow() - timedelta(days=2)
+        raffle, _ = RaffleService.create_raffle(
+            name="Exported Raffle",
+            description=None,
+            prize_description="A great prize",
+            terms_and_conditions="Standard terms apply",
+            start_time=start_time,
+            end_time=start_time + timedelta(days=1),
+            ticket_price=10.0,
+            number_of_tickets=10,
+            max_tickets_per_user=10,
+            general_terms_link="https://example.com/terms",
+            number_of_draws=2,
+            prize_value=1000.0,
+            prize_distribution_type=PrizeDistributionType.SPLIT
+        )
+        db.session.add_all([
+            Ticket(raffle_id=raffle.id, ticket_number=n, user_id=user.id, purchase_time=datetime.utcnow())
+            for n in range(1, 6)
+        ])
+        db.session.commit()
+        RaffleService.select_winner(raffle.id)
+
+    def _snapshot(self):
+        db.session.expire_all()
+        return {
+            model.__tablename__: [
+                {column.name: getattr(row, column.key) for column in model.__table__.columns}
+                for row in model.query.order_by(model.id)
+            ]
+            for model in (User, Raffle, Ticket, DrawResult)
+        }
+
+    def test_export_import_round_trip(self):
+        self._seed()
+        before = self._snapshot()
+
+        for fmt in ('jsonl', 'csv'):
+            directory = os.path.join(self.directory, fmt)
+            result = self.runner.invoke(args=['wildrandom', 'export', directory, '--format', fmt, '--chunk-size', '2'])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn("Exported 5 ticket rows", result.output)
+
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            result = self.runner.invoke(args=['wildrandom', 'import', directory, '--chunk-size', '2'])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn("ticket: 4 rows", result.output)
+            self.assertEqual(self._snapshot(), before)
+            self.assertEqual(Raffle.query.one().status, RaffleStatus.ENDED)
+
+    def test_normal_writes_follow_an_import(self):
+        self._seed()
+        self.runner.invoke(args=['wildrandom', 'export', self.directory])
+        imported_user_id = User.query.one().id
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        result = self.runner.invoke(args=['wildrandom', 'import', self.directory])
+        self.assertEqual(result.exit_code, 0, result.output)
+
+        user, error = UserService.create_user("newcomer", "newcomer@example.com", "password123")
+        self.assertIsNone(error)
+        self.assertGreater(user.id, imported_user_id)
+        self.assertGreaterEqual(
+            db.session.scalar(select(raffle_change_counter.c.value)),
+            db.session.scalar(select(func.max(Raffle.change_seq)))
+        )
+
+    def test_sequence_reset_statement(self):
+        statement = str(sequence_reset_statement(User.__table__, postgresql.dialect()))
+        self.assertEqual(
+            statement,
+            "SELECT setval(pg_get_serial_sequence('\"user\"', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM \"user\""
+        )
+        self.assertIsNone(sequence_reset_statement(User.__table__, sqlite.dialect()))
+
+    def test_import_refuses_non_empty_tables(self):
+        self._seed()
+        self.runner.invoke(args=['wildrandom', 'export', self.directory])
+        result = self.runner.invoke(args=['wildrandom', 'import', self.directory])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("Table user is not empty", result.output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from sqlalchemy import text
+from app import create_app, db
+from config import TestingConfig
+
+class LockTestingConfig(TestingConfig):
+    SQLITE_BUSY_TIMEOUT = 50
+    DB_POOL_SIZE = 2
+    DB_MAX_OVERFLOW = 0
+    DB_POOL_TIMEOUT = 1
+
+class TestEngineProfile(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(LockTestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_sqlite_pragmas_are_applied_on_connect(self):
+        pragma = lambda name: db.session.execute(text(f"PRAGMA {name}")).scalar()
+        self.assertEqual(pragma('journal_mode'), 'wal')
+        self.assertEqual(pragma('synchronous'), 1)
+        self.assertEqual(pragma('busy_timeout'), 50)
+        self.assertEqual(pragma('cache_size'), -65536)
+
+    def test_pool_usage_and_lock_errors_are_counted(self):
+        metrics = self.app.extensions['engine_metrics']
+        holder = db.engine.connect()
+        holder.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            writer = db.engine.connect()
+            with self.assertRaises(Exception):
+                writer.exec_driver_sql("CREATE TABLE lock_probe (id INTEGER)")
+            writer.close()
+        finally:
+            holder.exec_driver_sql("ROLLBACK")
+            holder.close()
+
+        response = self.app.test_client().get('/db_stats')
+        stats = response.get_json()
+        self.assertEqual(stats['lock_errors'], 1)
+        self.assertGreaterEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['pool']['size'], 2)
+        self.assertEqual(metrics.stats()['peak_in_use'], 2)
+
+    def test_checkout_timeouts_are_counted(self):
+        connections = [db.engine.connect() for _ in range(2)]
+        try:
+            with self.assertRaises(Exception):
+                db.engine.connect()
+        finally:
+            for connection in connections:
+                connection.close()
+        self.assertEqual(self.app.extensions['engine_metrics'].stats()['checkout_timeouts'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
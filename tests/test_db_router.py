@@ -0,0 +1,99 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from app import create_app, db
+from app.models.user import User
+from app.services.user_service import UserService
+from app.utils.db_router import STICKY_COOKIE, sync_sqlite_replica
+from config import TestingConfig
+
+class ReplicaTestingConfig(TestingConfig):
+    REPLICA_PROBE_INTERVAL = 0
+
+class TestDatabaseRouter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        ReplicaTestingConfig.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.directory, 'primary.db')
+        ReplicaTestingConfig.SQLALCHEMY_REPLICA_URI = 'sqlite:///' + os.path.join(self.directory, 'replica.db')
+        self.app = create_app(ReplicaTestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.router = self.app.extensions['db_router']
+        user, _ = UserService.create_user("replicated", "replicated@example.com", "password123")
+        self.user_id = user.id
+        db.session.remove()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _get_user(self, method='GET'):
+        # A fresh session, as a request in its own app context would have
+        db.session.remove()
+        with self.app.test_request_context(method=method):
+            user, error = UserService.get_user(self.user_id)
+            return user.username if user else error
+
+    def test_get_reads_use_the_replica_once_it_is_synced(self):
+        # The empty replica fails the probe, so reads fall back to the primary
+        self.assertEqual(self._get_user(), "replicated")
+        self.assertFalse(self.router.stats()['replica_available'])
+
+        sync_sqlite_replica(db)
+        db.session.execute(db.update(User).values(username="renamed"))
+        db.session.commit()
+        self.assertEqual(self._get_user(), "replicated")
+        self.assertTrue(self.router.stats()['replica_available'])
+        # Writes and non-GET requests always go to the primary
+        self.assertEqual(self._get_user('POST'), "renamed")
+
+        sync_sqlite_replica(db)
+        self.assertEqual(self._get_user(), "renamed")
+
+    def test_reads_after_a_write_stick_to_the_primary(self):
+        sync_sqlite_replica(db)
+        with self.app.test_request_context(method='GET'):
+            db.session.execute(db.update(User).values(username="renamed"))
+            user, _ = UserService.get_user(self.user_id)
+            self.assertEqual(user.username, "renamed")
+            db.session.rollback()
+        self.assertEqual(self._get_user(), "replicated")
+
+        client = self.app.test_client()
+        response = client.post(f'/api/user/{self.user_id}/balance', json={'amount': 5})
+        self.assertIn(STICKY_COOKIE, response.headers.get('Set-Cookie', ''))
+        self.assertNotIn('Set-Cookie', client.get(f'/api/user/{self.user_id}').headers)
+        # The write is not on the replica yet, but the sticky cookie reads the primary
+        self.assertEqual(client.get(f'/api/user/{self.user_id}').get_json()['balance'], 5.0)
+        client.delete_cookie(STICKY_COOKIE)
+        self.assertEqual(client.get(f'/api/user/{self.user_id}').get_json()['balance'], 0.0)
+
+    def test_a_failing_replica_read_is_answered_by_the_primary(self):
+        sync_sqlite_replica(db)
+        self.assertEqual(self._get_user(), "replicated")
+        self.assertTrue(self.router.stats()['replica_available'])
+
+        replica = sqlite3.connect(self.router.engine.url.database)
+        replica.execute('DROP TABLE "user"')
+        replica.commit()
+        replica.close()
+
+        response = self.app.test_client().get(f'/api/user/{self.user_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['username'], "replicated")
+        self.assertFalse(self.router.stats()['replica_available'])
+
+    def test_replica_has_its_own_pool_and_metrics(self):
+        sync_sqlite_replica(db)
+        self._get_user()
+        self.assertIsNot(self.router.metrics, self.app.extensions['engine_metrics'])
+        self.assertIsNot(self.router.engine.pool.metrics, db.engine.pool.metrics)
+        self.assertGreaterEqual(self.router.stats()['metrics']['checkouts'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,14 @@
 import unittest
+from unittest import mock
 from datetime import datetime, timedelta
+from sqlalchemy import event
 from app import create_app, db
 from app.models.raffle import Raffle, RaffleStatus, PrizeDistributionType
 from app.services.raffle_service import RaffleService
 from app.models.ticket import Ticket
+from app.models.draw_result import DrawResult
+from app.models.user import User
+from app.models.balance_entry import BalanceEntry, BalanceEntryKind
 
 class TestRaffleService(unittest.TestCase):
     def setUp(self):
@@ -38,7 +43,8 @@ class TestRaffleService(unittest.TestCase):
         self.assertIsNone(error)
         self.assertIsNotNone(raffle)
         self.assertEqual(raffle.status, RaffleStatus.DRAFT)
-        self.assertEqual(raffle.tickets.count(), 100)
+        self.assertEqual(raffle.tickets.count(), 0)
+        self.assertEqual(raffle.available_count, 100)
 
     def test_activate_raffle(self):
         start_time = datetime.utcnow() + timedelta(days=1)
@@ -137,16 +143,299 @@ class TestRaffleService(unittest.TestCase):
             prize_distribution_type=PrizeDistributionType.FULL
         )
         RaffleService.activate_raffle(raffle.id)
-        
+
         # Simulate a ticket purchase
-        ticket = raffle.tickets.first()
-        ticket.user_id = 1
+        db.session.add(Ticket(raffle_id=raffle.id, ticket_number=1, user_id=1, purchase_time=datetime.utcnow()))
         db.session.commit()
 
         winners, error = RaffleService.select_winner(raffle.id)
         self.assertIsNone(error)
         self.assertEqual(len(winners), 1)
-        self.assertEqual(winners[0].user_id, 1)
+        expected_user = 1 if winners[0]['ticket_number'] == 1 else "No Winner"
+        self.assertEqual(winners[0]['user_id'], expected_user)
+
+    def test_reconcile_ticket_counters(self):
+        start_time = datetime.utcnow() - timedelta(days=1)
+        end_time = start_time + timedelta(days=7)
+        raffle, _ = RaffleService.create_raffle(
+            name="Test Raffle",
+            description="A test raffle",
+            prize_description="A great prize",
+            terms_and_conditions="Standard terms apply",
+            start_time=start_time,
+            end_time=end_time,
+            ticket_price=10.0,
+            number_of_tickets=100,
+            max_tickets_per_user=5,
+            general_terms_link="https://example.com/terms",
+            number_of_draws=1,
+            prize_value=1000.0,
+            prize_distribution_type=PrizeDistributionType.FULL
+        )
+        db.session.add_all([
+            Ticket(raffle_id=raffle.id, ticket_number=n, user_id=1, purchase_time=datetime.utcnow())
+            for n in range(1, 4)
+        ])
+        db.session.commit()
+
+        reconciled, error = RaffleService.reconcile_ticket_counters()
+        self.assertIsNone(error)
+        self.assertEqual(reconciled, 1)
+        db.session.refresh(raffle)
+        self.assertEqual(raffle.sold_count, 3)
+        self.assertEqual(raffle.available_count, 97)
+
+        RaffleService.cancel_raffle(raffle.id)
+        self.assertEqual(raffle.available_count, 0)
+        reconciled, _ = RaffleService.reconcile_ticket_counters(raffle.id)
+        self.assertEqual(reconciled, 0)
+
+    def test_select_winner_draws_distinct_sold_tickets(self):
+        raffle = self._create_started_raffle()
+        raffle.number_of_draws = 100
+        raffle.prize_distribution_type = PrizeDistributionType.SPLIT
+        raffle.end_time = datetime.utcnow() - timedelta(minutes=1)
+        db.session.add_all([
+            Ticket(raffle_id=raffle.id, ticket_number=n, user_id=n, purchase_time=datetime.utcnow())
+            for n in range(1, 51)
+        ])
+        db.session.commit()
+
+        winners, error = RaffleService.select_winner(raffle.id)
+        self.assertIsNone(error)
+        self.assertEqual(sorted(w['ticket_number'] for w in winners), list(range(1, 101)))
+        for winner in winners:
+            expected_user = winner['ticket_number'] if winner['ticket_number'] <= 50 else "No Winner"
+            self.assertEqual(winner['user_id'], expected_user)
+            self.assertEqual(winner['prize_value'], 10.0)
+        self.assertEqual(raffle.status, RaffleStatus.ENDED)
+
+    def test_end_due_raffles_and_draw_in_parallel(self):
+        raffles = [self._create_started_raffle(name=f"Raffle {i}") for i in range(6)]
+        for raffle in raffles:
+            raffle.status = RaffleStatus.ACTIVE
+            raffle.end_time = datetime.utcnow() - timedelta(minutes=1)
+            db.session.add(Ticket(raffle_id=raffle.id, ticket_number=1, user_id=1, purchase_time=datetime.utcnow()))
+        db.session.commit()
+        raffle_ids = [raffle.id for raffle in raffles]
+
+        ended, error = RaffleService.end_due_raffles()
+        self.assertIsNone(error)
+        self.assertEqual(ended, 6)
+
+        select_winner = RaffleService.select_winner
+        def failing_select_winner(raffle_id):
+            if raffle_id == raffle_ids[0]:
+                raise RuntimeError("draw failed")
+            return select_winner(raffle_id)
+
+        with mock.patch.object(RaffleService, 'select_winner', side_effect=failing_select_winner):
+            summary, error = RaffleService.draw_pending_raffles(max_workers=3)
+        self.assertIsNone(error)
+        self.assertEqual(summary['drawn'], 5)
+        self.assertEqual(list(summary['failed']), [raffle_ids[0]])
+
+        # The failed raffle is retried on the next run; drawn ones are not redrawn
+        summary, _ = RaffleService.draw_pending_raffles(max_workers=3)
+        self.assertEqual(summary['drawn'], 1)
+        summary, _ = RaffleService.draw_pending_raffles(max_workers=3)
+        self.assertEqual(summary['drawn'], 0)
+
+        db.session.expire_all()
+        for raffle_id in raffle_ids:
+            raffle = db.session.get(Raffle, raffle_id)
+            self.assertEqual(raffle.status, RaffleStatus.ENDED)
+            self.assertIsNotNone(raffle.result)
+
+    def test_start_due_raffles(self):
+        raffle = self._create_started_raffle()
+        raffle.status = RaffleStatus.COMING_SOON
+        db.session.commit()
+
+        started, error = RaffleService.start_due_raffles()
+        self.assertIsNone(error)
+        self.assertEqual(started, 1)
+        db.session.refresh(raffle)
+        self.assertEqual(raffle.status, RaffleStatus.ACTIVE)
+
+    def _create_started_raffle(self, name="Test Raffle"):
+        start_time = datetime.utcnow() - timedelta(days=1)
+        raffle, _ = RaffleService.create_raffle(
+            name=name,
+            description="A test raffle",
+            prize_description="A great prize",
+            terms_and_conditions="Standard terms apply",
+            start_time=start_time,
+            end_time=start_time + timedelta(days=7),
+            ticket_price=10.0,
+            number_of_tickets=100,
+            max_tickets_per_user=5,
+            general_terms_link="https://example.com/terms",
+            number_of_draws=1,
+            prize_value=1000.0,
+            prize_distribution_type=PrizeDistributionType.FULL
+        )
+        return raffle
+
+    def _count_comprehensive_info_statements(self):
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            info, error = RaffleService.get_comprehensive_raffle_info()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertIsNone(error)
+        return info, len(statements)
+
+    def test_comprehensive_info_uses_constant_queries(self):
+        raffle = self._create_started_raffle()
+        db.session.add_all([
+            Ticket(raffle_id=raffle.id, ticket_number=n, user_id=n % 2 + 1, purchase_time=datetime.utcnow())
+            for n in range(1, 4)
+        ])
+        db.session.commit()
+        db.session.expire_all()
+
+        info, single_raffle_statements = self._count_comprehensive_info_statements()
+        self.assertEqual(info[0]['total_sold_tickets'], 3)
+        self.assertEqual(info[0]['unique_participants'], 2)
+        self.assertEqual(info[0]['total_income'], 30.0)
+
+        for i in range(5):
+            self._create_started_raffle(name=f"Raffle {i}")
+        db.session.expire_all()
+
+        info, many_raffle_statements = self._count_comprehensive_info_statements()
+        self.assertEqual(len(info), 6)
+        self.assertEqual(info[1]['total_sold_tickets'], 0)
+        self.assertEqual(single_raffle_statements, 1)
+        self.assertEqual(many_raffle_statements, 1)
+
+        # Drawn raffles add a single draw_result lookup, however many there are
+        for raffle in Raffle.query.all():
+            raffle.end_time = datetime.utcnow() - timedelta(minutes=1)
+        db.session.commit()
+        for raffle in Raffle.query.all():
+            RaffleService.select_winner(raffle.id)
+        db.session.expire_all()
+
+        info, drawn_statements = self._count_comprehensive_info_statements()
+        self.assertEqual(drawn_statements, 2)
+        self.assertEqual(len(info[0]['draw_results']), 1)
+        self.assertEqual(info[0]['draw_results'][0]['draw_time'][:4], str(datetime.utcnow().year))
+
+    def test_draw_results_feed_user_history(self):
+        raffle = self._create_started_raffle()
+        raffle.end_time = datetime.utcnow() - timedelta(minutes=1)
+        db.session.add_all([
+            Ticket(raffle_id=raffle.id, ticket_number=n, user_id=1, purchase_time=datetime.utcnow())
+            for n in range(1, 101)
+        ])
+        db.session.commit()
+
+        winners, error = RaffleService.select_winner(raffle.id)
+        self.assertIsNone(error)
+        rows = DrawResult.query.filter_by(raffle_id=raffle.id).all()
+        self.assertEqual([row.draw_index for row in rows], [1])
+        self.assertEqual(rows[0].to_dict(), winners[0])
+
+        history, error = RaffleService.get_user_raffle_history(1)
+        self.assertIsNone(error)
+        self.assertEqual(len(history), 100)
+        self.assertTrue(all(entry['win'] == "You Win!" for entry in history))
+        draw_history, error = RaffleService.get_raffle_draw_history(raffle.id)
+        self.assertIsNone(error)
+        self.assertEqual(draw_history, winners)
+
+    def test_winners_are_paid_into_their_balance(self):
+        raffle = self._create_started_raffle()
+        raffle.number_of_draws = 2
+        raffle.prize_distribution_type = PrizeDistributionType.SPLIT
+        raffle.end_time = datetime.utcnow() - timedelta(minutes=1)
+        db.session.add(User(id=1, username="winner", email="winner@example.com", balance_snapshot=5.0))
+        db.session.add_all([
+            Ticket(raffle_id=raffle.id, ticket_number=n, user_id=1, purchase_time=datetime.utcnow())
+            for n in range(1, 101)
+        ])
+        db.session.commit()
+
+        winners, error = RaffleService.select_winner(raffle.id)
+        self.assertIsNone(error)
+        payouts = BalanceEntry.query.filter_by(user_id=1, kind=BalanceEntryKind.PAYOUT).all()
+        self.assertEqual([(entry.amount, entry.raffle_id) for entry in payouts], [(500.0, raffle.id)] * 2)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(User, 1).balance, 1005.0)
+
+    def _count_history_statements(self, user_id, **kwargs):
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            history, next_cursor, error = RaffleService.get_user_raffle_history_page(user_id, **kwargs)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertIsNone(error)
+        return history, next_cursor, len(statements)
+
+    def test_user_history_uses_constant_queries(self):
+        drawn = self._create_started_raffle(name="Drawn")
+        drawn.end_time = datetime.utcnow() - timedelta(minutes=1)
+        drawn.number_of_tickets = 1
+        db.session.add(Ticket(raffle_id=drawn.id, ticket_number=1, user_id=1, purchase_time=datetime.utcnow()))
+        db.session.commit()
+        RaffleService.select_winner(drawn.id)
+        open_raffle = self._create_started_raffle(name="Open")
+        db.session.add(Ticket(raffle_id=open_raffle.id, ticket_number=1, user_id=1, purchase_time=datetime.utcnow()))
+        db.session.commit()
+        db.session.expire_all()
+
+        history, _, few_statements = self._count_history_statements(1, limit=None)
+        self.assertEqual({entry['win'] for entry in history}, {"You Win!", "The draw hasn't taken place yet"})
+
+        for i in range(3):
+            raffle = self._create_started_raffle(name=f"Raffle {i}")
+            db.session.add_all([
+                Ticket(raffle_id=raffle.id, ticket_number=n, user_id=1, purchase_time=datetime.utcnow())
+                for n in range(1, 41)
+            ])
+        db.session.commit()
+        db.session.expire_all()
+
+        history, _, many_statements = self._count_history_statements(1, limit=None)
+        self.assertEqual(len(history), 122)
+        self.assertEqual(few_statements, 2)
+        self.assertEqual(many_statements, 2)
+
+    def test_user_history_pagination(self):
+        raffles = [self._create_started_raffle(name=f"Raffle {i}") for i in range(3)]
+        for raffle in raffles:
+            db.session.add_all([
+                Ticket(raffle_id=raffle.id, ticket_number=n, user_id=1, purchase_time=datetime.utcnow())
+                for n in range(1, 6)
+            ])
+        db.session.commit()
+
+        seen, cursor = [], None
+        while True:
+            page, cursor, error = RaffleService.get_user_raffle_history_page(1, cursor=cursor, limit=4)
+            self.assertIsNone(error)
+            self.assertLessEqual(len(page), 4)
+            seen.extend((entry['raffle_name'], entry['ticket_number']) for entry in page)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 15)
+        self.assertEqual(len(set(seen)), 15)
+
+        groups, cursor, error = RaffleService.get_user_raffle_history_page(1, limit=2, per_raffle=True)
+        self.assertIsNone(error)
+        self.assertEqual([group['raffle_id'] for group in groups], [raffles[2].id, raffles[1].id])
+        self.assertEqual(groups[0]['ticket_count'], 5)
+        groups, cursor, _ = RaffleService.get_user_raffle_history_page(1, cursor=cursor, limit=2, per_raffle=True)
+        self.assertEqual([group['raffle_id'] for group in groups], [raffles[0].id])
+        self.assertIsNone(cursor)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
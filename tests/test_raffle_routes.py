@@ -0,0 +1,256 @@
+import json
+import time
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, select, update
+from app import create_app, db
+from app.models.raffle import Raffle, RaffleStatus, PrizeDistributionType, raffle_change_counter
+from app.services.raffle_service import RaffleService
+from app.services.ticket_service import TicketService
+from app.services.user_service import UserService
+from app.utils.ticket_allocator import clear_allocators
+from app.api.raffle_routes import warm_raffle_cache
+
+class TestRaffleReadRoutes(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        self.user, _ = UserService.create_user("reader", "reader@example.com", "password123")
+        # Stored as DRAFT, effectively ACTIVE because its start time has passed
+        start_time = datetime.utcnow() - timedelta(hours=1)
+        self.raffle, _ = RaffleService.create_raffle(
+            name="Test Raffle",
+            description="A test raffle",
+            prize_description="A great prize",
+            terms_and_conditions="Standard terms apply",
+            start_time=start_time,
+            end_time=start_time + timedelta(days=7),
+            ticket_price=10.0,
+            number_of_tickets=100,
+            max_tickets_per_user=5,
+            general_terms_link="https://example.com/terms",
+            number_of_draws=1,
+            prize_value=1000.0,
+            prize_distribution_type=PrizeDistributionType.FULL
+        )
+        UserService.add_balance(self.user.id, 100.0)
+        TicketService.purchase_tickets(self.raffle.id, self.user.id, 2)
+
+    def tearDown(self):
+        clear_allocators()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_get_endpoints_do_not_write(self):
+        raffle_id, user_id = self.raffle.id, self.user.id
+        self.raffle.status = RaffleStatus.DRAFT
+        db.session.commit()
+
+        statements = []
+        commits = []
+        def record_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        def record_commit(conn):
+            commits.append(conn)
+        event.listen(db.engine, 'before_cursor_execute', record_statement)
+        event.listen(db.engine, 'commit', record_commit)
+        try:
+            for url in [
+                '/api/raffle/',
+                f'/api/raffle/{raffle_id}',
+                f'/api/raffle/{raffle_id}/comprehensive_info',
+                f'/api/raffle/{raffle_id}/remaining_tickets',
+                f'/api/raffle/{raffle_id}/purchased_tickets',
+                f'/api/raffle/user/{user_id}/history',
+                f'/api/user/{user_id}',
+                f'/api/user/{user_id}/tickets',
+                '/api/user/all',
+            ]:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record_statement)
+            event.remove(db.engine, 'commit', record_commit)
+
+        writes = [s for s in statements if s.lstrip().split(None, 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+        self.assertEqual(commits, [])
+
+    def test_status_is_derived_without_being_stored(self):
+        raffle_id = self.raffle.id
+        self.raffle.status = RaffleStatus.DRAFT
+        db.session.commit()
+
+        response = self.client.get(f'/api/raffle/{raffle_id}')
+        self.assertEqual(response.get_json()['status'], 'ACTIVE')
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Raffle, raffle_id).status, RaffleStatus.DRAFT)
+
+    def test_get_ticket_by_public_id(self):
+        ticket = self.raffle.tickets.first()
+        response = self.client.get(f'/api/raffle/ticket/{ticket.ticket_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['id'], ticket.id)
+
+        unsold_number = next(n for n in range(1, 101) if n != ticket.ticket_number and
+                             not self.raffle.tickets.filter_by(ticket_number=n).count())
+        response = self.client.get(f'/api/raffle/ticket/{self.raffle.id}-{unsold_number:04d}')
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get('/api/raffle/ticket/not-a-ticket')
+        self.assertEqual(response.status_code, 400)
+
+    def test_raffle_responses_are_cached_with_etag(self):
+        raffle_id = self.raffle.id
+        response = self.client.get(f'/api/raffle/{raffle_id}')
+        etag = response.headers['ETag']
+        self.assertEqual(response.get_json()['available_tickets'], 98)
+
+        response = self.client.get(f'/api/raffle/{raffle_id}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        stats = self.client.get('/api/raffle/cache_stats').get_json()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+        # A purchase bumps the raffle version, so the next read is rebuilt
+        TicketService.purchase_tickets(raffle_id, self.user.id, 1)
+        response = self.client.get(f'/api/raffle/{raffle_id}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.get_json()['available_tickets'], 97)
+        self.assertEqual(self.client.get('/api/raffle/').get_json()[0]['available_tickets'], 97)
+
+    def test_cached_body_expires_at_status_boundary(self):
+        start_time = datetime.utcnow() + timedelta(seconds=1)
+        raffle, _ = RaffleService.create_raffle(
+            name="Upcoming",
+            description="A test raffle",
+            prize_description="A great prize",
+            terms_and_conditions="Standard terms apply",
+            start_time=start_time,
+            end_time=start_time + timedelta(days=7),
+            ticket_price=10.0,
+            number_of_tickets=100,
+            max_tickets_per_user=5,
+            general_terms_link="https://example.com/terms",
+            number_of_draws=1,
+            prize_value=1000.0,
+            prize_distribution_type=PrizeDistributionType.FULL
+        )
+        self.assertEqual(self.client.get(f'/api/raffle/{raffle.id}').get_json()['status'], 'DRAFT')
+        later = datetime.utcnow() + timedelta(seconds=2)
+        with mock.patch('app.utils.response_cache.time.monotonic', return_value=time.monotonic() + 2), \
+                mock.patch('app.models.raffle.datetime') as raffle_datetime:
+            raffle_datetime.utcnow.return_value = later
+            response = self.client.get(f'/api/raffle/{raffle.id}')
+        self.assertEqual(response.get_json()['status'], 'ACTIVE')
+
+    def test_warm_up_fills_on_sale_raffles(self):
+        cache = self.app.extensions['response_cache']
+        cache.clear()
+        self.assertEqual(warm_raffle_cache(), 1)
+        self.assertEqual(len(cache), 4)
+        self.client.get(f'/api/raffle/{self.raffle.id}/comprehensive_info')
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_changes_feed_returns_only_changed_raffles(self):
+        raffle_id = self.raffle.id
+        response = self.client.get('/api/raffle/changes')
+        body = response.get_json()
+        self.assertEqual([change['id'] for change in body['changes']], [raffle_id])
+        self.assertEqual(body['changes'][0]['available_tickets'], 98)
+        cursor = body['cursor']
+
+        body = self.client.get(f'/api/raffle/changes?since={cursor}').get_json()
+        self.assertEqual(body['changes'], [])
+        self.assertEqual(body['cursor'], cursor)
+
+        TicketService.purchase_tickets(raffle_id, self.user.id, 1)
+        body = self.client.get(f'/api/raffle/changes?since={cursor}').get_json()
+        self.assertEqual([change['available_tickets'] for change in body['changes']], [97])
+        cursor = body['cursor']
+
+        RaffleService.set_raffle_paused(raffle_id)
+        body = self.client.get(f'/api/raffle/changes?since={cursor}').get_json()
+        self.assertEqual([change['status'] for change in body['changes']], ['PAUSED'])
+
+        response = self.client.get('/api/raffle/changes?since=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_changes_feed_pages_through_set_based_writes(self):
+        cursor = self.client.get('/api/raffle/changes').get_json()['cursor']
+        for raffle in Raffle.query.all():
+            raffle.status = RaffleStatus.COMING_SOON
+        db.session.add(Raffle(
+            name="Second", prize_description="A prize", terms_and_conditions="Terms",
+            start_time=datetime.utcnow() - timedelta(hours=1), end_time=datetime.utcnow() + timedelta(days=1),
+            ticket_price=1.0, number_of_tickets=10, max_tickets_per_user=1, general_terms_link="https://example.com",
+            number_of_draws=1, prize_value=10.0, prize_distribution_type=PrizeDistributionType.FULL,
+            status=RaffleStatus.COMING_SOON, available_count=10
+        ))
+        db.session.commit()
+        cursor = self.client.get(f'/api/raffle/changes?since={cursor}').get_json()['cursor']
+
+        # Both raffles start in one UPDATE and share a change_seq
+        started, _ = RaffleService.start_due_raffles()
+        self.assertEqual(started, 2)
+        seen = []
+        while True:
+            body = self.client.get(f'/api/raffle/changes?since={cursor}&limit=1').get_json()
+            seen.extend(change['id'] for change in body['changes'])
+            cursor = body['cursor']
+            if not body['has_more']:
+                break
+        self.assertEqual(sorted(seen), sorted(raffle.id for raffle in Raffle.query.all()))
+
+    def test_change_counter_orders_writes_outside_sqlite(self):
+        raffle_id = self.raffle.id
+        latest = db.session.scalar(select(func.max(Raffle.change_seq)))
+        db.session.execute(update(raffle_change_counter).values(value=latest))
+        db.session.commit()
+        cursor = self.client.get('/api/raffle/changes').get_json()['cursor']
+
+        # Server databases take each change_seq from the counter row instead of MAX()
+        with mock.patch.object(db.engine.dialect, 'name', 'postgresql'):
+            seqs = []
+            TicketService.purchase_tickets(raffle_id, self.user.id, 1)
+            seqs.append(db.session.scalar(select(Raffle.change_seq).where(Raffle.id == raffle_id)))
+            RaffleService.set_raffle_paused(raffle_id)
+            seqs.append(db.session.scalar(select(Raffle.change_seq).where(Raffle.id == raffle_id)))
+        self.assertEqual(seqs, [latest + 1, latest + 2])
+        self.assertEqual(db.session.scalar(select(raffle_change_counter.c.value)), latest + 2)
+
+        body = self.client.get(f'/api/raffle/changes?since={cursor}').get_json()
+        self.assertEqual([change['status'] for change in body['changes']], ['PAUSED'])
+
+    def test_list_endpoints_stream_ndjson(self):
+        raffle_id, user_id = self.raffle.id, self.user.id
+        UserService.create_user("second", "second@example.com", "password123")
+
+        for url, headers, expected_rows in [
+            (f'/api/raffle/{raffle_id}/purchased_tickets?stream=1', {}, 2),
+            (f'/api/raffle/{raffle_id}/purchased_tickets', {'Accept': 'application/x-ndjson'}, 2),
+            (f'/api/user/{user_id}/tickets?stream=1', {}, 2),
+            ('/api/user/all?stream=1', {}, 2),
+        ]:
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.mimetype, 'application/x-ndjson', url)
+            self.assertTrue(response.is_streamed, url)
+            rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+            self.assertEqual(len(rows), expected_rows, url)
+
+        tickets = [json.loads(line) for line in self.client.get(
+            f'/api/raffle/{raffle_id}/purchased_tickets?stream=1').get_data(as_text=True).splitlines()]
+        self.assertEqual(tickets, sorted(tickets, key=lambda ticket: ticket['ticket_number']))
+        self.assertEqual(self.client.get('/api/user/999/tickets?stream=1').status_code, 404)
+        # Plain JSON stays the default
+        self.assertEqual(self.client.get(f'/api/user/{user_id}/tickets').mimetype, 'application/json')
+
+if __name__ == '__main__':
+    unittest.main()
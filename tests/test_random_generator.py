@@ -0,0 +1,26 @@
+import unittest
+from app.utils.random_generator import generate_winning_ticket, sample_ticket_numbers
+
+class TestRandomGenerator(unittest.TestCase):
+    def test_generate_winning_ticket_in_range(self):
+        for _ in range(100):
+            self.assertTrue(1 <= generate_winning_ticket(10) <= 10)
+
+    def test_sample_ticket_numbers_distinct_and_in_range(self):
+        numbers = sample_ticket_numbers(1_000_000, 1000)
+        self.assertEqual(len(numbers), 1000)
+        self.assertEqual(len(set(numbers)), 1000)
+        self.assertTrue(all(1 <= n <= 1_000_000 for n in numbers))
+
+    def test_sample_ticket_numbers_exhausts_small_range(self):
+        self.assertEqual(sorted(sample_ticket_numbers(5, 10)), [1, 2, 3, 4, 5])
+
+    def test_sample_ticket_numbers_is_uniform(self):
+        counts = [0] * 4
+        for _ in range(4000):
+            counts[sample_ticket_numbers(4, 1)[0] - 1] += 1
+        for count in counts:
+            self.assertTrue(800 < count < 1200, counts)
+
+if __name__ == '__main__':
+    unittest.main()
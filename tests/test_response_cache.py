@@ -0,0 +1,43 @@
+import unittest
+from unittest import mock
+from app.utils.response_cache import ResponseCache
+
+class TestResponseCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2, ttl=60)
+        for raffle_id in (1, 2):
+            cache.put(cache.key('raffle', raffle_id), b'{}')
+        self.assertIsNotNone(cache.get(cache.key('raffle', 1)))
+        cache.put(cache.key('raffle', 3), b'{}')
+        self.assertIsNone(cache.get(cache.key('raffle', 2)))
+        self.assertIsNotNone(cache.get(cache.key('raffle', 1)))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_bump_makes_old_keys_unreachable(self):
+        cache = ResponseCache(max_entries=10, ttl=60)
+        cache.put(cache.key('raffle', 1), b'{"v": 1}')
+        cache.put(cache.key('raffle', 2), b'{"v": 1}')
+        cache.put(cache.key('list'), b'[]')
+        cache.bump(1)
+        self.assertIsNone(cache.get(cache.key('raffle', 1)))
+        self.assertIsNotNone(cache.get(cache.key('raffle', 2)))
+        self.assertIsNone(cache.get(cache.key('list')))
+        cache.bump()
+        self.assertIsNone(cache.get(cache.key('raffle', 2)))
+
+    def test_ttl_is_capped_by_caller(self):
+        cache = ResponseCache(max_entries=10, ttl=60)
+        with mock.patch('app.utils.response_cache.time.monotonic', return_value=100.0):
+            cache.put(cache.key('raffle', 1), b'{}', ttl=5)
+            cache.put(cache.key('raffle', 2), b'{}', ttl=0)
+        with mock.patch('app.utils.response_cache.time.monotonic', return_value=104.0):
+            self.assertIsNotNone(cache.get(cache.key('raffle', 1)))
+        with mock.patch('app.utils.response_cache.time.monotonic', return_value=105.0):
+            self.assertIsNone(cache.get(cache.key('raffle', 1)))
+        self.assertIsNone(cache.get(cache.key('raffle', 2)))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
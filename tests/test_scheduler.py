@@ -0,0 +1,114 @@
+import time
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models.raffle import Raffle, RaffleStatus, PrizeDistributionType
+from app.models.ticket import Ticket
+from app.scheduler import init_scheduler, START, END
+from app import scheduler as scheduler_module
+from app.services.raffle_service import RaffleService
+
+class TestRaffleScheduler(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.scheduler = init_scheduler(self.app)
+
+    def tearDown(self):
+        self.scheduler.stop()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _create_raffle(self, start_time, end_time):
+        raffle, _ = RaffleService.create_raffle(
+            name="Test Raffle",
+            description="A test raffle",
+            prize_description="A great prize",
+            terms_and_conditions="Standard terms apply",
+            start_time=start_time,
+            end_time=end_time,
+            ticket_price=10.0,
+            number_of_tickets=10,
+            max_tickets_per_user=5,
+            general_terms_link="https://example.com/terms",
+            number_of_draws=1,
+            prize_value=1000.0,
+            prize_distribution_type=PrizeDistributionType.FULL
+        )
+        return raffle
+
+    def _wait_for(self, raffle_id, predicate, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            db.session.expire_all()
+            raffle = db.session.get(Raffle, raffle_id)
+            if predicate(raffle):
+                return raffle
+            time.sleep(0.05)
+        self.fail(f"Raffle {raffle_id} did not reach the expected state")
+
+    def test_transitions_fire_within_a_second_of_deadline(self):
+        start_time = datetime.utcnow() + timedelta(seconds=1)
+        end_time = start_time + timedelta(seconds=1)
+        raffle = self._create_raffle(start_time, end_time)
+        RaffleService.activate_raffle(raffle.id)
+        self.assertIn((start_time, START, raffle.id), self.scheduler.pending())
+        db.session.add(Ticket(raffle_id=raffle.id, ticket_number=1, user_id=1, purchase_time=datetime.utcnow()))
+        db.session.commit()
+
+        self._wait_for(raffle.id, lambda r: r.status == RaffleStatus.ACTIVE)
+        self.assertLess((datetime.utcnow() - start_time).total_seconds(), 1)
+
+        raffle = self._wait_for(raffle.id, lambda r: r.status == RaffleStatus.ENDED)
+        self.assertLess((datetime.utcnow() - end_time).total_seconds(), 1)
+        self._wait_for(raffle.id, lambda r: r.result is not None)
+
+    def test_failed_transitions_are_retried(self):
+        start_time = datetime.utcnow() + timedelta(seconds=0.5)
+        end_time = start_time + timedelta(seconds=1)
+        raffle = self._create_raffle(start_time, end_time)
+        RaffleService.activate_raffle(raffle.id)
+
+        def fail_once(transition):
+            calls = []
+            def wrapper(now):
+                calls.append(now)
+                if len(calls) == 1:
+                    return None, "database is locked"
+                return transition(now)
+            return wrapper
+
+        draws = mock.Mock(wraps=self.scheduler._draw_pending)
+        with mock.patch.object(scheduler_module, 'RETRY_DELAY', timedelta(seconds=0.3)), \
+                mock.patch.object(RaffleService, 'start_due_raffles', side_effect=fail_once(RaffleService.start_due_raffles)), \
+                mock.patch.object(RaffleService, 'end_due_raffles', side_effect=fail_once(RaffleService.end_due_raffles)), \
+                mock.patch.object(self.scheduler, '_draw_pending', draws):
+            self._wait_for(raffle.id, lambda r: r.status == RaffleStatus.ACTIVE)
+            self.assertEqual(RaffleService.start_due_raffles.call_count, 2)
+            self._wait_for(raffle.id, lambda r: r.status == RaffleStatus.ENDED)
+            self.assertEqual(RaffleService.end_due_raffles.call_count, 2)
+            deadline = time.monotonic() + 5
+            while not draws.called and time.monotonic() < deadline:
+                time.sleep(0.05)
+            # Only the end step that succeeded queued a draw
+            self.assertEqual(draws.call_count, 1)
+
+    def test_refill_loads_only_the_window(self):
+        soon = self._create_raffle(datetime.utcnow() + timedelta(minutes=5), datetime.utcnow() + timedelta(minutes=30))
+        later = self._create_raffle(datetime.utcnow() + timedelta(days=2), datetime.utcnow() + timedelta(days=3))
+        for raffle in (soon, later):
+            raffle.status = RaffleStatus.COMING_SOON
+        db.session.commit()
+
+        self.scheduler._refill(datetime.utcnow())
+        pending = self.scheduler.pending()
+        self.assertIn((soon.start_time, START, soon.id), pending)
+        self.assertIn((soon.end_time, END, soon.id), pending)
+        self.assertFalse([event for event in pending if event[2] == later.id])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import threading
+import unittest
+from unittest import mock
+from app import create_app, db
+from app.services.user_service import UserService, HASHER_BUSY
+from app.utils.session_tokens import HasherBusy, PasswordHasher, SessionTokens
+
+class TestSessionTokens(unittest.TestCase):
+    def test_verified_tokens_are_cached(self):
+        tokens = SessionTokens('secret', max_age=60)
+        token = tokens.issue(7)
+        self.assertEqual(tokens.verify(token), 7)
+        self.assertEqual(tokens.verify(token), 7)
+        self.assertEqual((tokens.stats()['hits'], tokens.stats()['misses']), (1, 1))
+
+        self.assertIsNone(tokens.verify(token[:-2] + 'xx'))
+        self.assertIsNone(SessionTokens('other-secret').verify(token))
+        self.assertIsNone(tokens.verify('not-a-token'))
+
+    def test_expired_and_revoked_tokens_fail(self):
+        tokens = SessionTokens('secret', max_age=60)
+        token = tokens.issue(7)
+        tokens.verify(token)
+        tokens.revoke(token)
+        self.assertIsNone(tokens.verify(token))
+
+        expired = SessionTokens('secret', max_age=-1)
+        self.assertIsNone(expired.verify(expired.issue(7)))
+
+    def test_cache_is_bounded(self):
+        tokens = SessionTokens('secret', max_entries=2)
+        for user_id in range(5):
+            tokens.verify(tokens.issue(user_id))
+        self.assertEqual(tokens.stats()['size'], 2)
+
+    def test_hasher_refuses_work_beyond_its_queue(self):
+        hasher = PasswordHasher(workers=1, max_pending=0)
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return True
+
+        worker = threading.Thread(target=hasher._run, args=(slow,))
+        worker.start()
+        started.wait(5)
+        with self.assertRaises(HasherBusy):
+            hasher._run(lambda: True)
+        release.set()
+        worker.join()
+        self.assertTrue(hasher._run(lambda: True))
+        hasher.shutdown()
+
+class TestSessionRoutes(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        UserService.create_user("sessionuser", "session@example.com", "password123")
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _login(self, password="password123"):
+        return self.client.post('/api/user/login', json={'username': 'sessionuser', 'password': password})
+
+    def test_login_issues_a_token_for_later_requests(self):
+        response = self._login()
+        self.assertEqual(response.status_code, 200)
+        token = response.get_json()['token']
+        self.assertEqual(response.get_json()['username'], 'sessionuser')
+
+        headers = {'Authorization': f"Bearer {token}"}
+        response = self.client.get('/api/user/me', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['username'], 'sessionuser')
+
+        self.assertEqual(self.client.post('/api/user/logout', headers=headers).status_code, 200)
+        self.assertEqual(self.client.get('/api/user/me', headers=headers).status_code, 401)
+        self.assertEqual(self.client.get('/api/user/me').status_code, 401)
+        self.assertEqual(self._login("wrong-password").status_code, 401)
+
+    def test_login_burst_beyond_the_hasher_queue_gets_503(self):
+        hasher = self.app.extensions['password_hasher']
+        with mock.patch.object(hasher, 'check', side_effect=HasherBusy()):
+            response = self._login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json()['error'], HASHER_BUSY)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+if __name__ == '__main__':
+    unittest.main()
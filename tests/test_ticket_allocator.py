@@ -0,0 +1,31 @@
+import unittest
+from app.utils.ticket_allocator import TicketAllocator
+
+class TestTicketAllocator(unittest.TestCase):
+    def test_claim_skips_sold_numbers(self):
+        allocator = TicketAllocator(10, [2, 4, 6])
+        claimed = allocator.claim(7)
+        self.assertEqual(sorted(claimed), [1, 3, 5, 7, 8, 9, 10])
+        self.assertEqual(len(allocator), 0)
+        self.assertIsNone(allocator.claim(1))
+
+    def test_release_returns_numbers_to_pool(self):
+        allocator = TicketAllocator(5, [])
+        claimed = allocator.claim(3)
+        allocator.release(claimed[:2])
+        self.assertEqual(len(allocator), 4)
+        self.assertEqual(sorted(allocator.claim(4)), sorted(set(range(1, 6)) - {claimed[2]}))
+
+    def test_release_ignores_numbers_outside_range(self):
+        allocator = TicketAllocator(3, [1, 2, 3])
+        allocator.release([0, 4])
+        self.assertEqual(len(allocator), 0)
+
+    def test_rebuild_resets_free_numbers(self):
+        allocator = TicketAllocator(3, [])
+        allocator.claim(3)
+        allocator.rebuild(5, [1])
+        self.assertEqual(sorted(allocator.claim(4)), [2, 3, 4, 5])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,19 @@
 import unittest
+from unittest import mock
+import threading
 from datetime import datetime, timedelta
+from sqlalchemy import event, insert, update
+from sqlalchemy.exc import SQLAlchemyError
 from app import create_app, db
 from app.models.raffle import Raffle, RaffleStatus, PrizeDistributionType
 from app.models.ticket import Ticket
+from app.models.user import User
+from app.models.balance_entry import BalanceEntry, BalanceEntryKind
 from app.services.ticket_service import TicketService
 from app.services.raffle_service import RaffleService
+from app.services.user_service import UserService
+from app.utils.purchase_batcher import BatcherStopped, PurchaseBatcher
+from app.utils.ticket_allocator import clear_allocators, peek_allocator
 
 class TestTicketService(unittest.TestCase):
     def setUp(self):
@@ -14,7 +23,7 @@ class TestTicketService(unittest.TestCase):
         db.create_all()
 
         # Create a test raffle
-        start_time = datetime.utcnow() + timedelta(hours=1)
+        start_time = datetime.utcnow() - timedelta(hours=1)
         end_time = start_time + timedelta(days=7)
         self.raffle, _ = RaffleService.create_raffle(
             name="Test Raffle",
@@ -32,8 +41,17 @@ class TestTicketService(unittest.TestCase):
             prize_distribution_type=PrizeDistributionType.FULL
         )
         RaffleService.activate_raffle(self.raffle.id)
+        self._fund_users(list(range(1, 61)) + [1000])
+
+    def _fund_users(self, user_ids, balance=1000.0):
+        db.session.execute(insert(User), [
+            {'id': user_id, 'username': f"buyer{user_id}", 'email': f"buyer{user_id}@example.com", 'balance_snapshot': balance}
+            for user_id in user_ids
+        ])
+        db.session.commit()
 
     def tearDown(self):
+        clear_allocators()
         db.session.remove()
         db.drop_all()
         self.app_context.pop()
@@ -57,14 +75,16 @@ class TestTicketService(unittest.TestCase):
 
     def test_get_tickets_for_raffle(self):
         TicketService.purchase_tickets(self.raffle.id, 1, 3)
-        tickets = TicketService.get_tickets_for_raffle(self.raffle.id)
-        self.assertEqual(len(tickets), 100)  # Total tickets in raffle
-        purchased_tickets = [t for t in tickets if t.user_id is not None]
-        self.assertEqual(len(purchased_tickets), 3)
+        tickets, error = TicketService.get_tickets_for_raffle(self.raffle.id)
+        self.assertIsNone(error)
+        self.assertEqual(len(tickets), 3)  # Only sold tickets have a row
+        self.assertTrue(all(t.user_id == 1 for t in tickets))
+        self.assertEqual(self.raffle.available_count, 97)
 
     def test_get_user_tickets(self):
         TicketService.purchase_tickets(self.raffle.id, 1, 3)
-        user_tickets = TicketService.get_user_tickets(1)
+        user_tickets, error = TicketService.get_user_tickets(1)
+        self.assertIsNone(error)
         self.assertEqual(len(user_tickets), 3)
 
     def test_refund_ticket(self):
@@ -76,9 +96,14 @@ class TestTicketService(unittest.TestCase):
         self.assertTrue(success)
         self.assertIn("Ticket refunded successfully", message)
 
-        # Verify the ticket is no longer associated with the user
-        refunded_ticket = TicketService.get_ticket_by_id(ticket_id)
-        self.assertIsNone(refunded_ticket.user_id)
+        # Verify the ticket number went back to the unsold range
+        refunded_ticket, error = TicketService.get_ticket_by_id(ticket_id)
+        self.assertIsNone(refunded_ticket)
+        self.assertIn("Ticket not found", error)
+        self.assertEqual(self.raffle.available_count, 100)
+
+        # The refunded number is back in the allocator's pool
+        self.assertEqual(len(peek_allocator(self.raffle.id)), 100)
 
         # Test refunding a non-existent ticket
         success, message = TicketService.refund_ticket(9999)
@@ -96,5 +121,457 @@ class TestTicketService(unittest.TestCase):
         self.assertIsNone(tickets)
         self.assertIn("Cannot purchase tickets. Raffle status is ENDED", error)
 
+    def test_purchase_uses_fixed_number_of_statements(self):
+        # The first purchase builds the raffle's allocator from the ticket table
+        raffle_id = self.raffle.id
+        TicketService.purchase_tickets(raffle_id, 2, 1)
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            tickets, error = TicketService.purchase_tickets(raffle_id, 1, 5)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertIsNone(error)
+        self.assertEqual(len(tickets), 5)
+        self.assertEqual(len({t.ticket_number for t in tickets}), 5)
+        # Claim, per-user count, allocator drift check, ticket insert and balance debit
+        self.assertLessEqual(len(statements), 5, statements)
+
+    def test_failed_debit_returns_numbers_to_the_allocator(self):
+        raffle_id = self.raffle.id
+        TicketService.purchase_tickets(raffle_id, 1, 1)
+        with mock.patch.object(User, 'adjust_balance', side_effect=SQLAlchemyError("debit failed")):
+            tickets, error = TicketService.purchase_tickets(raffle_id, 2, 3)
+        self.assertIsNone(tickets)
+        self.assertEqual(error, "debit failed")
+        self.assertEqual(len(peek_allocator(raffle_id)), 99)
+        self.assertEqual(Ticket.query.filter_by(raffle_id=raffle_id).count(), 1)
+
+    def test_allocator_failure_is_not_blamed_on_the_user_limit(self):
+        with mock.patch.object(TicketService, '_allocate_numbers', return_value=None):
+            tickets, error = TicketService.purchase_tickets(self.raffle.id, 1, 1)
+        self.assertIsNone(tickets)
+        self.assertEqual(error, "Ticket numbers could not be allocated")
+        self.assertEqual(Ticket.query.count(), 0)
+
+    def test_purchases_without_returning(self):
+        # MySQL has neither UPDATE nor INSERT ... RETURNING
+        raffle_id = self.raffle.id
+        with mock.patch.object(db.engine.dialect, 'update_returning', False), \
+                mock.patch.object(db.engine.dialect, 'insert_returning', False):
+            tickets, error = TicketService.purchase_tickets(raffle_id, 1, 3)
+            self.assertIsNone(error)
+            self.assertEqual(sorted(t.user_id for t in tickets), [1, 1, 1])
+            tickets, error = TicketService.purchase_tickets(raffle_id, 1, 3)
+            self.assertIn("Cannot purchase more than 5 tickets per user", error)
+            results, error = TicketService.purchase_tickets_batch([
+                {'raffle_id': raffle_id, 'user_id': 1, 'num_tickets': 2},
+                {'raffle_id': raffle_id, 'user_id': 2, 'num_tickets': 4},
+            ])
+            self.assertIsNone(error)
+            self.assertEqual([len(result['tickets']) for result in results], [2, 4])
+        db.session.expire_all()
+        raffle = db.session.get(Raffle, raffle_id)
+        self.assertEqual((raffle.sold_count, raffle.available_count), (9, 91))
+        self.assertEqual(Ticket.query.filter_by(raffle_id=raffle_id).count(), 9)
+
+    def test_purchase_rebuilds_allocator_after_drift(self):
+        tickets, _ = TicketService.purchase_tickets(self.raffle.id, 1, 1)
+        # Another process sells every number but two behind this allocator's back
+        free_numbers = set(n for n in range(1, 101) if n != tickets[0].ticket_number)
+        free_numbers = set(sorted(free_numbers)[:2])
+        db.session.add_all([
+            Ticket(raffle_id=self.raffle.id, ticket_number=n, user_id=2, purchase_time=datetime.utcnow())
+            for n in range(1, 101) if n != tickets[0].ticket_number and n not in free_numbers
+        ])
+        self.raffle.sold_count += 97
+        self.raffle.available_count -= 97
+        db.session.commit()
+
+        tickets, error = TicketService.purchase_tickets(self.raffle.id, 3, 2)
+        self.assertIsNone(error)
+        self.assertEqual({t.ticket_number for t in tickets}, free_numbers)
+
+    def test_concurrent_purchases_never_share_a_ticket(self):
+        raffle_id = self.raffle.id
+        results = []
+        def buy(user_id):
+            with self.app.app_context():
+                tickets, error = TicketService.purchase_tickets(raffle_id, user_id, 5)
+                results.append(None if error else [t.ticket_number for t in tickets])
+                db.session.remove()
+
+        # 30 buyers want 150 tickets from a 100 ticket raffle
+        threads = [threading.Thread(target=buy, args=(user_id,)) for user_id in range(1, 31)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        db.session.expire_all()
+        sold_numbers = [number for (number,) in db.session.query(Ticket.ticket_number).filter_by(raffle_id=raffle_id)]
+        claimed_numbers = [number for numbers in results if numbers for number in numbers]
+        self.assertEqual(len(sold_numbers), len(set(sold_numbers)))
+        self.assertEqual(sorted(sold_numbers), sorted(claimed_numbers))
+        self.assertEqual(len(sold_numbers), 100)
+        self.assertEqual(db.session.get(Raffle, raffle_id).status, RaffleStatus.SOLD_OUT)
+
+    def _create_raffle(self, number_of_tickets):
+        raffle, _ = RaffleService.create_raffle(
+            name="Second Raffle",
+            description="A test raffle",
+            prize_description="A great prize",
+            terms_and_conditions="Standard terms apply",
+            start_time=datetime.utcnow() - timedelta(hours=1),
+            end_time=datetime.utcnow() + timedelta(days=1),
+            ticket_price=10.0,
+            number_of_tickets=number_of_tickets,
+            max_tickets_per_user=5,
+            general_terms_link="https://example.com/terms",
+            number_of_draws=1,
+            prize_value=1000.0,
+            prize_distribution_type=PrizeDistributionType.FULL
+        )
+        return raffle
+
+    def test_batch_purchase_checks_limits_across_the_batch(self):
+        raffle_id = self.raffle.id
+        second_id = self._create_raffle(number_of_tickets=4).id
+        TicketService.purchase_tickets(raffle_id, 1, 2)
+
+        results, error = TicketService.purchase_tickets_batch([
+            {'raffle_id': raffle_id, 'user_id': 1, 'num_tickets': 3},
+            {'raffle_id': raffle_id, 'user_id': 1, 'num_tickets': 1},
+            {'raffle_id': raffle_id, 'user_id': 2, 'num_tickets': 0},
+            {'raffle_id': second_id, 'user_id': 2, 'num_tickets': 3},
+            {'raffle_id': second_id, 'user_id': 3, 'num_tickets': 2},
+            {'raffle_id': 9999, 'user_id': 3, 'num_tickets': 1},
+        ])
+        self.assertIsNone(error)
+        self.assertEqual([len(result['tickets']) if 'tickets' in result else None for result in results],
+                         [3, None, None, 3, None, None])
+        self.assertIn("Cannot purchase more than 5 tickets per user", results[1]['error'])
+        self.assertIn("at least 1", results[2]['error'])
+        self.assertIn("Only 1 left", results[4]['error'])
+        self.assertIn("Raffle not found", results[5]['error'])
+
+        db.session.expire_all()
+        raffle, second = db.session.get(Raffle, raffle_id), db.session.get(Raffle, second_id)
+        self.assertEqual((raffle.sold_count, raffle.available_count), (5, 95))
+        self.assertEqual((second.sold_count, second.available_count), (3, 1))
+        self.assertEqual(Ticket.query.filter_by(raffle_id=second_id).count(), 3)
+
+    def test_batch_purchase_fails_only_the_buyer_whose_balance_moved(self):
+        # Buyer 61 looked funded when balances were read, but cannot pay at the debit
+        self._fund_users([61], balance=0.0)
+        balances = TicketService._balances
+        with mock.patch.object(TicketService, '_balances',
+                               side_effect=lambda user_ids: {**balances(user_ids), 61: 1000.0}):
+            results, error = TicketService.purchase_tickets_batch([
+                {'raffle_id': self.raffle.id, 'user_id': 1, 'num_tickets': 2},
+                {'raffle_id': self.raffle.id, 'user_id': 61, 'num_tickets': 1},
+                {'raffle_id': self.raffle.id, 'user_id': 2, 'num_tickets': 1},
+            ])
+        self.assertIsNone(error)
+        self.assertEqual([len(result['tickets']) if 'tickets' in result else None for result in results],
+                         [2, None, 1])
+        self.assertEqual(results[1]['error'], "Insufficient balance")
+        self.assertEqual(len(peek_allocator(self.raffle.id)), 97)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Raffle, self.raffle.id).sold_count, 3)
+        self.assertEqual(Ticket.query.filter_by(user_id=61).count(), 0)
+
+    def test_batch_purchase_uses_fixed_number_of_statements(self):
+        raffle_id = self.raffle.id
+        TicketService.purchase_tickets(raffle_id, 1000, 1)
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            results, error = TicketService.purchase_tickets_batch([
+                {'raffle_id': raffle_id, 'user_id': user_id, 'num_tickets': 1} for user_id in range(1, 61)
+            ])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertIsNone(error)
+        self.assertTrue(all(len(result['tickets']) == 1 for result in results))
+        ticket_numbers = [result['tickets'][0].ticket_number for result in results]
+        self.assertEqual(len(set(ticket_numbers)), 60)
+        # Balances, lock, per-user counts, allocator drift check, counters, one insert
+        # and one executemany debit
+        self.assertLessEqual(len(statements), 7, statements)
+
+    def test_batch_purchase_route(self):
+        client = self.app.test_client()
+        raffle_id = self.raffle.id
+        response = client.post(f'/api/raffle/{raffle_id}/purchase/batch', json={'purchases': [
+            {'user_id': 1, 'num_tickets': 2},
+            {'user_id': 2, 'num_tickets': 9},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual((body['purchased'], body['failed']), (1, 1))
+        self.assertEqual(len(body['results'][0]['tickets']), 2)
+
+        response = client.post('/api/raffle/purchase/batch', json={'purchases': [{'user_id': 1, 'num_tickets': 1}]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_purchase_debits_balance_atomically(self):
+        raffle_id = self.raffle.id
+        self._fund_users([2000], balance=25.0)
+        tickets, error = TicketService.purchase_tickets(raffle_id, 2000, 2)
+        self.assertIsNone(error)
+        self.assertEqual(db.session.get(User, 2000).balance, 5.0)
+
+        tickets, error = TicketService.purchase_tickets(raffle_id, 2000, 1)
+        self.assertIsNone(tickets)
+        self.assertEqual(error, "Insufficient balance")
+        tickets, error = TicketService.purchase_tickets(raffle_id, 9999, 1)
+        self.assertEqual(error, "User not found")
+        db.session.expire_all()
+        raffle = db.session.get(Raffle, raffle_id)
+        self.assertEqual((raffle.sold_count, raffle.available_count), (2, 98))
+
+        ticket_id = Ticket.query.filter_by(user_id=2000).first().id
+        success, _ = TicketService.refund_ticket(ticket_id)
+        self.assertTrue(success)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(User, 2000).balance, 15.0)
+
+        # The freed number goes back to the allocator and the balance covers one ticket
+        tickets, error = TicketService.purchase_tickets(raffle_id, 2000, 1)
+        self.assertIsNone(error)
+
+    def test_parallel_purchases_never_overdraw(self):
+        raffle_id = self.raffle.id
+        self._fund_users([3000], balance=30.0)
+        results = []
+        def buy():
+            with self.app.app_context():
+                tickets, error = TicketService.purchase_tickets(raffle_id, 3000, 1)
+                results.append(error)
+                db.session.remove()
+
+        threads = [threading.Thread(target=buy) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        db.session.expire_all()
+        self.assertEqual(results.count(None), 3)
+        self.assertEqual(db.session.get(User, 3000).balance, 0.0)
+        self.assertEqual(Ticket.query.filter_by(user_id=3000).count(), 3)
+        self.assertEqual(db.session.get(Raffle, raffle_id).sold_count, 3)
+
+    def test_batch_purchase_charges_each_buyer(self):
+        raffle_id = self.raffle.id
+        self._fund_users([4000], balance=15.0)
+        results, error = TicketService.purchase_tickets_batch([
+            {'raffle_id': raffle_id, 'user_id': 4000, 'num_tickets': 1},
+            {'raffle_id': raffle_id, 'user_id': 4000, 'num_tickets': 1},
+            {'raffle_id': raffle_id, 'user_id': 9999, 'num_tickets': 1},
+        ])
+        self.assertIsNone(error)
+        self.assertIn('tickets', results[0])
+        self.assertEqual(results[1]['error'], "Insufficient balance")
+        self.assertEqual(results[2]['error'], "User not found")
+        db.session.expire_all()
+        self.assertEqual(db.session.get(User, 4000).balance, 5.0)
+
+    def test_balance_changes_are_ledgered_and_compacted(self):
+        raffle_id = self.raffle.id
+        self._fund_users([5000], balance=0.0)
+        UserService.add_balance(5000, 50.0)
+        TicketService.purchase_tickets(raffle_id, 5000, 2)
+        TicketService.refund_ticket(Ticket.query.filter_by(user_id=5000).first().id)
+        _, error = UserService.subtract_balance(5000, 100.0)
+        self.assertEqual(error, "Insufficient balance")
+
+        entries = BalanceEntry.query.filter_by(user_id=5000).order_by(BalanceEntry.id).all()
+        self.assertEqual(
+            [(entry.kind, entry.amount) for entry in entries],
+            [(BalanceEntryKind.DEPOSIT, 50.0), (BalanceEntryKind.PURCHASE, -20.0), (BalanceEntryKind.REFUND, 10.0)]
+        )
+        self.assertEqual(entries[1].raffle_id, raffle_id)
+        user = db.session.get(User, 5000)
+        self.assertEqual((user.balance_snapshot, user.balance), (0.0, 40.0))
+
+        compacted, error = UserService.compact_balance_ledger()
+        self.assertIsNone(error)
+        self.assertEqual(compacted, 1)
+        db.session.expire_all()
+        user = db.session.get(User, 5000)
+        self.assertEqual((user.balance_snapshot, user.balance_tail, user.balance), (40.0, 0.0, 40.0))
+        self.assertEqual(user.snapshot_entry_id, entries[-1].id)
+        self.assertEqual(BalanceEntry.query.filter_by(user_id=5000).count(), 3)
+
+        # Entries after the snapshot form the new tail
+        UserService.subtract_balance(5000, 15.0)
+        self.assertEqual(UserService.compact_balance_ledger(), (1, None))
+        self.assertEqual(UserService.compact_balance_ledger(), (0, None))
+        db.session.expire_all()
+        self.assertEqual(db.session.get(User, 5000).balance, 25.0)
+
+    def test_debits_lock_the_user_row_outside_sqlite(self):
+        raffle_id = self.raffle.id
+        statements = []
+        execute = db.session.execute
+        def record(statement, *args, **kwargs):
+            statements.append(statement)
+            return execute(statement, *args, **kwargs)
+        with mock.patch.object(db.engine.dialect, 'name', 'postgresql'), \
+                mock.patch.object(db.session, 'execute', side_effect=record):
+            tickets, error = TicketService.purchase_tickets(raffle_id, 1, 1)
+        self.assertIsNone(error)
+        locks = [index for index, statement in enumerate(statements) if getattr(statement, '_for_update_arg', None) is not None]
+        debits = [index for index, statement in enumerate(statements)
+                  if getattr(statement, 'table', None) is BalanceEntry.__table__]
+        self.assertEqual(len(locks), 1)
+        self.assertLess(locks[0], debits[0])
+
+    def test_credits_take_no_lock(self):
+        statements = []
+        execute = db.session.execute
+        def record(statement, *args, **kwargs):
+            statements.append(statement)
+            return execute(statement, *args, **kwargs)
+        with mock.patch.object(db.engine.dialect, 'name', 'postgresql'), \
+                mock.patch.object(db.session, 'execute', side_effect=record):
+            self.assertEqual(UserService.add_balance(1, 10.0)[1], None)
+        self.assertFalse([statement for statement in statements
+                          if getattr(statement, '_for_update_arg', None) is not None])
+
+    def test_compaction_only_folds_entries_older_than_the_grace(self):
+        self._fund_users([8000], balance=0.0)
+        UserService.add_balance(8000, 10.0)
+        self.assertEqual(UserService.compact_balance_ledger(grace=60), (0, None))
+        db.session.execute(update(BalanceEntry).values(created_at=datetime.utcnow() - timedelta(minutes=2)))
+        db.session.commit()
+        UserService.add_balance(8000, 5.0)
+        self.assertEqual(UserService.compact_balance_ledger(grace=60), (1, None))
+        db.session.expire_all()
+        user = db.session.get(User, 8000)
+        self.assertEqual((user.balance_snapshot, user.balance_tail, user.balance), (10.0, 5.0, 15.0))
+
+    def test_compaction_moves_each_user_to_its_own_last_entry(self):
+        self._fund_users([7000, 7001], balance=0.0)
+        UserService.add_balance(7000, 10.0)
+        UserService.add_balance(7001, 20.0)
+        UserService.add_balance(7000, 5.0)
+        self.assertEqual(UserService.compact_balance_ledger(), (2, None))
+        db.session.expire_all()
+        for user_id, balance in ((7000, 15.0), (7001, 20.0)):
+            user = db.session.get(User, user_id)
+            last_entry = BalanceEntry.query.filter_by(user_id=user_id).order_by(BalanceEntry.id.desc()).first()
+            self.assertEqual((user.snapshot_entry_id, user.balance_snapshot, user.balance), (last_entry.id, balance, balance))
+
+    def test_group_purchase_isolates_each_failure(self):
+        raffle_id = self.raffle.id
+        self._fund_users([6000], balance=15.0)
+        commits = []
+        def count_commit(connection):
+            commits.append(connection)
+        event.listen(db.engine, 'commit', count_commit)
+        try:
+            results = TicketService.purchase_tickets_group([
+                (raffle_id, 6000, 1),
+                (raffle_id, 6000, 1),
+                (raffle_id, 9999, 1),
+                (raffle_id, 1, 6),
+                (raffle_id, 2, 2)
+            ])
+        finally:
+            event.remove(db.engine, 'commit', count_commit)
+
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(len(results[0][0]), 1)
+        self.assertEqual(results[1], (None, "Insufficient balance"))
+        self.assertEqual(results[2], (None, "User not found"))
+        self.assertIsNone(results[3][0])
+        self.assertEqual([ticket.user_id for ticket in results[4][0]], [2, 2])
+        numbers = [ticket.ticket_number for tickets, _ in results if tickets for ticket in tickets]
+        db.session.expire_all()
+        self.assertEqual(db.session.get(User, 6000).balance, 5.0)
+        self.assertEqual(db.session.get(Raffle, raffle_id).sold_count, 3)
+        self.assertEqual(sorted(number for (number,) in db.session.query(Ticket.ticket_number)), sorted(numbers))
+
+    def test_batcher_groups_concurrent_purchases(self):
+        raffle_id = self.raffle.id
+        batcher = PurchaseBatcher(self.app, max_batch=50, max_wait=0.05)
+        batcher.start()
+        try:
+            # 30 buyers want 150 tickets from a 100 ticket raffle
+            futures = [batcher.submit(raffle_id, user_id, 5) for user_id in range(1, 31)]
+            results = [future.result(10) for future in futures]
+        finally:
+            batcher.stop()
+
+        self.assertLess(batcher.stats()['batches'], 30)
+        self.assertEqual(batcher.stats()['purchases'], 30)
+        self.assertEqual(sum(1 for tickets, error in results if error is None), 20)
+        claimed = [ticket.ticket_number for tickets, _ in results if tickets for ticket in tickets]
+        db.session.expire_all()
+        sold = [number for (number,) in db.session.query(Ticket.ticket_number).filter_by(raffle_id=raffle_id)]
+        self.assertEqual(sorted(sold), sorted(claimed))
+        self.assertEqual(len(set(sold)), 100)
+        self.assertEqual(db.session.get(Raffle, raffle_id).status, RaffleStatus.SOLD_OUT)
+
+    def test_group_purchase_writes_each_raffle_once(self):
+        raffle_id = self.raffle.id
+        second_id = self._create_raffle(number_of_tickets=20).id
+        TicketService.purchase_tickets(raffle_id, 1, 1)
+        TicketService.purchase_tickets(second_id, 1, 1)
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            results = TicketService.purchase_tickets_group(
+                [(raffle_id, user_id, 1) for user_id in range(2, 22)] +
+                [(second_id, user_id, 1) for user_id in range(2, 12)]
+            )
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual([error for _, error in results], [None] * 30)
+        self.assertEqual([ticket.user_id for tickets, _ in results for ticket in tickets],
+                         list(range(2, 22)) + list(range(2, 12)))
+        # Independent of the group size: claims per raffle, one ticket INSERT, one debit
+        self.assertLessEqual(len(statements), 12, statements)
+
+    def test_group_purchase_falls_back_when_a_balance_moves(self):
+        raffle_id = self.raffle.id
+        self._fund_users([8000], balance=5.0)
+        # The batch read believes the poor buyer can pay; the debit guard disagrees
+        balances = TicketService._balances
+        with mock.patch.object(TicketService, '_balances',
+                               side_effect=lambda user_ids: {**balances(user_ids), 8000: 100.0}):
+            results = TicketService.purchase_tickets_group([(raffle_id, 1, 1), (raffle_id, 8000, 1), (raffle_id, 2, 1)])
+        self.assertEqual(results[1], (None, "Insufficient balance"))
+        self.assertEqual([len(results[0][0]), len(results[2][0])], [1, 1])
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Raffle, raffle_id).sold_count, 2)
+
+    def test_batcher_turns_unexpected_errors_into_results(self):
+        batcher = PurchaseBatcher(self.app)
+        batcher.start()
+        try:
+            with mock.patch.object(TicketService, 'purchase_tickets_group', side_effect=RuntimeError("database gone")), \
+                    self.assertLogs(self.app.logger, 'ERROR'):
+                self.assertEqual(batcher.purchase(self.raffle.id, 1, 1), (None, "database gone"))
+        finally:
+            batcher.stop()
+
+    def test_stopped_batcher_fails_queued_purchases(self):
+        batcher = PurchaseBatcher(self.app)
+        future = batcher.submit(self.raffle.id, 1, 1)
+        batcher.stop()
+        with self.assertRaises(BatcherStopped):
+            future.result(1)
+        self.assertEqual(batcher.purchase(self.raffle.id, 1, 1), (None, "Purchases are paused, please retry"))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file